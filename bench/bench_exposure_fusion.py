@@ -0,0 +1,84 @@
+import sys
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from scripts.camera_config import get_config
+from scripts.emulator import SyntheticVideoCapture
+from scripts.exposure_fusion import ExposureFusion
+from scripts.recorder import ReplayCapture
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Throughput of the exposure fusion stage on recorded or synthetic brackets")
+    default_comm_path = str(Path(Path(__file__).parent.parent, "cfg/camera_parameter.toml"))
+    parser.add_argument("--camera-toml-path", "-c", type=str, default=default_comm_path)
+    parser.add_argument("--recording", "-r", type=str, default=None, help="Recorder directory; consecutive frames form the brackets")
+    parser.add_argument("--frames", "-f", type=int, nargs="+", default=[2, 3], help="frames per bracket")
+    parser.add_argument("--iterations", "-n", type=int, default=50)
+    parser.add_argument("--cv-threads", type=int, default=None, help="cv2.setNumThreads value (OpenCV's own parallelism)")
+    return parser.parse_args()
+
+
+def load_brackets(camera_config, recording, num_frames, count=8):
+    """ `count` brackets of `num_frames` BGR frames; without a recording the synthetic frames are scaled by exposure gains """
+    capture = ReplayCapture(recording, loop=True) if recording is not None else SyntheticVideoCapture(
+        camera_config.width, camera_config.height, camera_config.fps, realtime=False
+    )
+    gains = np.linspace(0.5, 2.0, num_frames) if recording is None else np.ones(num_frames)
+    brackets = []
+    for _ in range(count):
+        bracket = []
+        for gain in gains:
+            ret, frame = capture.read()
+            if not ret:
+                raise RuntimeError("failed to read a frame")
+            if frame.ndim == 3 and frame.shape[2] == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_YUYV)
+            bracket.append(np.clip(frame * gain, 0, 255).astype(np.uint8) if gain != 1.0 else np.ascontiguousarray(frame))
+        brackets.append(bracket)
+    capture.release()
+    return brackets
+
+
+def main(camera_toml_path, recording, frames, iterations, cv_threads):
+    if cv_threads is not None:
+        cv2.setNumThreads(cv_threads)
+    camera_config = get_config(camera_toml_path)
+    print("OpenCV {} ({} threads)".format(cv2.__version__, cv2.getNumThreads()))
+    for num_frames in frames:
+        brackets = load_brackets(camera_config, recording, num_frames)
+        height, width = brackets[0][0].shape[:2]
+        fusion = ExposureFusion(width, height, num_frames)
+        dst = np.empty((height, width, 3), np.uint8)
+        for bracket in brackets[:2]:
+            fusion.fuse(bracket, dst)
+        elapsed = []
+        for index in range(iterations):
+            start = time.perf_counter()
+            fusion.fuse(brackets[index % len(brackets)], dst)
+            elapsed.append(time.perf_counter() - start)
+        elapsed_ms = np.array(elapsed) * 1000.0
+        input_fps = 1000.0 * num_frames / elapsed_ms.mean()
+        print(
+            "{}x{} x{} frames  mean {:7.2f} ms  p99 {:7.2f} ms  {:6.1f} fused fps  {:6.1f} input fps  ({} {:.0f} fps)".format(
+                width,
+                height,
+                num_frames,
+                elapsed_ms.mean(),
+                np.percentile(elapsed_ms, 99),
+                1000.0 / elapsed_ms.mean(),
+                input_fps,
+                "keeps up with" if input_fps >= camera_config.fps else "falls behind",
+                camera_config.fps,
+            )
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.camera_toml_path, args.recording, args.frames, args.iterations, args.cv_threads)
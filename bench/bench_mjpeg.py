@@ -0,0 +1,67 @@
+import sys
+import argparse
+import time
+from pathlib import Path
+
+import attr
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from scripts.camera import Camera
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare capture throughput and CPU use of the YUYV and MJPG pixel formats")
+    default_comm_path = str(Path(Path(__file__).parent.parent, "cfg/camera_parameter.toml"))
+    parser.add_argument("--camera-toml-path", "-c", type=str, default=default_comm_path)
+    parser.add_argument("--duration", "-t", type=float, default=10.0, help="seconds per format")
+    parser.add_argument("--decode-workers", "-w", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--emulated", "-e", action="store_true", help="use the unpaced emulator instead of the camera")
+    return parser.parse_args()
+
+
+def open_camera(camera_config, emulated, decode_workers):
+    if emulated:
+        camera, _ = emulated_camera(camera_config, realtime=False, threaded_capture=True, decode_workers=decode_workers)
+        return camera
+    return Camera(camera_config, threaded_capture=True, decode_workers=decode_workers)
+
+
+def measure(camera_config, emulated, decode_workers, duration):
+    camera = open_camera(camera_config, emulated, decode_workers)
+    first = camera.next_frame(0, timeout=5.0)
+    if first is None:
+        camera.release()
+        raise RuntimeError("no frame within 5 s")
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    time.sleep(duration)
+    last = camera.latest_frame()
+    cpu, wall = time.process_time() - cpu_start, time.monotonic() - wall_start
+    stats = camera.stats()
+    camera.release()
+    return (last.sequence - first.sequence) / wall, 100.0 * cpu / wall, stats
+
+
+def main(camera_toml_path, duration, decode_workers, emulated):
+    camera_config = get_config(camera_toml_path)
+    runs = [("YUYV", 1)] + [("MJPG", workers) for workers in decode_workers]
+    for fourcc, workers in runs:
+        fps, cpu_percent, stats = measure(attr.evolve(camera_config, fourcc=fourcc), emulated, workers, duration)
+        counters = stats["counters"]
+        print(
+            "{} decode_workers={}  {:6.1f} fps  CPU {:6.1f} %  read p50 {} ms  dropped {}  decode overruns {}".format(
+                fourcc,
+                workers if fourcc == "MJPG" else "-",
+                fps,
+                cpu_percent,
+                stats["latency"]["capture_read"]["p50_ms"],
+                counters.get("frames_dropped", 0),
+                counters.get("decode_overruns", 0),
+            )
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.camera_toml_path, args.duration, args.decode_workers, args.emulated)
@@ -0,0 +1,73 @@
+import sys
+import argparse
+import json
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter so module imports are cold
+_PROBE = """
+import time
+start = time.perf_counter()
+import json
+import sys
+sys.path.insert(0, {repo_root!r})
+from scripts.camera_config import get_config
+config_imported = time.perf_counter()
+camera_config = get_config({camera_toml_path!r})
+config_loaded = time.perf_counter()
+from scripts.camera import Camera
+camera_imported = time.perf_counter()
+if {emulated!r}:
+    from scripts.emulator import emulated_camera
+    camera, _ = emulated_camera(camera_config, map_cache_dir={map_cache_dir!r})
+else:
+    camera = Camera(camera_config, map_cache_dir={map_cache_dir!r})
+camera_opened = time.perf_counter()
+assert camera.update()
+first_frame = time.perf_counter()
+camera.release()
+print(json.dumps({{
+    "import_config_ms": (config_imported - start) * 1000.0,
+    "load_config_ms": (config_loaded - config_imported) * 1000.0,
+    "import_camera_ms": (camera_imported - config_loaded) * 1000.0,
+    "open_camera_ms": (camera_opened - camera_imported) * 1000.0,
+    "first_update_ms": (first_frame - camera_opened) * 1000.0,
+    "time_to_first_frame_ms": (first_frame - start) * 1000.0,
+}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure cold import time and time-to-first-frame in fresh interpreters")
+    default_comm_path = str(Path(REPO_ROOT, "cfg/camera_parameter.toml"))
+    parser.add_argument("--camera-toml-path", "-c", type=str, default=default_comm_path)
+    parser.add_argument("--runs", "-n", type=int, default=5)
+    parser.add_argument("--emulated", "-e", action="store_true", help="use the emulator instead of the camera")
+    parser.add_argument("--map-cache-dir", type=str, default=None)
+    parser.add_argument("--json", type=str, default=None, help="append the medians as one JSON line to this file")
+    return parser.parse_args()
+
+
+def main(camera_toml_path, runs, emulated, map_cache_dir, json_path):
+    probe = _PROBE.format(
+        repo_root=str(REPO_ROOT), camera_toml_path=str(Path(camera_toml_path).resolve()), emulated=emulated, map_cache_dir=map_cache_dir
+    )
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    medians = {key: round(float(np.median([result[key] for result in results])), 2) for key in results[0]}
+    for key, value in medians.items():
+        print("{:<24} {:8.2f} ms".format(key, value))
+    if json_path is not None:
+        with open(json_path, "a") as f:
+            f.write(json.dumps(dict(medians, emulated=emulated, runs=runs)) + "\n")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.camera_toml_path, args.runs, args.emulated, args.map_cache_dir, args.json)
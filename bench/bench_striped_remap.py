@@ -0,0 +1,65 @@
+import sys
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from scripts.camera import fisheye_undistort_rectify_map
+from scripts.camera_config import get_config
+from scripts.remap_engine import StripedRemapper
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare Camera.remap_image (single cv2.remap) with the striped remap engine")
+    default_comm_path = str(Path(Path(__file__).parent.parent, "cfg/camera_parameter.toml"))
+    parser.add_argument("--camera-toml-path", "-c", type=str, default=default_comm_path)
+    parser.add_argument("--stripes", "-s", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--iterations", "-n", type=int, default=200)
+    parser.add_argument("--cv-threads", type=int, default=None, help="cv2.setNumThreads value (OpenCV's own parallelism)")
+    return parser.parse_args()
+
+
+def measure(func, iterations):
+    for _ in range(5):
+        func()
+    elapsed = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - start)
+    return np.array(elapsed) * 1000.0
+
+
+def report(name, elapsed_ms):
+    print(
+        "{:<24} mean {:7.3f} ms  p50 {:7.3f} ms  p99 {:7.3f} ms  {:7.1f} fps".format(
+            name, elapsed_ms.mean(), np.percentile(elapsed_ms, 50), np.percentile(elapsed_ms, 99), 1000.0 / elapsed_ms.mean()
+        )
+    )
+
+
+def main(camera_toml_path, stripes, iterations, cv_threads):
+    if cv_threads is not None:
+        cv2.setNumThreads(cv_threads)
+    camera_config = get_config(camera_toml_path)
+    map1, map2 = fisheye_undistort_rectify_map(camera_config)
+    src = np.random.randint(0, 255, (camera_config.height, camera_config.width, 3), np.uint8)
+    dst = np.empty_like(src)
+
+    print("OpenCV {} ({} threads), {}x{}".format(cv2.__version__, cv2.getNumThreads(), camera_config.width, camera_config.height))
+    report(
+        "remap_image (baseline)",
+        measure(lambda: cv2.remap(src, map1, map2, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT), iterations),
+    )
+    for num_stripes in stripes:
+        remapper = StripedRemapper(map1, map2, num_stripes)
+        report("striped x{}".format(num_stripes), measure(lambda: remapper.remap(src, dst), iterations))
+        remapper.shutdown()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.camera_toml_path, args.stripes, args.iterations, args.cv_threads)
@@ -1,13 +1,10 @@
 import sys
-import cvui
 import argparse
-import cv2
-import numpy as np
 
 from pathlib import Path
 from scripts.camera import Camera
 from scripts.camera_config import get_config
-from functools import partial
+from scripts.preview import PreviewWindow
 
 
 def parse_args():
@@ -18,70 +15,29 @@ def parse_args():
     return parser.parse_args()
 
 
-def scaling_int(int_num, scale):
-    return int(int_num * scale)
-
-
-def main(camera_toml_path, enable_distortion_correction, scale_val = 0.65):
+def main(camera_toml_path, enable_distortion_correction, scale_val=0.65):
     camera_config = get_config(camera_toml_path)
-    camera = Camera(camera_config)
-    print(camera)
-
-    scaling = partial(scaling_int, scale=scale_val)
     if camera_config.roi_size != 4:
         sys.exit('This script is only supported on "camera_config.roi_size == 4" ')
     if camera_config.auto_exposure != "roi":
         sys.exit('This script is only supported on "camera_config.auto_exposure == roi" ')
+    camera = Camera(camera_config, threaded_capture=True)
+    print(camera)
 
     image_width = camera.image_width
     image_height = camera.image_height
+    preview = PreviewWindow(camera, scale=scale_val, undistort=enable_distortion_correction)
 
-    roi = cvui.Rect(0, 0, 0, 0)
-    WINDOW_NAME = "Capture"
-    cvui.init(WINDOW_NAME)
-    click_pos_x = image_width // 2
-    click_pos_y = image_height // 2
-
-    while True:
-        key = cv2.waitKey(10)
-        frame = np.zeros((scaling(image_height), scaling(image_width), 3), np.uint8)
-        frame[:] = (49, 52, 49)
-
-        status = camera.update()
-        if status:
-            # WARNING:If distortion correction is enabled, the rectangle on windows doesn't indicate actual RoI area for auto exposure.
-            see3cam_rgb_image = camera.remap_image if enable_distortion_correction else camera.image
-            scaled_width = scaling(image_width)
-            scaled_height = scaling(image_height)
-            see3cam_rgb_image_resized = cv2.resize(see3cam_rgb_image, (scaled_width, scaled_height))
-            frame[:scaled_height, :scaled_width, :] = see3cam_rgb_image_resized
-
-            window_w = image_width // 2
-            window_h = image_height // 2
-            if cvui.mouse(cvui.DOWN):
-                click_pos_x = int(cvui.mouse().x / scale_val)
-                click_pos_y = int(cvui.mouse().y / scale_val)
-
-            camera.set_roi_properties(click_pos_x, click_pos_y, win_size=4)
-            roi = cvui.Rect(scaling(click_pos_x - image_width // 4), scaling(click_pos_y - image_height // 4), scaling(window_w), scaling(window_h))
-
-            # Ensure ROI is within bounds
-            roi.x = 0 if roi.x < 0 else roi.x
-            roi.y = 0 if roi.y < 0 else roi.y
-
-            roi.width = roi.width + scaled_width - (roi.x + roi.width) if roi.x + roi.width > scaled_width else roi.width
-            roi.height = roi.height + scaled_height - (roi.y + roi.height) if roi.y + roi.height > scaled_height else roi.height
-
-            cvui.rect(frame, roi.x, roi.y, roi.width, roi.height, 0xFF0000)
-
-        if key == 27 or key == ord("q"):
-            break
+    def move_roi(click_pos_x, click_pos_y):
+        # With distortion correction the click is in undistorted coordinates, which the camera maps back to the sensor
+        camera.set_roi_properties(click_pos_x, click_pos_y, win_size=4, rectified=enable_distortion_correction)
+        preview.set_rectangle("roi", (click_pos_x - image_width // 4, click_pos_y - image_height // 4, image_width // 2, image_height // 2))
 
-        cvui.update()
-        cvui.imshow(WINDOW_NAME, frame)
-    cv2.destroyAllWindows()
+    move_roi(image_width // 2, image_height // 2)
+    preview.run(on_click=move_roi)
+    camera.release()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(args.camera_toml_path, args.enable_distortion_correction)
\ No newline at end of file
+    main(args.camera_toml_path, args.enable_distortion_correction)
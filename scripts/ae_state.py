@@ -0,0 +1,63 @@
+from threading import Lock
+from typing import Optional
+
+from attr import dataclass
+
+from scripts.hid_codec import AutoExpDisabled, AutoExpManual
+from scripts.metrics import Counter
+
+
+@dataclass(frozen=True)
+class AutoExposureState:
+    """ AE state of the firmware in HID units: mode (AutoExp*), RoI center (0..255) and window size """
+
+    mode: int
+    xcord: int = 0
+    ycord: int = 0
+    win_size: int = 0
+
+    def matches(self, device_state: "AutoExposureState") -> bool:
+        """ Compare with a state read back from the device; the RoI only counts in manual mode, the window unless disabled """
+        if self.mode != device_state.mode:
+            return False
+        if self.mode == AutoExpManual and (self.xcord, self.ycord) != (device_state.xcord, device_state.ycord):
+            return False
+        return self.mode == AutoExpDisabled or self.win_size == device_state.win_size
+
+
+class AutoExposureStateCache(object):
+    """Local copy of the device AE state, written from acknowledged SET commands so reads need no HID round trip.
+
+    `reconcile` compares it with a state read from the device; on a mismatch the device wins and `drift_counter` is
+    incremented. The cache is empty until the first acknowledged command, and after `invalidate`.
+    """
+
+    def __init__(self, drift_counter: Optional[Counter] = None):
+        self._state: Optional[AutoExposureState] = None
+        self._lock = Lock()
+        self._drift_counter = drift_counter if drift_counter is not None else Counter()
+
+    @property
+    def state(self) -> Optional[AutoExposureState]:
+        return self._state
+
+    @property
+    def drift_count(self) -> int:
+        return self._drift_counter.value
+
+    def update(self, state: AutoExposureState):
+        with self._lock:
+            self._state = state
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def reconcile(self, device_state: AutoExposureState) -> bool:
+        """ Adopt the device state. Returns False (and counts a drift) when it differs from a cached state """
+        with self._lock:
+            drifted = self._state is not None and not self._state.matches(device_state)
+            if drifted:
+                self._drift_counter.inc()
+            self._state = device_state
+        return not drifted
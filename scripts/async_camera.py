@@ -0,0 +1,165 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+from scripts.frame_ring import DropPolicy, RingFrame
+
+
+class FrameSubscription(object):
+    """Bounded frame queue of one consumer, filled on the event loop.
+
+    When the queue is full the oldest frame is dropped, so a slow consumer only loses its own frames. Frames are views
+    into the camera ring (no copy); a frame the ring overwrote before it was taken is dropped as well. `dropped` counts
+    both.
+    """
+
+    def __init__(self, owner: "AsyncCamera", maxsize: int):
+        if maxsize < 1:
+            raise ValueError("FrameSubscription needs maxsize >= 1, got {}".format(maxsize))
+        self._owner = owner
+        self._frames = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.dropped = 0
+
+    def _put(self, frame: RingFrame):
+        if len(self._frames) == self._frames.maxlen:
+            self.dropped += 1
+        self._frames.append(frame)
+        self._ready.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._frames)
+
+    async def get(self) -> Optional[RingFrame]:
+        """ Next frame, None once the subscription is closed """
+        while True:
+            while not self._frames:
+                if self._closed:
+                    return None
+                self._ready.clear()
+                await self._ready.wait()
+            frame = self._frames.popleft()
+            if self._owner.camera.get_frame(frame.sequence) is not None:
+                return frame
+            self.dropped += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._ready.set()
+        self._owner._unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> RingFrame:
+        frame = await self.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+
+class AsyncCamera(object):
+    """asyncio facade over a Camera.
+
+    The camera runs threaded capture; every committed frame is handed from the capture thread to the event loop with one
+    `call_soon_threadsafe` and fanned out to the subscriptions there, so nothing on the loop blocks on the device. HID
+    commands go through the camera's HID worker and are awaited as futures.
+    Frames are ring views: a consumer has to be done with a frame before the ring laps it (`ring_size` frames later),
+    so queues should stay shorter than the ring. The ring must use the keep_newest drop policy, so capture never waits
+    for the loop.
+    Without `loop` it has to be constructed on the running event loop the frames are delivered to.
+    """
+
+    def __init__(self, camera, loop: Optional[asyncio.AbstractEventLoop] = None, owns_camera: bool = False):
+        if camera.drop_policy != DropPolicy.KeepNewest:
+            raise ValueError("AsyncCamera needs a camera with the keep_newest drop policy, got {}".format(camera.drop_policy.value))
+        self._camera = camera
+        self._loop = loop if loop is not None else asyncio.get_running_loop()
+        self._owns_camera = owns_camera
+        self._subscriptions: List[FrameSubscription] = []
+        self._closed = False
+        camera.add_frame_listener(self._on_frame)
+        # Capture started here is stopped again by aclose, so a camera that is not owned is left as it was found
+        self._started_capture = not camera.is_capturing
+        if self._started_capture:
+            camera.start_capture()
+
+    @classmethod
+    async def open(cls, camera_config, **camera_kwargs) -> "AsyncCamera":
+        """ Construct the Camera (device open, AE command, map loading) off the event loop """
+        from scripts.camera import Camera
+
+        loop = asyncio.get_running_loop()
+        camera = await loop.run_in_executor(None, lambda: Camera(camera_config, **camera_kwargs))
+        try:
+            return cls(camera, loop, owns_camera=True)
+        except ValueError:
+            await loop.run_in_executor(None, camera.release)
+            raise
+
+    @property
+    def camera(self):
+        return self._camera
+
+    def _on_frame(self, frame: RingFrame):
+        # Capture thread
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, frame)
+        except RuntimeError:
+            # The loop was closed while the camera kept capturing
+            pass
+
+    def _dispatch(self, frame: RingFrame):
+        for subscription in self._subscriptions:
+            subscription._put(frame)
+
+    def subscribe(self, maxsize: int = 2) -> FrameSubscription:
+        """ New queue receiving every frame from now on. Call from the event loop """
+        subscription = FrameSubscription(self, maxsize)
+        self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def _unsubscribe(self, subscription: FrameSubscription):
+        self._subscriptions = [registered for registered in self._subscriptions if registered is not subscription]
+
+    async def frames(self, maxsize: int = 2) -> AsyncIterator[RingFrame]:
+        """ Frames of a subscription that lives as long as the iteration """
+        subscription = self.subscribe(maxsize)
+        try:
+            async for frame in subscription:
+                yield frame
+        finally:
+            subscription.close()
+
+    def __aiter__(self) -> AsyncIterator[RingFrame]:
+        return self.frames().__aiter__()
+
+    async def set_auto_exposure_mode(self, requested_auto_exposure_mode: str) -> bool:
+        return await asyncio.wrap_future(self._camera.submit_auto_exposure_mode(requested_auto_exposure_mode), loop=self._loop)
+
+    async def set_roi_properties(self, xcord, ycord, win_size=4, rectified=False) -> bool:
+        return await asyncio.wrap_future(self._camera.submit_roi_properties(xcord, ycord, win_size, rectified), loop=self._loop)
+
+    async def aclose(self):
+        """Stop delivering frames; the camera is released (off the loop) when it was opened by `open`, otherwise the
+        threaded capture is stopped (off the loop) if this facade started it"""
+        if self._closed:
+            return
+        self._closed = True
+        self._camera.remove_frame_listener(self._on_frame)
+        for subscription in list(self._subscriptions):
+            subscription.close()
+        if self._owns_camera:
+            await self._loop.run_in_executor(None, self._camera.release)
+        elif self._started_capture:
+            await self._loop.run_in_executor(None, self._camera.stop_capture)
+
+    async def __aenter__(self) -> "AsyncCamera":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
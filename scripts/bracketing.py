@@ -0,0 +1,214 @@
+import math
+from collections import OrderedDict
+from threading import Condition, Lock
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from attr import dataclass
+
+from scripts.frame_ring import RingFrame
+from scripts.roi_stats import luma_view
+from scripts.see3cam_api import roi_to_hid_coordinates
+
+
+@dataclass(frozen=True)
+class Bracket:
+    """ One frame per sweep RoI, in sweep order, with the ring sequence and the acknowledged AE state it was captured at """
+
+    images: List[np.ndarray]
+    sequences: List[int]
+    roi_states: List[tuple]
+
+
+def dark_and_bright_roi_points(gray: np.ndarray, grid: Tuple[int, int] = (8, 8)) -> List[Tuple[int, int]]:
+    """ Centers of the darkest and the brightest cell of a `grid` (columns, rows) over a gray image, in pixels """
+    columns, rows = grid
+    height, width = gray.shape[:2]
+    cell_means = cv2.resize(gray, (columns, rows), interpolation=cv2.INTER_AREA)
+    _, _, darkest, brightest = cv2.minMaxLoc(cell_means)
+    return [(int((column + 0.5) * width / columns), int((row + 0.5) * height / rows)) for column, row in [darkest, brightest]]
+
+
+class RoiBracketSweep(object):
+    """Exposure brackets from the firmware AE: the AE RoI is swept over `roi_points` and one frame is kept per point.
+
+    Metering on a dark region makes the AE expose longer, metering on a bright one shorter, so a sweep over dark and
+    bright regions (see `dark_and_bright_roi_points`) yields the input of scripts.exposure_fusion.
+    Every committed frame is tagged with the AE state the device had acknowledged at that time (`roi_state`). The
+    acknowledgement only means the firmware took the new RoI, its AE converges over the following frames. So once the
+    frames carry the state of the current point, the mean luma of each frame is measured and a frame is kept when at
+    least `min_settle_frames` frames carry the state and the luma changed by at most `settle_tolerance` gray levels
+    since the previous frame. After `max_settle_frames` the frame is kept anyway and counted in `unsettled` (e.g. a
+    scene that never stops changing). Then the RoI moves on. A point whose command is not acknowledged within
+    `retry_frames` frames is sent again (`retries`).
+    Completed brackets are copied out of the ring into preallocated buffers. Only the newest completed bracket waits for
+    the consumer, older ones are dropped (`dropped`). The images of a bracket returned by `next_bracket` stay valid until
+    the next call.
+    """
+
+    def __init__(
+        self,
+        camera,
+        roi_points: Sequence[Tuple[int, int]],
+        win_size: int = 4,
+        min_settle_frames: int = 3,
+        settle_tolerance: float = 1.5,
+        max_settle_frames: int = 30,
+        rectified: bool = False,
+        retry_frames: int = 30,
+        history: int = 64,
+    ):
+        if len(roi_points) < 2:
+            raise ValueError("RoiBracketSweep needs at least 2 RoI points, got {}".format(len(roi_points)))
+        if not 1 <= min_settle_frames <= max_settle_frames:
+            raise ValueError(
+                "RoiBracketSweep needs 1 <= min_settle_frames <= max_settle_frames, got {} and {}".format(min_settle_frames, max_settle_frames)
+            )
+        self._camera = camera
+        if rectified:
+            roi_points = [camera.rectified_roi_mapper.to_raw(x, y) for x, y in roi_points]
+        self._roi_points = [(int(round(x)), int(round(y))) for x, y in roi_points]
+        self._win_size = win_size
+        width, height = camera.image_width, camera.image_height
+        # The acknowledged state of each point, as Camera.acknowledged_auto_exposure_state reports it
+        self._targets = [("roi",) + roi_to_hid_coordinates(x, y, width, height) + (win_size,) for x, y in self._roi_points]
+        if len(set(self._targets)) != len(self._targets):
+            raise ValueError("RoI points {} map to the same firmware RoI".format(self._roi_points))
+        self._min_settle_frames = min_settle_frames
+        self._settle_tolerance = settle_tolerance
+        self._max_settle_frames = max_settle_frames
+        self._retry_frames = retry_frames
+        self._history = history
+        self._tags: "OrderedDict[int, Optional[tuple]]" = OrderedDict()
+
+        # One bracket filling, one waiting for the consumer and one held by it
+        shape = (height, width, 3)
+        self._slots = [[np.empty(shape, np.uint8) for _ in self._targets] for _ in range(3)]
+        self._filling = 0
+        self._ready: Optional[int] = None
+        self._held: Optional[int] = None
+        self._ready_bracket: Optional[Bracket] = None
+        self._sequences: List[int] = []
+        self._states: List[tuple] = []
+        self._point = 0
+        self._settled = 0
+        self._waited = 0
+        self._previous_luma = math.nan
+        self._cond = Condition()
+        # Held by the frame listener, so no frame is processed (and no RoI sent) once stop() returned
+        self._frame_lock = Lock()
+        self._running = False
+        self.dropped = 0
+        self.retries = 0
+        self.unsettled = 0
+
+    @property
+    def roi_points(self) -> List[Tuple[int, int]]:
+        """ Sweep points in raw sensor pixels """
+        return list(self._roi_points)
+
+    def roi_state(self, sequence: int) -> Optional[tuple]:
+        """ Acknowledged AE state when frame `sequence` was committed, None if unknown or older than `history` frames """
+        with self._cond:
+            return self._tags.get(sequence)
+
+    def start(self):
+        with self._frame_lock:
+            if self._running:
+                return
+            self._running = True
+            self._point, self._settled, self._waited = 0, 0, 0
+            self._previous_luma = math.nan
+            self._sequences, self._states = [], []
+        self._camera.add_frame_listener(self._on_frame)
+        self._request_point()
+
+    def stop(self):
+        with self._frame_lock:
+            if not self._running:
+                return
+            self._running = False
+        self._camera.remove_frame_listener(self._on_frame)
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self) -> "RoiBracketSweep":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _request_point(self):
+        x, y = self._roi_points[self._point]
+        self._camera.set_roi_properties(x, y, win_size=self._win_size)
+
+    def _on_frame(self, frame: RingFrame):
+        # Capture thread
+        with self._frame_lock:
+            if self._running:
+                self._process_frame(frame)
+
+    def _process_frame(self, frame: RingFrame):
+        state = self._camera.acknowledged_auto_exposure_state
+        with self._cond:
+            self._tags[frame.sequence] = state
+            while len(self._tags) > self._history:
+                self._tags.popitem(last=False)
+
+        if state != self._targets[self._point]:
+            # The luma of a frame metered on another RoI says nothing about the convergence on this one
+            self._settled, self._previous_luma = 0, math.nan
+            self._waited += 1
+            if self._waited >= self._retry_frames:
+                self.retries += 1
+                self._waited = 0
+                self._request_point()
+            return
+        # The exposure is global, a sparse sample of the whole frame shows when the AE stopped moving
+        luma = float(np.mean(luma_view(frame.data, step=8)))
+        previous_luma, self._previous_luma = self._previous_luma, luma
+        self._settled += 1
+        if self._settled < self._min_settle_frames:
+            return
+        converged = abs(luma - previous_luma) <= self._settle_tolerance
+        if not converged:
+            if self._settled < self._max_settle_frames:
+                return
+            self.unsettled += 1
+
+        image = self._slots[self._filling][self._point]
+        if self._camera.raw_yuyv:
+            cv2.cvtColor(frame.data, cv2.COLOR_YUV2BGR_YUYV, dst=image)
+        else:
+            np.copyto(image, frame.data)
+        self._sequences.append(frame.sequence)
+        self._states.append(state)
+        self._point = (self._point + 1) % len(self._targets)
+        self._settled, self._waited, self._previous_luma = 0, 0, math.nan
+        if self._point == 0:
+            self._complete()
+        self._request_point()
+
+    def _complete(self):
+        with self._cond:
+            bracket = Bracket(list(self._slots[self._filling]), self._sequences, self._states)
+            if self._ready is not None:
+                self.dropped += 1
+                free = self._ready
+            else:
+                free = ({0, 1, 2} - {self._filling, self._held}).pop()
+            self._ready, self._ready_bracket = self._filling, bracket
+            self._filling = free
+            self._cond.notify_all()
+        self._sequences, self._states = [], []
+
+    def next_bracket(self, timeout: Optional[float] = None) -> Optional[Bracket]:
+        """ Newest completed bracket not returned before; None after `timeout` or when the sweep is stopped """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ready is not None or not self._running, timeout) or self._ready is None:
+                return None
+            self._held, self._ready = self._ready, None
+            bracket, self._ready_bracket = self._ready_bracket, None
+            return bracket
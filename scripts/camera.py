@@ -1,20 +1,39 @@
-from datetime import datetime
-from threading import RLock
-from typing import Optional
+import math
+import os
+import time
+from concurrent.futures import Future
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 from enum import Enum
-from attr import dataclass, fields
+from scripts.ae_state import AutoExposureState, AutoExposureStateCache
+from scripts.camera_config import CameraConfig, FromDict  # re-exported, CameraConfig used to live here
+from scripts.hid_scheduler import HidCommandScheduler
+from scripts.metrics import Metrics, MetricsExporter, bind_hid_metrics, hid_metrics
+from scripts.frame_products import FrameProductCache
+from scripts.frame_ring import DropDetector, DropPolicy, FrameRing, RingFrame
+from scripts.output_profile import OutputProfile
+from scripts.hid_codec import roi_to_hid_coordinates_array
+from scripts.rectified_roi import RectifiedRoiMapper
+from scripts.remap_cache import cached_fisheye_undistort_rectify_map, cached_profile_maps
 from scripts.see3cam_api import (
+    AutoExpCentered,
+    AutoExpDisabled,
+    AutoExpManual,
     enable_centered_auto_exposure,
     enable_lower_center_roi_auto_exposure,
     enable_roi_auto_exposure,
     disable_auto_exposure,
     get_hid_handle_from_device_id,
-    get_auto_exposure_property,
+    hid_command,
+    roi_to_hid_coordinates,
 )
 
+# Every SET_AE_ROI_MODE command overwrites the same firmware state, so they share one scheduler key
+_AUTO_EXPOSURE_KEY = "auto_exposure"
+
 
 class AutoExposureMode(Enum):
     Centered = 0x01
@@ -22,94 +41,144 @@ class AutoExposureMode(Enum):
     Disable = 0x03
 
 
-class FromDict:
-    @classmethod
-    def from_dict(cls, _dict):
-        init_kwargs = {}
-        for field in fields(cls):
-            field_value = _dict[field.name] if field.name in _dict.keys() else None
-            init_kwargs[field.name] = field_value
-        return cls(**init_kwargs)
-
-
-@dataclass
-class CameraConfig(FromDict):
-    device_id: str
-    width: int
-    height: int
-    fps: int
-    fx: float
-    fy: float
-    cx: float
-    cy: float
-    k1: float
-    k2: float
-    k3: float
-    k4: float
-    auto_exposure: Optional[str]
-    roi_size: Optional[int]
-
-
 def confirm_prop(cap, prop_id, value_arg):
     value_act = cap.get(prop_id)
     if value_act != value_arg:
         raise RuntimeError("failed to set property. arg: {}, act: {}".format(value_arg, value_act))
 
 
-def fisheye_undistort_rectify_map(cfg: CameraConfig):
+def fisheye_camera_parameters(cfg: CameraConfig):
     camera_mat = np.array([[cfg.fx, 0.0, cfg.cx], [0.0, cfg.fy, cfg.cy], [0.0, 0.0, 1.0]])
     dist_coef = np.array([[cfg.k1, cfg.k2, cfg.k3, cfg.k4]])
     projection_camera_mat = cv2.getOptimalNewCameraMatrix(camera_mat, dist_coef, (cfg.width, cfg.height), 0)[0]
+    return camera_mat, dist_coef, projection_camera_mat
+
+
+def fisheye_undistort_rectify_map(cfg: CameraConfig):
+    camera_mat, dist_coef, projection_camera_mat = fisheye_camera_parameters(cfg)
     DIM = (cfg.width, cfg.height)
     return cv2.fisheye.initUndistortRectifyMap(camera_mat, dist_coef, np.eye(3), projection_camera_mat, DIM, cv2.CV_16SC2)
 
 
-def get_cv2_video(cfg: CameraConfig) -> cv2.VideoCapture:
+def get_cv2_video(cfg: CameraConfig, raw_yuyv: bool = False) -> cv2.VideoCapture:
+    """ With `raw_yuyv` the YUYV buffers are returned as (height, width, 2) without conversion to BGR """
     cap = cv2.VideoCapture(cfg.device_id)
     if not cap.isOpened():
         raise RuntimeError("failed to open camera. device id : {} ".format(cfg.device_id))
+    fourcc = "YUYV" if raw_yuyv and cfg.fourcc is None else cfg.fourcc
+    if fourcc is not None:
+        # V4L2 picks the frame sizes offered for the pixel format, so the format goes first
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, cfg.width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cfg.height)
     cap.set(cv2.CAP_PROP_FPS, cfg.fps)
     confirm_prop(cap, cv2.CAP_PROP_FRAME_WIDTH, cfg.width)
     confirm_prop(cap, cv2.CAP_PROP_FRAME_HEIGHT, cfg.height)
     confirm_prop(cap, cv2.CAP_PROP_FPS, cfg.fps)
+    if fourcc is not None:
+        confirm_prop(cap, cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if fourcc == "MJPG" or raw_yuyv:
+        # Hand out the compressed / raw buffers; Camera decodes or converts them when needed
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
     return cap
 
 
-class Frame(object):
-    def __init__(self):
-        self._data: np.ndarray = []
-        self._timestamp: Optional[datetime] = None
-        self._lock: RLock = RLock()
-
-    @property
-    def timestamp(self) -> Optional[datetime]:
-        with self._lock:
-            return self._timestamp
-
-    @property
-    def data(self) -> np.ndarray:
-        with self._lock:
-            return self._data
-
-    @data.setter
-    def data(self, value: np.ndarray) -> None:
-        with self._lock:
-            self._timestamp = datetime.now()
-            self._data = value
-
-
 class Camera:
-    def __init__(self, camera_config: CameraConfig):
-        self._cap = get_cv2_video(camera_config)
-        self._map1, self._map2 = fisheye_undistort_rectify_map(camera_config)
+    def __init__(
+        self,
+        camera_config: CameraConfig,
+        threaded_capture: bool = False,
+        ring_size: int = 4,
+        drop_policy: str = "keep_newest",
+        map_cache_dir: Optional[str] = None,
+        output_profiles: Sequence[OutputProfile] = (),
+        remap_stripes: int = 1,
+        hid_rate_hz: Optional[float] = 30.0,
+        capture=None,
+        hid_handle: Optional[int] = None,
+        on_frame_drop: Optional[Callable[[int, RingFrame], None]] = None,
+        decode_workers: int = 2,
+        raw_yuyv: bool = False,
+        ae_verify_interval: Optional[float] = None,
+        product_cache_size: int = 8,
+    ):
+        """`capture` (anything with the cv2.VideoCapture read/get/set/release interface) and `hid_handle` replace the
+        devices opened from `camera_config.device_id`, e.g. to run against scripts.emulator.
+        With `camera_config.fourcc == "MJPG"` frames are decoded on `decode_workers` threads.
+        With `raw_yuyv` the ring holds the YUYV buffers: `luma` and `remap_luma` work on the Y plane directly and BGR is
+        only converted when `image` is accessed.
+        The AE state is cached from acknowledged commands; with `ae_verify_interval` (seconds) a background thread reads it
+        back from the device that often and counts mismatches as `ae_state_drift`.
+        Undistorted, gray and downscaled versions of a frame are computed once and shared by every reader; at most
+        `product_cache_size` of them are kept.
+        """
+        if raw_yuyv and camera_config.fourcc not in [None, "YUYV"]:
+            raise ValueError("raw_yuyv needs the YUYV pixel format, got {}".format(camera_config.fourcc))
+        self._camera_config = camera_config
+        self._map_cache_dir = map_cache_dir
+        self._metrics = Metrics({"device": str(camera_config.device_id)})
+        self._metrics_exporter: Optional[MetricsExporter] = None
+        self._raw_yuyv = raw_yuyv
         self._image_width = camera_config.width
         self._image_height = camera_config.height
+        self._ae_state = AutoExposureStateCache(self._metrics.counter("ae_state_drift"))
+        self._ae_verify_stop = Event()
+        self._ae_verify_thread: Optional[Thread] = None
+        # Set while the device is gone (between disconnect and a successful reconnect)
+        self._disconnected_ns: Optional[int] = None
+        self._resume_capture = False
+        # The AE command goes out on the HID worker while the video device is opened and the maps are loaded
+        self._hid_scheduler = HidCommandScheduler(hid_rate_hz)
+        auto_exposure_ready = self._initialize_auto_exposure_mode(camera_config, hid_handle)
+        self._cap = capture if capture is not None else get_cv2_video(camera_config, raw_yuyv)
+        self._map1, self._map2 = cached_fisheye_undistort_rectify_map(camera_config, map_cache_dir)
+        if remap_stripes > 1:
+            from scripts.remap_engine import StripedRemapper
+
+            self._remapper = StripedRemapper(self._map1, self._map2, remap_stripes)
+        else:
+            self._remapper = None
         self._roi_size = camera_config.roi_size if camera_config.roi_size is not None else 4
-        self._frame = Frame()
+        self._rectified_roi_mapper: Optional[RectifiedRoiMapper] = None
+        self._output_profiles: Dict[str, OutputProfile] = {}
+        self._profile_maps = {}
+        self._profile_buffers: Dict[str, np.ndarray] = {}
+        for profile in output_profiles:
+            self.add_output_profile(profile)
+        channels = 2 if raw_yuyv else 3
+        self._ring = FrameRing(ring_size, (self._image_height, self._image_width, channels), drop_policy=DropPolicy(drop_policy))
+        # With raw_yuyv, one lazily converted BGR image per ring slot, tagged with the sequence it was converted from
+        self._bgr_buffers = [np.empty((self._image_height, self._image_width, 3), np.uint8) for _ in range(ring_size)] if raw_yuyv else []
+        self._bgr_sequences = [-1] * len(self._bgr_buffers)
+        self._bgr_locks = [Lock() for _ in self._bgr_buffers]
+        self._products = FrameProductCache(
+            product_cache_size, self._metrics.counter("product_cache_hits"), self._metrics.counter("product_cache_misses")
+        )
+        self._frame: Optional[RingFrame] = None
+        self._capture_thread: Optional[Thread] = None
+        self._capture_stop = Event()
+        self._read_latency = self._metrics.histogram("capture_read")
+        self._frames_dropped = self._metrics.counter("frames_dropped")
+        self._frames_skipped = self._metrics.counter("frames_skipped")
+        self._drop_detector = DropDetector(camera_config.fps, on_frame_drop)
+        self._shm_publishers: List[Tuple[object, bool]] = []
+        # Replaced, never mutated, so the capture thread can iterate it without a lock
+        self._frame_listeners: Tuple[Callable[[RingFrame], None], ...] = ()
+        self._shm_lock = Lock()
+        if camera_config.fourcc == "MJPG":
+            from scripts.mjpeg_decoder import OrderedJpegDecoder
+
+            self._jpeg_decoder = OrderedJpegDecoder(self._commit_decoded, decode_workers)
+        else:
+            self._jpeg_decoder = None
 
-        self._initialize_auto_exposure_mode(camera_config)
+        self._ae_status = auto_exposure_ready.result()
+        assert self._ae_status
+        if ae_verify_interval:
+            self._ae_verify_thread = Thread(target=self._verify_loop, args=(ae_verify_interval,), name="see3cam-ae-verify", daemon=True)
+            self._ae_verify_thread.start()
+        if threaded_capture:
+            self.start_capture()
 
     def __str__(self):
         aquired_auto_exposure_mode, ae_window_size = self.auto_exposure_setting
@@ -126,45 +195,489 @@ class Camera:
             f"  Window Size: {ae_window_size}"
         )
 
-    def _initialize_auto_exposure_mode(self, camera_config: CameraConfig):
-        self._hid_handle = get_hid_handle_from_device_id(camera_config.device_id)
-        if camera_config.auto_exposure is None:
-            self.set_auto_exposure_mode("centered")
-        else:
-            self.set_auto_exposure_mode(camera_config.auto_exposure)
+    def _initialize_auto_exposure_mode(self, camera_config: CameraConfig, hid_handle: Optional[int] = None) -> Future:
+        """ Open the HID endpoint and queue the configured AE mode. Returns the Future of the command status """
+        self._hid_handle = hid_handle if hid_handle is not None else get_hid_handle_from_device_id(camera_config.device_id)
+        self._hid_metrics = hid_metrics(self._hid_handle)
+        self._hid_metrics.labels.update(self._metrics.labels)
         self._auto_exposure_mode = camera_config.auto_exposure
+        return self._submit_auto_exposure_mode(camera_config.auto_exposure if camera_config.auto_exposure is not None else "centered")
 
     def set_auto_exposure_mode(self, requested_auto_exposure_mode: str):
+        self._ae_status = self._submit_auto_exposure_mode(requested_auto_exposure_mode).result()
+        assert self._ae_status
+
+    def submit_auto_exposure_mode(self, requested_auto_exposure_mode: str) -> Future:
+        """ Like set_auto_exposure_mode without waiting: returns the Future of the acknowledged status """
+        future = self._submit_auto_exposure_mode(requested_auto_exposure_mode)
+        future.add_done_callback(self._store_ae_status)
+        return future
+
+    def _store_ae_status(self, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            self._ae_status = future.result()
+
+    def _submit_auto_exposure_mode(self, requested_auto_exposure_mode: str) -> Future:
         if not requested_auto_exposure_mode in ["centered", "roi", "lower_center", "disabled"]:
             raise ValueError(f"\nNo such auto-exposure mode {requested_auto_exposure_mode}. Choose [centered, roi, disabled, lower_center]")
 
+        self._last_ae_request = (requested_auto_exposure_mode,)
+        if requested_auto_exposure_mode == "roi":
+            state = ("roi",) + roi_to_hid_coordinates(self.image_width // 2, self.image_height // 2, self.image_width, self.image_height) + (4,)
+        elif requested_auto_exposure_mode == "lower_center":
+            width, height = self.image_width, self.image_height
+            state = ("lower_center",) + roi_to_hid_coordinates(int(width / 2), int(height * 3 / 4), width, height) + (4,)
+        else:
+            state = (requested_auto_exposure_mode,)
+        return self._hid_scheduler.call_async(
+            lambda: self._send_auto_exposure_mode(requested_auto_exposure_mode), key=_AUTO_EXPOSURE_KEY, state=state
+        )
+
+    def _send_auto_exposure_mode(self, requested_auto_exposure_mode: str) -> bool:
+        width, height = self.image_width, self.image_height
         if requested_auto_exposure_mode == "centered":
-            self._ae_status = enable_centered_auto_exposure(self.image_width, self.image_height, self._hid_handle)
+            status = enable_centered_auto_exposure(width, height, self._hid_handle)
+            state = AutoExposureState(AutoExpCentered, 0, 0, 8)
         elif requested_auto_exposure_mode == "roi":
-            self._ae_status = enable_roi_auto_exposure(
-                self.image_width // 2, self.image_height // 2, self.image_width, self.image_height, self._hid_handle
-            )
+            status = enable_roi_auto_exposure(width // 2, height // 2, width, height, self._hid_handle)
+            state = AutoExposureState(AutoExpManual, *roi_to_hid_coordinates(width // 2, height // 2, width, height), 4)
         elif requested_auto_exposure_mode == "lower_center":
-            self._ae_status = enable_lower_center_roi_auto_exposure(self.image_width, self.image_height, self._hid_handle)
+            status = enable_lower_center_roi_auto_exposure(width, height, self._hid_handle)
+            state = AutoExposureState(AutoExpManual, *roi_to_hid_coordinates(int(width / 2), int(height * 3 / 4), width, height), 4)
         elif requested_auto_exposure_mode == "disabled":
-            self._ae_status = disable_auto_exposure(self.image_width, self.image_height, self._hid_handle)
-        assert self._ae_status
+            status = disable_auto_exposure(width, height, self._hid_handle)
+            state = AutoExposureState(AutoExpDisabled)
+        self._acknowledge_auto_exposure_state(status, state)
+        return status
+
+    def _acknowledge_auto_exposure_state(self, status: bool, state: AutoExposureState):
+        # Runs on the HID worker right after the reply, so the cache follows the order in which the device saw the commands
+        if status:
+            self._ae_state.update(state)
+        else:
+            self._ae_state.invalidate()
+
+    def _read_into_ring(self) -> bool:
+        if self._jpeg_decoder is not None:
+            return self._read_compressed()
+        buffer = self._ring.begin_write(timeout=0.1)
+        if buffer is None:
+            self._metrics.counter("capture_backpressure_waits").inc()
+            return False
+        start_ns = time.monotonic_ns()
+        ret, image = self._cap.read(image=buffer)
+        dequeue_ns = time.monotonic_ns()
+        self._read_latency.observe_ns(dequeue_ns - start_ns)
+        if not ret:
+            self._metrics.counter("capture_failures").inc()
+            return False
+        if image is not buffer:
+            # The backend returned a frame it could not decode in place (e.g. unexpected size, raw buffers as one row)
+            if image.size != buffer.size:
+                raise RuntimeError("unexpected frame shape. expected: {}, actual: {}".format(buffer.shape, image.shape))
+            np.copyto(buffer, image.reshape(buffer.shape))
+        # V4L2 reports the buffer timestamp here; backends without one return 0 or -1
+        driver_msec = self._cap.get(cv2.CAP_PROP_POS_MSEC)
+        self._ring.commit_write(dequeue_ns, driver_msec if driver_msec > 0 else math.nan)
+        self._on_frame_committed()
+        return True
+
+    def _read_compressed(self) -> bool:
+        start_ns = time.monotonic_ns()
+        ret, jpeg = self._cap.read()
+        dequeue_ns = time.monotonic_ns()
+        self._read_latency.observe_ns(dequeue_ns - start_ns)
+        if not ret:
+            self._metrics.counter("capture_failures").inc()
+            return False
+        driver_msec = self._cap.get(cv2.CAP_PROP_POS_MSEC)
+        if not self._jpeg_decoder.submit(jpeg.reshape(-1), (dequeue_ns, driver_msec if driver_msec > 0 else math.nan)):
+            self._metrics.counter("decode_overruns").inc()
+        return True
+
+    def _commit_decoded(self, image: Optional[np.ndarray], context):
+        """ Called by the JPEG decoder in capture order """
+        dequeue_ns, driver_msec = context
+        if image is None or image.shape != (self._image_height, self._image_width, 3):
+            self._metrics.counter("decode_failures").inc()
+            return
+        buffer = self._ring.begin_write(timeout=0.1)
+        if buffer is None:
+            self._metrics.counter("capture_backpressure_waits").inc()
+            return
+        np.copyto(buffer, image)
+        self._ring.commit_write(dequeue_ns, driver_msec)
+        self._on_frame_committed()
+
+    def _on_frame_committed(self):
+        frame = self._ring.latest()
+        self._frames_dropped.inc(self._drop_detector.check(frame))
+        for listener in self._frame_listeners:
+            listener(frame)
+        if self._shm_publishers:
+            with self._shm_lock:
+                for publisher, remapped in self._shm_publishers:
+                    self._publish_frame(publisher, remapped, frame)
+
+    def _publish_frame(self, publisher, remapped: bool, frame: RingFrame):
+        with self._metrics.span("shm_publish"):
+            buffer = publisher.begin_write()
+            if remapped and self._raw_yuyv:
+                # Published undistorted frames of a raw YUYV camera are luma only
+                np.copyto(self._publish_luma_buffer, frame.data[:, :, 0])
+                self._remap(self._publish_luma_buffer, buffer)
+            elif remapped:
+                self._remap(frame.data, buffer)
+            else:
+                np.copyto(buffer, frame.data)
+            publisher.commit_write(frame.monotonic_ns, frame.driver_msec)
+
+    def add_frame_listener(self, listener: Callable[[RingFrame], None]):
+        """ `listener(frame)` is called on the capture thread for every committed frame; it must return quickly """
+        self._frame_listeners = self._frame_listeners + (listener,)
+
+    def remove_frame_listener(self, listener: Callable[[RingFrame], None]):
+        self._frame_listeners = tuple(registered for registered in self._frame_listeners if registered is not listener)
+
+    def publish_shared_memory(self, name: Optional[str] = None, remapped: bool = False, num_slots: int = 8) -> str:
+        """Publish every captured frame (undistorted with `remapped`) into a shared memory ring that other processes attach
+        to with scripts.shm_ring.SharedFrameSubscriber. Returns the segment name. With raw_yuyv the raw ring publishes the
+        YUYV buffers and the undistorted ring the luma plane.
+        """
+        from scripts.shm_ring import SharedFramePublisher
+
+        if name is None:
+            name = "see3cam_{}_{}".format(os.path.basename(str(self._camera_config.device_id)), "remapped" if remapped else "raw")
+        if remapped and self._raw_yuyv:
+            shape = (self._image_height, self._image_width)
+            self._publish_luma_buffer = np.empty(shape, np.uint8)
+        else:
+            shape = (self._image_height, self._image_width, 2 if self._raw_yuyv else 3)
+        publisher = SharedFramePublisher(name, shape, num_slots)
+        with self._shm_lock:
+            self._shm_publishers.append((publisher, remapped))
+        return publisher.name
+
+    def stop_publishing(self, name: Optional[str] = None):
+        """ Close and unlink the named shared memory ring, or all of them """
+        with self._shm_lock:
+            closing = [entry for entry in self._shm_publishers if name is None or entry[0].name == name]
+            self._shm_publishers = [entry for entry in self._shm_publishers if entry not in closing]
+            for publisher, _ in closing:
+                publisher.close()
+
+    def _capture_loop(self):
+        while not self._capture_stop.is_set():
+            if not self._read_into_ring():
+                self._capture_stop.wait(0.005)
+
+    @property
+    def is_capturing(self) -> bool:
+        return self._capture_thread is not None
+
+    def start_capture(self):
+        """ Start draining the VideoCapture on a background thread """
+        if self._capture_thread is not None:
+            return
+        self._capture_stop.clear()
+        self._capture_thread = Thread(target=self._capture_loop, name="see3cam-capture", daemon=True)
+        self._capture_thread.start()
+
+    def stop_capture(self):
+        if self._capture_thread is None:
+            return
+        self._capture_stop.set()
+        self._ring.close()
+        self._capture_thread.join()
+        self._capture_thread = None
+        self._ring.reopen()
+
+    def release(self):
+        self.stop_capture()
+        if self._ae_verify_thread is not None:
+            self._ae_verify_stop.set()
+            self._ae_verify_thread.join()
+            self._ae_verify_thread = None
+        if self._jpeg_decoder is not None:
+            self._jpeg_decoder.shutdown()
+        self.stop_publishing()
+        if self._cap is not None:
+            self._cap.release()
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+            self._metrics_exporter = None
+        self._hid_scheduler.close()
+        if self._hid_handle is not None:
+            from scripts.hid_transport import close_hid_transport
+
+            close_hid_transport(self._hid_handle)
+            os.close(self._hid_handle)
+        if self._remapper is not None:
+            self._remapper.shutdown()
+
+    def disconnect(self):
+        """Stop capture and close the devices of a camera that was removed from the USB bus, until `reconnect`.
+
+        The time from this call until `reconnect` restored the AE state is observed as `hotplug_recovery`. Calling it again
+        while disconnected does nothing.
+        """
+        if self._disconnected_ns is not None:
+            return
+        self._disconnected_ns = time.monotonic_ns()
+        self._resume_capture = self.is_capturing
+        self.stop_capture()
+        self._close_devices()
+
+    def _close_devices(self):
+        from scripts.hid_transport import close_hid_transport
+
+        # The handles belong to the removed device (or to a failed reconnect attempt), errors from closing them are expected
+        if self._cap is not None:
+            try:
+                self._cap.release()
+            except cv2.error:
+                pass
+            self._cap = None
+        if self._hid_handle is not None:
+            close_hid_transport(self._hid_handle)
+            try:
+                os.close(self._hid_handle)
+            except OSError:
+                pass
+            self._hid_handle = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._disconnected_ns is None
+
+    def reconnect(self, capture=None, hid_handle: Optional[int] = None):
+        """Reopen the video device and the hidraw node after the camera was re-enumerated on the USB bus.
+
+        The remap tables, output profiles, ring and metrics are kept; the last AE mode / RoI is sent again and threaded
+        capture resumes if it was running at `disconnect` (called here when it was not). `capture` and `hid_handle`
+        replace the reopened devices like in the constructor. A failed attempt (e.g. the hidraw node does not exist yet)
+        raises and can simply be retried.
+        """
+        self.disconnect()
+        # Handles opened by a failed earlier attempt are closed and opened again
+        self._close_devices()
+        self._hid_handle = hid_handle if hid_handle is not None else get_hid_handle_from_device_id(self._camera_config.device_id)
+        bind_hid_metrics(self._hid_handle, self._hid_metrics)
+        self._cap = capture if capture is not None else get_cv2_video(self._camera_config, self._raw_yuyv)
+        # Whatever the firmware held was lost with the reset
+        self._hid_scheduler.invalidate(_AUTO_EXPOSURE_KEY)
+        self._ae_state.invalidate()
+        if self._last_ae_request[0] == "roi" and len(self._last_ae_request) == 4:
+            self._ae_status = self.set_roi_properties(*self._last_ae_request[1:], blocking=True)
+        else:
+            self._ae_status = self._submit_auto_exposure_mode(self._last_ae_request[0]).result()
+        self._metrics.histogram("hotplug_recovery").observe_ns(time.monotonic_ns() - self._disconnected_ns)
+        self._metrics.counter("hotplug_reconnects").inc()
+        self._disconnected_ns = None
+        if self._resume_capture:
+            self.start_capture()
+        return self._ae_status
+
+    @property
+    def drop_policy(self) -> DropPolicy:
+        return self._ring.drop_policy
+
+    @property
+    def camera_config(self) -> CameraConfig:
+        return self._camera_config
+
+    def update(self, timeout: Optional[float] = 1.0) -> bool:
+        if self._capture_thread is None:
+            if self._cap is None:
+                # Disconnected
+                return False
+            if not self._read_into_ring():
+                return False
+            # Decoded MJPG frames reach the ring from the decoder workers
+            frame = self._ring.wait_next(self.image_sequence, timeout=0 if self._jpeg_decoder is None else timeout)
+            if frame is None:
+                return False
+            self._frame = frame
+            return True
+
+        after_sequence = self._frame.sequence if self._frame is not None else 0
+        frame = self._ring.wait_next(after_sequence, timeout)
+        if frame is None:
+            return False
+        if after_sequence > 0 and frame.sequence > after_sequence + 1:
+            self._frames_skipped.inc(frame.sequence - after_sequence - 1)
+        self._frame = frame
+        return True
+
+    def latest_frame(self) -> Optional[RingFrame]:
+        return self._ring.latest()
+
+    def get_frame(self, sequence: int) -> Optional[RingFrame]:
+        return self._ring.get(sequence)
+
+    def next_frame(self, after_sequence: int, timeout: Optional[float] = None) -> Optional[RingFrame]:
+        return self._ring.wait_next(after_sequence, timeout)
+
+    def _send_roi_properties(self, xcord, ycord, win_size) -> bool:
+        self._ae_status = enable_roi_auto_exposure(
+            xcord, ycord, self.image_width, self.image_height, self._hid_handle, win_size=win_size, verbose=False
+        )
+        hid_xcord, hid_ycord = roi_to_hid_coordinates(xcord, ycord, self.image_width, self.image_height)
+        self._acknowledge_auto_exposure_state(self._ae_status, AutoExposureState(AutoExpManual, hid_xcord, hid_ycord, win_size))
+        return self._ae_status
+
+    def _roi_command(self, xcord, ycord, win_size, rectified):
+        if rectified:
+            xcord, ycord = self.rectified_roi_mapper.to_raw(xcord, ycord)
+        self._last_ae_request = ("roi", xcord, ycord, win_size)
+        state = ("roi",) + roi_to_hid_coordinates(xcord, ycord, self.image_width, self.image_height) + (win_size,)
+        return state, lambda: self._send_roi_properties(xcord, ycord, win_size)
+
+    def submit_roi_properties(self, xcord, ycord, win_size=4, rectified=False) -> Future:
+        """ Like set_roi_properties(blocking=True) without waiting: returns the Future of the acknowledged status """
+        state, send = self._roi_command(xcord, ycord, win_size, rectified)
+        return self._hid_scheduler.call_async(send, key=_AUTO_EXPOSURE_KEY, state=state)
+
+    def set_roi_properties(self, xcord, ycord, win_size=4, blocking=False, rectified=False) -> bool:
+        """Move the AE RoI. By default the command is queued on the HID worker and False is returned when it is identical to
+        the current RoI; with `blocking` the acknowledged status is returned.
+        With `rectified` the position is in undistorted image coordinates (e.g. a click on an undistorted preview) and is
+        mapped to the raw sensor position first.
+        """
+        state, send = self._roi_command(xcord, ycord, win_size, rectified)
+        if blocking:
+            return self._hid_scheduler.call(send, key=_AUTO_EXPOSURE_KEY, state=state)
+        return self._hid_scheduler.submit(_AUTO_EXPOSURE_KEY, state, send)
+
+    @property
+    def rectified_roi_mapper(self) -> RectifiedRoiMapper:
+        """ Lookup table from undistorted to raw sensor coordinates, built on first use """
+        if self._rectified_roi_mapper is None:
+            self._rectified_roi_mapper = RectifiedRoiMapper(
+                *fisheye_camera_parameters(self._camera_config), (self._image_width, self._image_height)
+            )
+        return self._rectified_roi_mapper
 
-    def update(self) -> bool:
-        ret, frame = self._cap.read()
-        self._frame.data = frame
-        return ret
+    def rectified_to_hid_coordinates(self, xcords, ycords) -> np.ndarray:
+        """ (N, 2) firmware RoI coordinates of a track of undistorted image positions, e.g. detector outputs """
+        raw = self.rectified_roi_mapper.to_raw_array(xcords, ycords)
+        return roi_to_hid_coordinates_array(raw[:, 0], raw[:, 1], self._image_width, self._image_height)
 
-    def set_roi_properties(self, xcord, ycord, win_size=4):
-        self._ae_status = enable_roi_auto_exposure(xcord, ycord, self.image_width, self.image_height, self._hid_handle, win_size=win_size)
+    @property
+    def image_timestamp(self) -> Optional[float]:
+        """ Dequeue time of the current frame in seconds on the monotonic clock """
+        return self._frame.timestamp if self._frame is not None else None
+
+    @property
+    def image_record(self) -> Optional[RingFrame]:
+        return self._frame
 
     @property
-    def image_timestamp(self):
-        return self._frame.timestamp
+    def image_sequence(self) -> int:
+        return self._frame.sequence if self._frame is not None else 0
 
     @property
     def image(self):
-        return self._frame.data
+        """ Current frame as BGR; with raw_yuyv it is converted on first access """
+        return self.to_bgr(self._frame) if self._frame is not None else None
+
+    @property
+    def raw_yuyv(self) -> bool:
+        return self._raw_yuyv
+
+    def to_bgr(self, frame: RingFrame) -> np.ndarray:
+        """BGR image of a ring frame. With raw_yuyv it is converted once into a buffer of the frame's ring slot, so like the
+        frame itself it stays valid until the ring overwrites the slot
+        """
+        if not self._raw_yuyv:
+            return frame.data
+        slot = frame.sequence % len(self._bgr_buffers)
+        with self._bgr_locks[slot]:
+            if self._bgr_sequences[slot] != frame.sequence:
+                with self._metrics.span("yuyv_to_bgr"):
+                    cv2.cvtColor(frame.data, cv2.COLOR_YUV2BGR_YUYV, dst=self._bgr_buffers[slot])
+                self._bgr_sequences[slot] = frame.sequence
+        return self._bgr_buffers[slot]
+
+    @property
+    def luma(self) -> Optional[np.ndarray]:
+        """Gray image of the current frame. With raw_yuyv it is a zero-copy strided view of the Y samples, otherwise it is
+        converted from BGR on first access.
+        """
+        if self._frame is None:
+            return None
+        if self._raw_yuyv:
+            return self._frame.data[:, :, 0]
+        return self.gray()
+
+    def remap_luma(self, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Undistort the gray image of the current frame with the fisheye maps (one channel instead of three). Without
+        `dst` the shared product is returned.
+        """
+        if dst is None:
+            return self.remapped_gray()
+        with self._metrics.span("remap_luma"):
+            return self._remap(self.gray(), dst)
+
+    def _product(self, frame: Optional[RingFrame], name, shape: Tuple[int, ...], compute: Callable[[RingFrame, np.ndarray], None]):
+        frame = frame if frame is not None else self._frame
+        if frame is None:
+            return None
+        # Products of frames the ring has already overwritten are recycled first
+        min_sequence = self._ring.latest_sequence - self._ring.num_slots + 2
+        return self._products.get(frame.sequence, name, shape, np.uint8, lambda dst: compute(frame, dst), min_sequence)
+
+    def _compute_gray(self, frame: RingFrame, dst: np.ndarray):
+        if self._raw_yuyv:
+            # cv2 needs contiguous samples; one small copy beats the binding's hidden one
+            np.copyto(dst, frame.data[:, :, 0])
+        else:
+            cv2.cvtColor(frame.data, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def gray(self, frame: Optional[RingFrame] = None) -> Optional[np.ndarray]:
+        """ Contiguous gray image of `frame` (the current frame by default), shared and read-only """
+        return self._product(frame, "gray", (self._image_height, self._image_width), self._compute_gray)
+
+    def _compute_remapped(self, frame: RingFrame, dst: np.ndarray):
+        with self._metrics.span("remap"):
+            self._remap(self.to_bgr(frame), dst)
+
+    def remapped(self, frame: Optional[RingFrame] = None) -> Optional[np.ndarray]:
+        """ Undistorted BGR image of `frame` (the current frame by default), shared and read-only """
+        return self._product(frame, "remapped", (self._image_height, self._image_width, 3), self._compute_remapped)
+
+    def _compute_remapped_gray(self, frame: RingFrame, dst: np.ndarray):
+        with self._metrics.span("remap_luma"):
+            self._remap(self.gray(frame), dst)
+
+    def remapped_gray(self, frame: Optional[RingFrame] = None) -> Optional[np.ndarray]:
+        """ Undistorted gray image of `frame` (the current frame by default), shared and read-only """
+        return self._product(frame, "remapped_gray", (self._image_height, self._image_width), self._compute_remapped_gray)
+
+    def downscaled(
+        self,
+        width: int,
+        height: int,
+        frame: Optional[RingFrame] = None,
+        undistort: bool = False,
+        gray: bool = False,
+        interpolation: int = cv2.INTER_AREA,
+    ) -> Optional[np.ndarray]:
+        """ `frame` (the current frame by default) resized to width x height, from the shared undistorted / gray products """
+
+        def compute(frame: RingFrame, dst: np.ndarray):
+            if gray:
+                source = self.remapped_gray(frame) if undistort else self.gray(frame)
+            else:
+                source = self.remapped(frame) if undistort else self.to_bgr(frame)
+            cv2.resize(source, (width, height), dst=dst, interpolation=interpolation)
+
+        shape = (height, width) if gray else (height, width, 3)
+        return self._product(frame, ("downscaled", width, height, undistort, gray, interpolation), shape, compute)
+
+    @property
+    def product_cache(self) -> FrameProductCache:
+        return self._products
 
     @property
     def image_width(self):
@@ -176,20 +689,125 @@ class Camera:
 
     @property
     def remap_image(self):
-        return cv2.remap(
-            self._frame.data,
-            self._map1,
-            self._map2,
-            interpolation=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_CONSTANT,
-        )
+        """Undistorted current frame as a new array owned by the caller. It is copied from the shared product, so the
+        frame is still undistorted once for every reader; `remapped()` returns the shared read-only image without the copy
+        """
+        remapped = self.remapped()
+        return remapped.copy() if remapped is not None else None
+
+    def remap_into(self, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """ Undistort the current frame into `dst` (allocated when omitted), bypassing the shared products """
+        with self._metrics.span("remap"):
+            return self._remap(self.image, dst)
+
+    def _remap(self, src: np.ndarray, dst: Optional[np.ndarray]) -> np.ndarray:
+        if self._remapper is not None:
+            return self._remapper.remap(src, dst)
+        return cv2.remap(src, self._map1, self._map2, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, dst=dst)
+
+    def add_output_profile(self, profile: OutputProfile):
+        self._profile_maps[profile.name] = cached_profile_maps(self._camera_config, profile, self._map_cache_dir)
+        self._profile_buffers[profile.name] = np.zeros((profile.height, profile.width, 3), np.uint8)
+        self._output_profiles[profile.name] = profile
+
+    def remove_output_profile(self, name: str):
+        del self._output_profiles[name]
+        del self._profile_maps[name]
+        del self._profile_buffers[name]
+
+    @property
+    def output_profiles(self) -> Dict[str, OutputProfile]:
+        return dict(self._output_profiles)
+
+    def render_profile(self, name: str, dst: Optional[np.ndarray] = None, image: Optional[np.ndarray] = None) -> np.ndarray:
+        """Render the current frame (or `image`) for the named profile into `dst`. Without `dst` the returned buffer is
+        reused by the next call.
+        """
+        profile = self._output_profiles[name]
+        map1, map2 = self._profile_maps[name]
+        with self._metrics.span("render_profile"):
+            return cv2.remap(
+                self.image if image is None else image,
+                map1,
+                map2,
+                interpolation=profile.interpolation,
+                borderMode=cv2.BORDER_CONSTANT,
+                dst=self._profile_buffers[name] if dst is None else dst,
+            )
+
+    def stats(self) -> dict:
+        """ Per-stage latency histograms and counters of this camera, including its HID transport """
+        snapshot = self._metrics.snapshot()
+        hid_snapshot = self._hid_metrics.snapshot()
+        snapshot["latency"].update(hid_snapshot["latency"])
+        snapshot["counters"].update(hid_snapshot["counters"])
+        return snapshot
+
+    def start_metrics_export(self, path: str, fmt: str = "prometheus", interval: float = 10.0):
+        """ Periodically write stats() to `path` as Prometheus text or JSON lines """
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+        self._metrics_exporter = MetricsExporter([self._metrics, self._hid_metrics], path, fmt, interval)
+
+    @property
+    def exposure(self) -> float:
+        return self._cap.get(cv2.CAP_PROP_EXPOSURE)
+
+    def set_manual_exposure(self, exposure: float):
+        """ Switch the V4L2 control to manual exposure and set the exposure value """
+        self._cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
+        self._cap.set(cv2.CAP_PROP_EXPOSURE, exposure)
+        # The firmware reports its AE mode differently under V4L2 manual exposure, so the next read asks the device
+        self._ae_state.invalidate()
 
     @property
     def auto_exposure_setting(self):
-        status, roi_mode, window_size = get_auto_exposure_property(self._hid_handle)
-        if not status:
+        """ (mode, window size) from the local AE state; the device is only asked when nothing is cached """
+        state = self._ae_state.state
+        if state is None:
+            state = self.read_auto_exposure_state()
+            if state is None:
+                return None, None
+        return state.mode, state.win_size
+
+    @property
+    def auto_exposure_state(self) -> Optional[AutoExposureState]:
+        """ Cached AE state, None until a command was acknowledged or after the cache was invalidated """
+        return self._ae_state.state
+
+    def _read_and_reconcile(self) -> Optional[AutoExposureState]:
+        response = hid_command(self._hid_handle, "get_ae_roi_mode")
+        if not response.success:
             print("Getting auto exposure setting is failed")
-        return roi_mode, window_size
+            return None
+        device_state = AutoExposureState(response.mode, response.xcord, response.ycord, response.win_size)
+        if not self._ae_state.reconcile(device_state):
+            # The device no longer holds what was acknowledged, so an identical command must not be deduplicated
+            self._hid_scheduler.invalidate(_AUTO_EXPOSURE_KEY)
+        return device_state
+
+    def read_auto_exposure_state(self) -> Optional[AutoExposureState]:
+        """ Read the AE state from the device (one HID round trip) and reconcile the cache with it """
+        return self._hid_scheduler.call(self._read_and_reconcile)
+
+    def _verify_loop(self, interval: float):
+        while not self._ae_verify_stop.wait(interval):
+            try:
+                self.read_auto_exposure_state()
+            except RuntimeError:
+                # The scheduler was closed by release()
+                break
+            except OSError as e:
+                print("Verifying the auto exposure state failed: {}".format(e))
+
+    @property
+    def ae_state_drift_count(self) -> int:
+        return self._ae_state.drift_count
+
+    @property
+    def acknowledged_auto_exposure_state(self) -> Optional[tuple]:
+        """ Last AE state confirmed by the device: ("roi" | "lower_center", x, y, win_size) in HID units, or (mode,) otherwise """
+        return self._hid_scheduler.acknowledged_state(_AUTO_EXPOSURE_KEY)
 
     @property
     def auto_exposure_mode(self) -> str:
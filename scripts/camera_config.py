@@ -1,7 +1,37 @@
-import toml
+import os
 from pathlib import Path
-from cerberus import Validator
-from scripts.camera import CameraConfig
+from typing import Dict, List, Optional, Tuple
+
+from attr import dataclass, fields
+
+
+class FromDict:
+    @classmethod
+    def from_dict(cls, _dict):
+        init_kwargs = {}
+        for field in fields(cls):
+            field_value = _dict[field.name] if field.name in _dict.keys() else None
+            init_kwargs[field.name] = field_value
+        return cls(**init_kwargs)
+
+
+@dataclass
+class CameraConfig(FromDict):
+    device_id: str
+    width: int
+    height: int
+    fps: int
+    fx: float
+    fy: float
+    cx: float
+    cy: float
+    k1: float
+    k2: float
+    k3: float
+    k4: float
+    auto_exposure: Optional[str]
+    roi_size: Optional[int]
+    fourcc: Optional[str]
 
 
 _SCHEMA = {
@@ -20,20 +50,83 @@ _SCHEMA = {
     "k5": {"type": "float", "required": False},
     "k6": {"type": "float", "required": False},
     "auto_exposure": {"type": "string", "required": False},
-    "roi_size": {"type": "integer", "required": False}
+    "roi_size": {"type": "integer", "required": False},
+    "fourcc": {"type": "string", "required": False, "allowed": ["YUYV", "MJPG"]},
 }
 
 
-def get_config(file: str) -> CameraConfig:
+class _TypedValidator(object):
+    """Validates a config section against _SCHEMA (type, required, allowed; unknown keys are errors).
+
+    The schema is compiled into (name, python types, required, allowed) rules once, so validating a section is a single
+    pass over a small dict; errors are reported like cerberus, {field: [message]}.
+    """
+
+    # Like cerberus, integers are valid floats (fx = 900)
+    _TYPES = {"string": (str,), "integer": (int,), "float": (float, int)}
+
+    def __init__(self, schema: dict):
+        self._rules: List[Tuple[str, tuple, str, bool, Optional[frozenset]]] = []
+        for name, rule in schema.items():
+            allowed = frozenset(rule["allowed"]) if "allowed" in rule else None
+            self._rules.append((name, self._TYPES[rule["type"]], rule["type"], rule.get("required", False), allowed))
+        self._known = frozenset(schema.keys())
+
+    def errors(self, config: dict) -> Dict[str, List[str]]:
+        errors: Dict[str, List[str]] = {}
+        for name, types, type_name, required, allowed in self._rules:
+            if name not in config:
+                if required:
+                    errors[name] = ["required field"]
+                continue
+            value = config[name]
+            # bool is an int subclass, but not a valid integer or float here
+            if not isinstance(value, types) or isinstance(value, bool):
+                errors[name] = ["must be of {} type".format(type_name)]
+            elif allowed is not None and value not in allowed:
+                errors[name] = ["unallowed value {}".format(value)]
+        for name in config.keys() - self._known:
+            errors[name] = ["unknown field"]
+        return errors
+
+
+_VALIDATOR = _TypedValidator(_SCHEMA)
+# Parsed TOML files, keyed by path and invalidated when the file changes
+_TOML_CACHE: Dict[str, Tuple[Tuple[int, int], dict]] = {}
+
+
+def _load_toml(file: str) -> dict:
     f = Path(file)
     if not f.exists():
         raise FileNotFoundError("No such file or directory: {}".format(f))
+    stat = os.stat(str(f))
+    key = str(f.resolve())
+    cached = _TOML_CACHE.get(key)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    import toml
 
     dict_toml = toml.load(f)
-    config = dict_toml["Rgb"]
+    _TOML_CACHE[key] = ((stat.st_mtime_ns, stat.st_size), dict_toml)
+    return dict_toml
+
+
+def _parse_section(config: dict) -> CameraConfig:
+    errors = _VALIDATOR.errors(config)
+    if errors:
+        raise ValueError("Invalid param in config: {}".format(errors))
+
+    return CameraConfig.from_dict(config)
+
+
+def get_config(file: str, section: str = "Rgb") -> CameraConfig:
+    dict_toml = _load_toml(file)
+    return _parse_section(dict_toml[section])
 
-    v = Validator()
-    if not v.validate(config, _SCHEMA):
-        raise ValueError("Invalid param in config: {}".format(v.errors))
 
-    return CameraConfig.from_dict(config)
\ No newline at end of file
+def get_configs(file: str, sections: Optional[List[str]] = None) -> List[CameraConfig]:
+    """ Camera configs of the given sections, or of every section whose name starts with "Rgb" (e.g. [Rgb], [Rgb2]) """
+    dict_toml = _load_toml(file)
+    if sections is None:
+        sections = [name for name in dict_toml.keys() if name.startswith("Rgb")]
+    return [_parse_section(dict_toml[section]) for section in sections]
@@ -0,0 +1,131 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from scripts.camera import Camera
+from scripts.camera_config import CameraConfig, get_config, get_configs
+from scripts.frame_ring import RingFrame
+from scripts.hid_discovery import hid_device_paths
+
+
+def _frame_time(frame: RingFrame) -> float:
+    """Capture time in seconds. The V4L2 buffer timestamp is taken when the sensor delivered the frame and uses the
+    monotonic clock, like the dequeue time that stands in for it when the backend reports none
+    """
+    return frame.driver_msec / 1000.0 if not math.isnan(frame.driver_msec) else frame.timestamp
+
+
+class FrameSet(object):
+    """ One frame per camera, in the order of the group's cameras. `skew` is the timestamp spread in seconds """
+
+    __slots__ = ("frames", "skew")
+
+    def __init__(self, frames: List[RingFrame], skew: float):
+        self.frames = frames
+        self.skew = skew
+
+
+class CameraGroup(object):
+    """Several See3CAMs opened in parallel, each capturing on its own thread.
+
+    `next_frame_set` returns one frame per camera matched by nearest capture timestamp, and only when all of them lie
+    within `tolerance_ms` of each other.
+    `camera_kwargs` are passed to every Camera. Per-camera arguments, e.g. the `capture` and `hid_handle` of emulated
+    devices, go into `camera_overrides`, one dict per config.
+    """
+
+    def __init__(
+        self,
+        camera_configs: Sequence[CameraConfig],
+        tolerance_ms: float = 10.0,
+        camera_overrides: Optional[Sequence[dict]] = None,
+        **camera_kwargs
+    ):
+        if len(camera_configs) == 0:
+            raise ValueError("CameraGroup needs at least one camera config")
+        if camera_overrides is not None and len(camera_overrides) != len(camera_configs):
+            raise ValueError("CameraGroup got {} camera_overrides for {} configs".format(len(camera_overrides), len(camera_configs)))
+        shared_devices = [name for name in ("capture", "hid_handle") if name in camera_kwargs]
+        if shared_devices and len(camera_configs) > 1:
+            raise ValueError("{} would be shared by every camera, pass them in camera_overrides".format(", ".join(shared_devices)))
+        self._tolerance = tolerance_ms / 1000.0
+        camera_kwargs["threaded_capture"] = True
+        kwargs_per_camera = [dict(camera_kwargs, **(overrides or {})) for overrides in (camera_overrides or [None] * len(camera_configs))]
+
+        # Resolve every hidraw node in one discovery pass before the cameras look them up individually
+        discovered = [config.device_id for config, kwargs in zip(camera_configs, kwargs_per_camera) if kwargs.get("hid_handle") is None]
+        if discovered:
+            hid_device_paths(discovered)
+
+        with ThreadPoolExecutor(max_workers=len(camera_configs), thread_name_prefix="see3cam-open") as pool:
+            futures = [pool.submit(Camera, camera_config, **kwargs) for camera_config, kwargs in zip(camera_configs, kwargs_per_camera)]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            for future in futures:
+                if future.exception() is None:
+                    future.result().release()
+            raise errors[0]
+
+        self._cameras: List[Camera] = [future.result() for future in futures]
+        self._last_sequences = [0] * len(self._cameras)
+
+    @classmethod
+    def from_file(cls, file: str, sections: Optional[List[str]] = None, **kwargs) -> "CameraGroup":
+        return cls(get_configs(file, sections), **kwargs)
+
+    @classmethod
+    def from_files(cls, files: Sequence[str], **kwargs) -> "CameraGroup":
+        return cls([get_config(file) for file in files], **kwargs)
+
+    def __len__(self):
+        return len(self._cameras)
+
+    def __getitem__(self, index: int) -> Camera:
+        return self._cameras[index]
+
+    @property
+    def cameras(self) -> List[Camera]:
+        return list(self._cameras)
+
+    def _nearest_frame(self, index: int, latest: RingFrame, reference_time: float) -> RingFrame:
+        best = latest
+        sequence = latest.sequence - 1
+        while sequence > self._last_sequences[index]:
+            frame = self._cameras[index].get_frame(sequence)
+            if frame is None:
+                break
+            if abs(_frame_time(frame) - reference_time) >= abs(_frame_time(best) - reference_time):
+                break
+            best = frame
+            sequence -= 1
+        return best
+
+    def next_frame_set(self, timeout: Optional[float] = 1.0) -> Optional[FrameSet]:
+        """ Wait for a new set of frames whose timestamps are within the tolerance. Returns None on timeout """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            latest_frames = []
+            for camera, last_sequence in zip(self._cameras, self._last_sequences):
+                remaining = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+                frame = camera.next_frame(last_sequence, remaining)
+                if frame is None:
+                    return None
+                latest_frames.append(camera.latest_frame())
+
+            # The camera whose newest frame is the oldest sets the reference, the others look back in their rings
+            reference_time = min(_frame_time(frame) for frame in latest_frames)
+            frames = [self._nearest_frame(index, latest, reference_time) for index, latest in enumerate(latest_frames)]
+            frame_times = [_frame_time(frame) for frame in frames]
+            skew = max(frame_times) - min(frame_times)
+            if skew <= self._tolerance:
+                self._last_sequences = [frame.sequence for frame in frames]
+                return FrameSet(frames, skew)
+
+            # Drop the oldest frame of the set and try again with the next one of that camera
+            oldest_index = frame_times.index(min(frame_times))
+            self._last_sequences[oldest_index] = frames[oldest_index].sequence
+
+    def release(self):
+        with ThreadPoolExecutor(max_workers=len(self._cameras), thread_name_prefix="see3cam-release") as pool:
+            list(pool.map(lambda camera: camera.release(), self._cameras))
@@ -0,0 +1,255 @@
+import os
+import socket
+import time
+from threading import Lock, Thread
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from scripts.see3cam_api import (
+    AutoExpCentered,
+    BUFFER_LENGTH,
+    CAMERA_CONTROL_CU20,
+    FAIL,
+    GET_AE_ROI_MODE_CU20,
+    SET_AE_ROI_MODE_CU20,
+    SUCCESS,
+)
+
+
+class EmulatedSee3CamHid(object):
+    """Hardware-free stand-in for the See3CAM CU20 hidraw endpoint.
+
+    A SOCK_SEQPACKET socketpair keeps the report boundaries of hidraw; `hid_handle` is the host side fd and can be passed
+    to every function of scripts.see3cam_api. The device side answers SET/GET_AE_ROI_MODE_CU20 after `latency_ms`.
+    The host fd is owned by the caller (Camera.release closes it); the emulator stops once it is closed.
+    """
+
+    def __init__(self, latency_ms: float = 1.0):
+        host, device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._hid_handle = host.detach()
+        self._device = device
+        self.latency_ms = latency_ms
+        self.roi_mode = AutoExpCentered
+        self.xcord = 127
+        self.ycord = 127
+        self.win_size = 8
+        self.request_count = 0
+        self._lock = Lock()
+        self._thread = Thread(target=self._serve, name="see3cam-emulator", daemon=True)
+        self._thread.start()
+
+    @property
+    def hid_handle(self) -> int:
+        return self._hid_handle
+
+    def _reply(self, input_buffer: bytes) -> Optional[bytes]:
+        # input_buffer[0] is the report id written by the host, replies start directly with the command bytes
+        if input_buffer[1] != CAMERA_CONTROL_CU20:
+            return None
+        output_buffer = bytearray(BUFFER_LENGTH)
+        output_buffer[0] = CAMERA_CONTROL_CU20
+        output_buffer[1] = input_buffer[2]
+        with self._lock:
+            self.request_count += 1
+            if input_buffer[2] == SET_AE_ROI_MODE_CU20:
+                self.roi_mode, self.xcord, self.ycord, self.win_size = input_buffer[3], input_buffer[4], input_buffer[5], input_buffer[6]
+                output_buffer[6] = SUCCESS
+            elif input_buffer[2] == GET_AE_ROI_MODE_CU20:
+                output_buffer[2:6] = bytes([self.roi_mode, self.xcord, self.ycord, self.win_size])
+                output_buffer[6] = SUCCESS
+            else:
+                output_buffer[6] = FAIL
+        return bytes(output_buffer)
+
+    def _serve(self):
+        while True:
+            try:
+                input_buffer = self._device.recv(BUFFER_LENGTH)
+            except OSError:
+                break
+            if not input_buffer:
+                break
+            output_buffer = self._reply(input_buffer)
+            if output_buffer is None:
+                continue
+            if self.latency_ms > 0:
+                time.sleep(self.latency_ms / 1000.0)
+            try:
+                self._device.send(output_buffer)
+            except OSError:
+                break
+        self._device.close()
+
+    def close(self):
+        """ Close the host fd when no Camera owns it """
+        os.close(self._hid_handle)
+        self._thread.join()
+
+
+# BT.601 limited range, the encoding cv2.COLOR_YUV2BGR_YUYV decodes
+_BGR_TO_YUV = np.array([[24.966, 128.553, 65.481], [112.0, -74.203, -37.797], [-18.214, -93.786, 112.0]]) / 255.0
+_YUV_OFFSET = np.array([16.0, 128.0, 128.0])
+
+
+def bgr_to_yuyv(frame: np.ndarray) -> np.ndarray:
+    """ Packed YUYV 4:2:2 (height, width, 2) of a BGR frame, chroma taken from the even columns """
+    yuv = np.clip(frame @ _BGR_TO_YUV.T + _YUV_OFFSET + 0.5, 0, 255).astype(np.uint8)
+    yuyv = np.empty(frame.shape[:2] + (2,), np.uint8)
+    yuyv[:, :, 0] = yuv[:, :, 0]
+    yuyv[:, 0::2, 1] = yuv[:, 0::2, 1]
+    yuyv[:, 1::2, 1] = yuv[:, 0::2, 2]
+    return yuyv
+
+
+class SyntheticVideoCapture(object):
+    """Drop-in for cv2.VideoCapture that serves generated or file-backed frames.
+
+    Frames are prepared up front and copied into the caller's buffer on read, so `read(image=...)` behaves like the V4L2
+    backend. With `realtime` the reads are paced at `fps`. `drop_every` > 0 skips every n-th sensor frame, which shows up
+    as a gap in the CAP_PROP_POS_MSEC timestamps like a frame lost in the driver. The timestamps start at `start_msec`
+    (e.g. a shared monotonic time, to give several emulated cameras a known skew). With CAP_PROP_FOURCC set to MJPG and
+    CAP_PROP_CONVERT_RGB set to 0 the JPEG-encoded frames are returned, like V4L2 does for an MJPG stream; with YUYV
+    the (height, width, 2) YUYV buffers.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        fps: float = 30.0,
+        source: Optional[str] = None,
+        num_frames: int = 16,
+        realtime: bool = True,
+        drop_every: int = 0,
+        start_msec: float = 0.0,
+    ):
+        self._width = width
+        self._height = height
+        self._fps = float(fps)
+        self._realtime = realtime
+        self._drop_every = drop_every
+        self._frames = self._load_frames(source, num_frames) if source is not None else self._generate_frames(num_frames)
+        self._index = 0
+        self._start_msec = start_msec
+        self._position_msec = start_msec
+        self._next_time: Optional[float] = None
+        self._opened = True
+        self._properties = {}
+        self._jpeg_frames = None
+        self._yuyv_frames = None
+
+    def _generate_frames(self, num_frames: int):
+        x_gradient = np.linspace(0, 255, self._width, dtype=np.float32)[np.newaxis, :]
+        y_gradient = np.linspace(0, 255, self._height, dtype=np.float32)[:, np.newaxis]
+        base = np.empty((self._height, self._width, 3), np.uint8)
+        base[:, :, 0] = x_gradient
+        base[:, :, 1] = y_gradient
+        base[:, :, 2] = 64
+        frames = []
+        bar_width = max(self._width // num_frames, 1)
+        for index in range(num_frames):
+            frame = base.copy()
+            frame[:, index * bar_width : (index + 1) * bar_width] = 255
+            frames.append(frame)
+        return frames
+
+    def _load_frames(self, source: str, num_frames: int):
+        cap = cv2.VideoCapture(source)
+        frames = []
+        while len(frames) < num_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape[:2] != (self._height, self._width):
+                frame = cv2.resize(frame, (self._width, self._height))
+            frames.append(frame)
+        cap.release()
+        if not frames:
+            raise RuntimeError("failed to read frames from {}".format(source))
+        return frames
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def _raw_format(self) -> Optional[str]:
+        if self._properties.get(cv2.CAP_PROP_CONVERT_RGB, 1) != 0:
+            return None
+        for fourcc in ["MJPG", "YUYV"]:
+            if self._properties.get(cv2.CAP_PROP_FOURCC) == cv2.VideoWriter_fourcc(*fourcc):
+                return fourcc
+        return None
+
+    def read(self, image: Optional[np.ndarray] = None):
+        if not self._opened:
+            return False, image
+        if self._realtime:
+            now = time.monotonic()
+            if self._next_time is None:
+                self._next_time = now
+            if self._next_time > now:
+                time.sleep(self._next_time - now)
+            self._next_time = max(self._next_time + 1.0 / self._fps, time.monotonic() - 1.0 / self._fps)
+
+        frame_index = self._index % len(self._frames)
+        self._index += 1
+        if self._drop_every > 0 and self._index % self._drop_every == 0:
+            self._index += 1
+        self._position_msec = self._start_msec + self._index * 1000.0 / self._fps
+        raw_format = self._raw_format()
+        if raw_format == "MJPG":
+            if self._jpeg_frames is None:
+                self._jpeg_frames = [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1] for frame in self._frames]
+            return True, self._jpeg_frames[frame_index].copy()
+
+        if raw_format == "YUYV":
+            if self._yuyv_frames is None:
+                self._yuyv_frames = [bgr_to_yuyv(frame) for frame in self._frames]
+            frame = self._yuyv_frames[frame_index]
+        else:
+            frame = self._frames[frame_index]
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def get(self, prop_id: int) -> float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self._fps
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return self._position_msec
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._index)
+        return self._properties.get(prop_id, 0.0)
+
+    def set(self, prop_id: int, value: float) -> bool:
+        self._properties[prop_id] = value
+        return True
+
+    def release(self):
+        self._opened = False
+
+
+def emulated_camera(
+    camera_config, latency_ms: float = 1.0, source: Optional[str] = None, realtime: bool = True, drop_every: int = 0, **camera_kwargs
+):
+    """ Camera wired to an EmulatedSee3CamHid and a SyntheticVideoCapture. Returns (camera, hid_emulator) """
+    from scripts.camera import Camera
+
+    hid_emulator = EmulatedSee3CamHid(latency_ms)
+    capture = SyntheticVideoCapture(
+        camera_config.width, camera_config.height, camera_config.fps, source=source, realtime=realtime, drop_every=drop_every
+    )
+    raw_yuyv = camera_kwargs.get("raw_yuyv", False)
+    fourcc = "YUYV" if raw_yuyv and camera_config.fourcc is None else camera_config.fourcc
+    if fourcc is not None:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if fourcc == "MJPG" or raw_yuyv:
+        capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    camera = Camera(camera_config, capture=capture, hid_handle=hid_emulator.hid_handle, **camera_kwargs)
+    return camera, hid_emulator
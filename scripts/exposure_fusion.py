@@ -0,0 +1,198 @@
+import math
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+
+# cv2.transform row summing the three channels
+_CHANNEL_SUM = np.ones((1, 3), np.float32)
+
+
+class ExposureFusion(object):
+    """Mertens-style exposure fusion of a fixed number of uint8 BGR frames, with every buffer preallocated.
+
+    The weight of a pixel is contrast (|Laplacian| of gray) * saturation (channel std) * well-exposedness
+    (exp(-sum_c (I_c - 0.5)^2 / (2 sigma^2)), one exp per pixel), each raised to its exponent when that is not 1. The
+    normalized weights blend the Laplacian pyramids of the frames and the result is collapsed straight into uint8.
+
+    Two shortcuts keep the full resolution work per frame at a pyrDown, a weight pyrUp and a uint8 blend:
+    - the weights are computed on the first (half resolution) pyramid level and expanded to full resolution
+    - because those full resolution weights are smooth, the finest Laplacian band is not blended per frame. The uint8
+      frames are blended directly with the weights (cv2.blendLinear), and the blend of the expanded first level is
+      replaced once per bracket: out = sum_k W_k I_k + expand(R_1 - sum_k W_k,1 G_k,1), where R_1 is the fused first
+      level. Since G_k,1 = L_k,1 + expand(G_k,2), that correction is expand(expand(R_2) - sum_k W_k,1 expand(G_k,2)),
+      and it is expanded in int16.
+    Identical frames fuse to themselves exactly. On natural brackets the result stays within a few gray levels of the
+    textbook algorithm (cv2.MergeMertens additionally rescales its output).
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        num_frames: int,
+        levels: Optional[int] = None,
+        contrast_weight: float = 1.0,
+        saturation_weight: float = 1.0,
+        exposure_weight: float = 1.0,
+        sigma: float = 0.2,
+    ):
+        if num_frames < 2:
+            raise ValueError("ExposureFusion needs at least 2 frames, got {}".format(num_frames))
+        self._num_frames = num_frames
+        self._levels = levels if levels is not None else max(int(math.log2(min(width, height))) - 3, 2)
+        if self._levels < 2:
+            raise ValueError("ExposureFusion needs at least 2 pyramid levels, got {}".format(self._levels))
+        self._exponents = (contrast_weight, saturation_weight, exposure_weight)
+        self._exposure_scale = np.float32(-exposure_weight / (2.0 * sigma * sigma))
+
+        sizes = [(width, height)]
+        for _ in range(self._levels - 1):
+            sizes.append(((sizes[-1][0] + 1) // 2, (sizes[-1][1] + 1) // 2))
+        self._sizes = sizes
+        half_width, half_height = sizes[1]
+
+        # Per frame: the first pyramid level (uint8, it is also the input of the weights) and the weight at that level
+        self._half = [np.empty((half_height, half_width, 3), np.uint8) for _ in range(num_frames)]
+        self._half_weights = [np.empty((half_height, half_width), np.float32) for _ in range(num_frames)]
+        self._weight_sum = np.empty((half_height, half_width), np.float32)
+        # Weight scratch at half resolution
+        self._half_float = np.empty((half_height, half_width, 3), np.float32)
+        self._half_square = np.empty((half_height, half_width, 3), np.float32)
+        self._half_gray = np.empty((half_height, half_width), np.uint8)
+        self._sum = np.empty((half_height, half_width), np.float32)
+        self._square_sum = np.empty((half_height, half_width), np.float32)
+        self._mean_square = np.empty((half_height, half_width), np.float32)
+        self._scratch = np.empty((half_height, half_width), np.float32)
+        # Pyramids, level 0 is full resolution and only handled by the direct blend
+        self._gaussian = [None] + [np.empty((h, w, 3), np.float32) for w, h in sizes[1:]]
+        # Level 1 is the normalized weight of the frame being accumulated (one of _half_weights)
+        self._weights = [None, None] + [np.empty((h, w), np.float32) for w, h in sizes[2:]]
+        self._weights3 = [None] + [np.empty((h, w, 3), np.float32) for w, h in sizes[1:]]
+        self._expanded = [None] + [np.empty((h, w, 3), np.float32) for w, h in sizes[1:]]
+        self._laplacian = [None] + [np.empty((h, w, 3), np.float32) for w, h in sizes[1:]]
+        self._blended = [None] + [np.empty((h, w, 3), np.float32) for w, h in sizes[1:]]
+        # Direct blend: the weight of the blend so far and the weight of the next frame, at full resolution
+        self._blend_weights = [np.empty((height, width), np.float32) for _ in range(2)]
+        self._correction = np.empty((half_height, half_width, 3), np.int16)
+        self._full_correction = np.empty((height, width, 3), np.int16)
+        self._output = np.empty((height, width, 3), np.uint8)
+
+    @property
+    def num_frames(self) -> int:
+        return self._num_frames
+
+    @property
+    def levels(self) -> int:
+        return self._levels
+
+    def _weight(self, half: np.ndarray, dst: np.ndarray):
+        contrast_exponent, saturation_exponent, _ = self._exponents
+        image, square, scratch = self._half_float, self._half_square, self._scratch
+
+        # Contrast
+        cv2.cvtColor(half, cv2.COLOR_BGR2GRAY, dst=self._half_gray)
+        cv2.Laplacian(self._half_gray, cv2.CV_32F, dst=dst, ksize=1, scale=1.0 / 255.0)
+        np.abs(dst, out=dst)
+        if contrast_exponent != 1.0:
+            np.power(dst, contrast_exponent, out=dst)
+
+        # Saturation and well-exposedness both follow from the channel sums of I and I^2
+        np.multiply(half, np.float32(1.0 / 255.0), out=image, casting="unsafe")
+        cv2.multiply(image, image, dst=square)
+        cv2.transform(image, _CHANNEL_SUM, dst=self._sum)
+        cv2.transform(square, _CHANNEL_SUM, dst=self._square_sum)
+
+        # std = sqrt(E[I^2] - E[I]^2)
+        np.multiply(self._sum, self._sum, out=scratch)
+        np.multiply(scratch, np.float32(1.0 / 9.0), out=scratch)
+        np.multiply(self._square_sum, np.float32(1.0 / 3.0), out=self._mean_square)
+        np.subtract(self._mean_square, scratch, out=scratch)
+        np.maximum(scratch, 0.0, out=scratch)
+        np.sqrt(scratch, out=scratch)
+        if saturation_exponent != 1.0:
+            np.power(scratch, saturation_exponent, out=scratch)
+        np.multiply(dst, scratch, out=dst)
+
+        # sum_c (I_c - 0.5)^2 = sum I^2 - sum I + 0.75
+        np.subtract(self._square_sum, self._sum, out=scratch)
+        np.add(scratch, np.float32(0.75), out=scratch)
+        np.multiply(scratch, self._exposure_scale, out=scratch)
+        cv2.exp(scratch, dst=scratch)
+        np.multiply(dst, scratch, out=dst)
+        # Keeps frames that are flat or clipped everywhere (all weights 0) from dividing by zero
+        np.add(dst, np.float32(1e-12), out=dst)
+
+    def fuse(self, frames: Sequence[np.ndarray], dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """ Fuse `num_frames` uint8 BGR frames of the configured size. Without `dst` the returned buffer is reused by the next call """
+        if len(frames) != self._num_frames:
+            raise ValueError("ExposureFusion was built for {} frames, got {}".format(self._num_frames, len(frames)))
+        for frame, half, weight in zip(frames, self._half, self._half_weights):
+            cv2.pyrDown(frame, dst=half, dstsize=self._sizes[1])
+            self._weight(half, weight)
+        np.add.reduce(self._half_weights, out=self._weight_sum)
+
+        for index, weight in enumerate(self._half_weights):
+            np.divide(weight, self._weight_sum, out=weight)
+            self._accumulate(self._half[index], weight, first=index == 0)
+        dst = self._output if dst is None else dst
+        self._blend(frames, dst)
+        return self._collapse(dst)
+
+    def _accumulate(self, half: np.ndarray, half_weight: np.ndarray, first: bool):
+        sizes, gaussian, weights, weights3 = self._sizes, self._gaussian, self._weights, self._weights3
+        expanded, laplacian, blended = self._expanded, self._laplacian, self._blended
+        np.copyto(gaussian[1], half, casting="unsafe")
+        weights[1] = half_weight
+        for level in range(2, self._levels):
+            cv2.pyrDown(gaussian[level - 1], dst=gaussian[level], dstsize=sizes[level])
+            cv2.pyrDown(weights[level - 1], dst=weights[level], dstsize=sizes[level])
+
+        for level in range(1, self._levels):
+            if level < self._levels - 1:
+                cv2.pyrUp(gaussian[level + 1], dst=expanded[level], dstsize=sizes[level])
+                if level == 1:
+                    # Only sum_k W_k,1 expand(G_k,2) is needed for the correction of the direct blend
+                    band = expanded[level]
+                else:
+                    # Laplacian band: the Gaussian level minus the expanded next one
+                    cv2.subtract(gaussian[level], expanded[level], dst=laplacian[level])
+                    band = laplacian[level]
+            elif level == 1:
+                # Two levels: the fused first level is the direct blend itself
+                break
+            else:
+                band = gaussian[level]
+            cv2.merge([weights[level]] * 3, dst=weights3[level])
+            self._accumulate_product(band, weights3[level], blended[level], first)
+
+    @staticmethod
+    def _accumulate_product(src: np.ndarray, weight: np.ndarray, dst: np.ndarray, first: bool):
+        if first:
+            cv2.multiply(src, weight, dst=dst)
+        else:
+            cv2.accumulateProduct(src, weight, dst)
+
+    def _blend(self, frames: Sequence[np.ndarray], dst: np.ndarray):
+        """ sum_k W_k I_k at full resolution in uint8, one blendLinear per additional frame """
+        blended_weight, weight = self._blend_weights
+        cv2.pyrUp(self._half_weights[0], dst=blended_weight, dstsize=self._sizes[0])
+        cv2.pyrUp(self._half_weights[1], dst=weight, dstsize=self._sizes[0])
+        cv2.blendLinear(frames[0], frames[1], blended_weight, weight, dst=dst)
+        for frame, half_weight in zip(frames[2:], self._half_weights[2:]):
+            cv2.add(blended_weight, weight, dst=blended_weight)
+            cv2.pyrUp(half_weight, dst=weight, dstsize=self._sizes[0])
+            cv2.blendLinear(dst, frame, blended_weight, weight, dst=dst)
+
+    def _collapse(self, dst: np.ndarray) -> np.ndarray:
+        if self._levels == 2:
+            return dst
+        blended, expanded = self._blended, self._expanded
+        for level in range(self._levels - 2, 1, -1):
+            cv2.pyrUp(blended[level + 1], dst=expanded[level], dstsize=self._sizes[level])
+            cv2.add(blended[level], expanded[level], dst=blended[level])
+        cv2.pyrUp(blended[2], dst=expanded[1], dstsize=self._sizes[1])
+        # Rounded to int16 here, the uint8 destination saturates, which is the final clip to 0..255
+        cv2.subtract(expanded[1], blended[1], dst=self._correction, dtype=cv2.CV_16S)
+        cv2.pyrUp(self._correction, dst=self._full_correction, dstsize=self._sizes[0])
+        return cv2.add(dst, self._full_correction, dst=dst, dtype=cv2.CV_8U)
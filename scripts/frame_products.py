@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from threading import Condition
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from scripts.metrics import Counter
+
+ProductKey = Tuple[int, Hashable]
+
+
+class FrameProductCache(object):
+    """Products derived from a frame (undistorted, gray, downscaled, ...) computed at most once per frame sequence.
+
+    Products are keyed by (sequence, name) and kept in LRU order, at most `max_products` of them. Products of frames
+    older than `min_sequence` (frames the ring already replaced) are dropped first. The buffers of dropped products are
+    recycled for new products of the same shape and dtype, so steady state capture allocates nothing.
+    A returned product is read-only and stays valid until it is dropped, i.e. after `max_products` newer products or
+    once its frame left the ring. Concurrent requests for the same missing product wait for the first one to compute it.
+    """
+
+    def __init__(self, max_products: int = 8, hits: Optional[Counter] = None, misses: Optional[Counter] = None):
+        if max_products < 1:
+            raise ValueError("FrameProductCache needs max_products >= 1, got {}".format(max_products))
+        self._max_products = max_products
+        self._products: "OrderedDict[ProductKey, np.ndarray]" = OrderedDict()
+        self._in_flight = set()
+        self._free: Dict[Tuple[Tuple[int, ...], np.dtype], List[np.ndarray]] = {}
+        self._cond = Condition()
+        self.hits = hits if hits is not None else Counter()
+        self.misses = misses if misses is not None else Counter()
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def get(
+        self,
+        sequence: int,
+        name: Hashable,
+        shape: Tuple[int, ...],
+        dtype,
+        compute: Callable[[np.ndarray], None],
+        min_sequence: int = 0,
+    ) -> np.ndarray:
+        """ Product `name` of frame `sequence`; on a miss `compute(dst)` fills a recycled (shape, dtype) buffer """
+        key = (sequence, name)
+        with self._cond:
+            self._cond.wait_for(lambda: key not in self._in_flight)
+            product = self._products.get(key)
+            if product is not None:
+                self._products.move_to_end(key)
+                self.hits.inc()
+                return product
+            self.misses.inc()
+            self._in_flight.add(key)
+            self._drop_replaced(min_sequence)
+            buffer = self._take_buffer(tuple(shape), np.dtype(dtype))
+
+        try:
+            compute(buffer)
+        except BaseException:
+            with self._cond:
+                self._in_flight.discard(key)
+                self._recycle(buffer)
+                self._cond.notify_all()
+            raise
+        buffer.flags.writeable = False
+        with self._cond:
+            self._in_flight.discard(key)
+            self._products[key] = buffer
+            while len(self._products) > self._max_products:
+                self._recycle(self._products.popitem(last=False)[1])
+            self._cond.notify_all()
+        return buffer
+
+    def clear(self):
+        with self._cond:
+            while self._products:
+                self._recycle(self._products.popitem(last=False)[1])
+
+    def _drop_replaced(self, min_sequence: int):
+        for key in [key for key in self._products.keys() if key[0] < min_sequence]:
+            self._recycle(self._products.pop(key))
+
+    def _take_buffer(self, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        free = self._free.get((shape, dtype))
+        if free:
+            buffer = free.pop()
+            buffer.flags.writeable = True
+            return buffer
+        return np.empty(shape, dtype)
+
+    def _recycle(self, buffer: np.ndarray):
+        free = self._free.setdefault((buffer.shape, buffer.dtype), [])
+        # Never keep more spare buffers than products, the rest is left to the garbage collector
+        if len(free) < self._max_products:
+            free.append(buffer)
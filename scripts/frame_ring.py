@@ -0,0 +1,158 @@
+import math
+import time
+from enum import Enum
+from threading import Condition
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Per-frame capture record: sequence number, time.monotonic_ns() when the frame was dequeued and the driver timestamp
+# (CAP_PROP_POS_MSEC, NaN when the backend does not provide one)
+FRAME_RECORD_DTYPE = np.dtype([("sequence", np.int64), ("monotonic_ns", np.int64), ("driver_msec", np.float64)])
+
+
+class DropPolicy(Enum):
+    KeepNewest = "keep_newest"
+    Backpressure = "backpressure"
+
+
+class RingFrame(object):
+    __slots__ = ("sequence", "monotonic_ns", "driver_msec", "data")
+
+    def __init__(self, sequence: int, monotonic_ns: int, driver_msec: float, data: np.ndarray):
+        self.sequence = sequence
+        self.monotonic_ns = monotonic_ns
+        self.driver_msec = driver_msec
+        self.data = data
+
+    @property
+    def timestamp(self) -> float:
+        """ Dequeue time in seconds on the monotonic clock """
+        return self.monotonic_ns / 1e9
+
+
+class DropDetector(object):
+    """Detects frames lost before they reached us from gaps between consecutive frame timestamps.
+
+    The driver timestamp is preferred since it is taken when the sensor delivered the frame; the dequeue time is used
+    when the backend has none. A gap above `tolerance` frame periods counts as round(gap / period) - 1 dropped frames.
+    """
+
+    def __init__(self, fps: float, on_drop: Optional[Callable[[int, RingFrame], None]] = None, tolerance: float = 1.5):
+        self._period_ms = 1000.0 / fps
+        self._tolerance = tolerance
+        self._on_drop = on_drop
+        self._last_driver_msec = math.nan
+        self._last_monotonic_ns: Optional[int] = None
+        self.dropped_frames = 0
+
+    def check(self, frame: RingFrame) -> int:
+        if not math.isnan(frame.driver_msec) and not math.isnan(self._last_driver_msec):
+            gap_ms = frame.driver_msec - self._last_driver_msec
+        elif self._last_monotonic_ns is not None:
+            gap_ms = (frame.monotonic_ns - self._last_monotonic_ns) / 1e6
+        else:
+            gap_ms = 0.0
+        self._last_driver_msec = frame.driver_msec
+        self._last_monotonic_ns = frame.monotonic_ns
+
+        if gap_ms <= self._tolerance * self._period_ms:
+            return 0
+        dropped = max(int(round(gap_ms / self._period_ms)) - 1, 1)
+        self.dropped_frames += dropped
+        if self._on_drop is not None:
+            self._on_drop(dropped, frame)
+        return dropped
+
+
+class FrameRing(object):
+    """Fixed ring of preallocated frame buffers with a single writer.
+
+    Frames handed out by `latest` / `wait_next` are views into the ring, so they stay valid until the writer laps them
+    (KeepNewest) or until the consumer asks for a newer frame (Backpressure).
+    """
+
+    def __init__(self, num_slots: int, shape: Tuple[int, ...], dtype=np.uint8, drop_policy: DropPolicy = DropPolicy.KeepNewest):
+        if num_slots < 2:
+            raise ValueError("FrameRing needs at least 2 slots, got {}".format(num_slots))
+        self._num_slots = num_slots
+        self._buffers: List[np.ndarray] = [np.zeros(shape, dtype) for _ in range(num_slots)]
+        self._records = np.zeros(num_slots, FRAME_RECORD_DTYPE)
+        self._drop_policy = drop_policy
+        self._latest_sequence = 0
+        self._consumed_sequence = 0
+        self._closed = False
+        self._cond = Condition()
+
+    @property
+    def num_slots(self) -> int:
+        return self._num_slots
+
+    @property
+    def drop_policy(self) -> DropPolicy:
+        return self._drop_policy
+
+    @property
+    def latest_sequence(self) -> int:
+        return self._latest_sequence
+
+    def begin_write(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """Returns the buffer for the next frame, or None if backpressure did not clear within `timeout`"""
+        sequence = self._latest_sequence + 1
+        if self._drop_policy == DropPolicy.Backpressure:
+            with self._cond:
+                ready = self._cond.wait_for(lambda: self._closed or sequence < self._consumed_sequence + self._num_slots, timeout)
+                if not ready or self._closed:
+                    return None
+        return self._buffers[sequence % self._num_slots]
+
+    def commit_write(self, monotonic_ns: Optional[int] = None, driver_msec: float = math.nan) -> int:
+        sequence = self._latest_sequence + 1
+        self._records[sequence % self._num_slots] = (sequence, monotonic_ns if monotonic_ns is not None else time.monotonic_ns(), driver_msec)
+        with self._cond:
+            self._latest_sequence = sequence
+            self._cond.notify_all()
+        return sequence
+
+    def latest(self) -> Optional[RingFrame]:
+        sequence = self._latest_sequence
+        if sequence == 0:
+            return None
+        return self._frame(sequence)
+
+    def get(self, sequence: int) -> Optional[RingFrame]:
+        """Returns the frame with `sequence` if the ring still holds it"""
+        latest_sequence = self._latest_sequence
+        if sequence < 1 or sequence > latest_sequence or sequence < latest_sequence - self._num_slots + 2:
+            return None
+        return self._frame(sequence)
+
+    def wait_next(self, after_sequence: int, timeout: Optional[float] = None) -> Optional[RingFrame]:
+        """Returns the oldest frame still held by the ring whose sequence is greater than `after_sequence`"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._latest_sequence > after_sequence, timeout):
+                return None
+            latest_sequence = self._latest_sequence
+            if latest_sequence <= after_sequence:
+                return None
+            # The slot after the latest one may be under write, so it is never handed out
+            oldest_valid = max(latest_sequence - self._num_slots + 2, 1)
+            sequence = max(after_sequence + 1, oldest_valid)
+            if sequence > self._consumed_sequence:
+                self._consumed_sequence = sequence
+                self._cond.notify_all()
+        return self._frame(sequence)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self) -> None:
+        with self._cond:
+            self._closed = False
+
+    def _frame(self, sequence: int) -> RingFrame:
+        slot = sequence % self._num_slots
+        record = self._records[slot]
+        return RingFrame(sequence, int(record["monotonic_ns"]), float(record["driver_msec"]), self._buffers[slot])
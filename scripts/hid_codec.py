@@ -0,0 +1,154 @@
+import struct
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+from attr import dataclass
+
+BUFFER_LENGTH = 65
+# Shared by scripts.see3cam_api and scripts.hid_transport, so see3cam_api does not have to import asyncio for it
+DEFAULT_TIMEOUT_MS = 2000.0
+READ_FIRMWARE_VERSION = 0x40
+CAMERA_CONTROL_CU20 = 0x86
+
+GET_AE_ROI_MODE_CU20 = 0x05
+SET_AE_ROI_MODE_CU20 = 0x06
+
+AutoExpCentered = 0x01
+AutoExpManual = 0x02
+AutoExpDisabled = 0x03
+
+FAIL = 0x00
+SUCCESS = 0x01
+
+# Replies carry the status byte at this offset for every CU20 camera control command
+_STATUS_OFFSET = 6
+
+
+@dataclass(frozen=True)
+class StatusResponse:
+    success: bool
+
+
+@dataclass(frozen=True)
+class AeRoiModeResponse:
+    success: bool
+    mode: int
+    xcord: int
+    ycord: int
+    win_size: int
+
+
+@dataclass(frozen=True)
+class HidCommand:
+    """One row of the command table.
+
+    The request is the report id (0), `control`, `sub_command`, then `request_fields` packed with `request_format`. The
+    reply starts with `control`, `sub_command`; `response_fields` are unpacked with `response_format` right after it and
+    the status byte is at offset 6.
+    """
+
+    name: str
+    control: int
+    sub_command: int
+    request_fields: Tuple[str, ...] = ()
+    request_format: str = ""
+    response_fields: Tuple[str, ...] = ()
+    response_format: str = ""
+    response_type: type = StatusResponse
+
+    @property
+    def header(self) -> bytes:
+        return bytes([self.control, self.sub_command])
+
+
+COMMANDS: Dict[str, HidCommand] = {
+    command.name: command
+    for command in [
+        HidCommand(
+            "set_ae_roi_mode",
+            CAMERA_CONTROL_CU20,
+            SET_AE_ROI_MODE_CU20,
+            request_fields=("mode", "xcord", "ycord", "win_size"),
+            request_format="<4B",
+        ),
+        HidCommand(
+            "get_ae_roi_mode",
+            CAMERA_CONTROL_CU20,
+            GET_AE_ROI_MODE_CU20,
+            response_fields=("mode", "xcord", "ycord", "win_size"),
+            response_format="<4B",
+            response_type=AeRoiModeResponse,
+        ),
+    ]
+}
+
+
+class HidCodec(object):
+    """struct-based encoder / decoder for the commands of COMMANDS.
+
+    Every thread gets one preallocated request buffer per command with the header already written, so encoding only
+    packs the payload. An encoded buffer stays valid until the same thread encodes the same command again.
+    """
+
+    def __init__(self, commands: Dict[str, HidCommand] = COMMANDS):
+        self._commands = dict(commands)
+        self._request_structs = {name: struct.Struct(command.request_format) for name, command in self._commands.items()}
+        self._response_structs = {name: struct.Struct(command.response_format) for name, command in self._commands.items()}
+        self._local = threading.local()
+
+    def command(self, name: str) -> HidCommand:
+        return self._commands[name]
+
+    def _buffer(self, name: str) -> bytearray:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None:
+            command = self._commands[name]
+            buffer = buffers[name] = bytearray(BUFFER_LENGTH)
+            buffer[1], buffer[2] = command.control, command.sub_command
+        return buffer
+
+    def encode(self, name: str, *values: int) -> bytearray:
+        """ Request buffer of `name` with `values` in the order of its request_fields (missing trailing values are 0) """
+        request_struct = self._request_structs[name]
+        buffer = self._buffer(name)
+        if values or request_struct.size:
+            fields = self._commands[name].request_fields
+            request_struct.pack_into(buffer, 3, *(values + (0,) * (len(fields) - len(values))))
+        return buffer
+
+    def decode(self, name: str, reply: bytes):
+        """ Typed response of `name`; success is False when the header does not match or the status is not SUCCESS """
+        command = self._commands[name]
+        success = len(reply) > _STATUS_OFFSET and reply[0] == command.control and reply[1] == command.sub_command
+        success = success and reply[_STATUS_OFFSET] == SUCCESS
+        if not command.response_fields:
+            return command.response_type(success)
+        values = self._response_structs[name].unpack_from(reply, 2) if len(reply) > _STATUS_OFFSET else (None,) * len(command.response_fields)
+        return command.response_type(success, *values)
+
+
+def roi_to_hid_coordinates_array(xcords, ycords, image_width: int, image_height: int) -> np.ndarray:
+    """ Vectorized roi_to_hid_coordinates: (N, 2) uint8 firmware coordinates, clipped to 0..255 """
+    xcords = np.asarray(xcords, np.float64)
+    ycords = np.asarray(ycords, np.float64)
+    hid_coordinates = np.empty(xcords.shape + (2,), np.float64)
+    # Same operation order as roi_to_hid_coordinates, so both round identically; int() truncates towards zero
+    np.multiply(xcords / (image_width - 1), 255.0, out=hid_coordinates[..., 0])
+    np.multiply(ycords / (image_height - 1), 255.0, out=hid_coordinates[..., 1])
+    return np.clip(np.trunc(hid_coordinates), 0, 255).astype(np.uint8)
+
+
+def encode_roi_batch(xcords, ycords, image_width: int, image_height: int, win_size: int = 4) -> np.ndarray:
+    """ (N, BUFFER_LENGTH) request buffers of set_ae_roi_mode for a whole trajectory of ROI centers in pixels """
+    hid_coordinates = roi_to_hid_coordinates_array(xcords, ycords, image_width, image_height).reshape(-1, 2)
+    buffers = np.zeros((len(hid_coordinates), BUFFER_LENGTH), np.uint8)
+    buffers[:, 1] = CAMERA_CONTROL_CU20
+    buffers[:, 2] = SET_AE_ROI_MODE_CU20
+    buffers[:, 3] = AutoExpManual
+    buffers[:, 4:6] = hid_coordinates
+    buffers[:, 6] = win_size
+    return buffers
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+from scripts.remap_cache import default_cache_dir
+
+DEV_DIR = Path("/dev")
+SYSFS_HIDRAW_DIR = Path("/sys/class/hidraw")
+SYSFS_VIDEO_DIR = Path("/sys/class/video4linux")
+
+# See3CAM CU20 vendor/product ids as reported in HID_ID (bus:vendor:product)
+SEE3CAM_CU20_VENDOR_ID = "2560"
+SEE3CAM_CU20_PRODUCT_ID = "c120"
+
+_SERIAL_PATTERN = re.compile(r"e-con_Systems_See3CAM_CU20_([A-Z0-9]*)")
+
+
+def serial_from_device_id(device_id: str) -> str:
+    """ Serial id (alphanumeric like "180B0204") of the See3CAM behind a video device path """
+    # /dev/v4l/by-id/ paths already carry ID_SERIAL, so the common case needs no udev lookup
+    match = _SERIAL_PATTERN.search(device_id)
+    if match is not None:
+        return match.group(1)
+
+    video_name = Path(os.path.realpath(device_id)).name
+    usb_serial_path = Path(SYSFS_VIDEO_DIR, video_name, "device", "..", "serial")
+    if usb_serial_path.exists():
+        return usb_serial_path.read_text().strip()
+
+    # WARNING: LGPL
+    import pyudev
+
+    video_device = pyudev.Devices.from_device_file(pyudev.Context(), device_id)
+    if "ID_SERIAL" not in video_device.properties:
+        raise RuntimeError("No serial id for video device {}".format(device_id))
+    return _SERIAL_PATTERN.search(video_device.properties.get("ID_SERIAL")).group(1)
+
+
+def serial_from_udev_properties(properties) -> Optional[str]:
+    """ Serial id of a See3CAM video4linux udev device (or event), None for other devices """
+    match = _SERIAL_PATTERN.search(properties.get("ID_SERIAL", ""))
+    return match.group(1) if match is not None else None
+
+
+def _read_uevent(path: Path) -> Dict[str, str]:
+    properties = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition("=")
+        properties[key] = value
+    return properties
+
+
+def _hidraw_sysfs_path(hidraw_name: str) -> str:
+    return os.path.realpath(str(Path(SYSFS_HIDRAW_DIR, hidraw_name, "device")))
+
+
+def enumerate_see3cam_hidraw() -> Dict[str, Dict[str, str]]:
+    """ Walk /sys/class/hidraw once and map each See3CAM CU20 serial to its hidraw node and HID sysfs path """
+    entries = {}
+    if not SYSFS_HIDRAW_DIR.exists():
+        return entries
+    for hidraw_dir in sorted(SYSFS_HIDRAW_DIR.iterdir()):
+        try:
+            properties = _read_uevent(Path(hidraw_dir, "device", "uevent"))
+        except OSError:
+            continue
+        hid_id = properties.get("HID_ID", "").lower().split(":")
+        if len(hid_id) != 3 or hid_id[1][-4:] != SEE3CAM_CU20_VENDOR_ID or hid_id[2][-4:] != SEE3CAM_CU20_PRODUCT_ID:
+            continue
+        serial_id = properties.get("HID_UNIQ")
+        if serial_id:
+            entries[serial_id] = {"node": str(Path(DEV_DIR, hidraw_dir.name)), "sysfs": _hidraw_sysfs_path(hidraw_dir.name)}
+    return entries
+
+
+class HidDiscoveryIndex(object):
+    """Serial -> hidraw node index, persisted between processes.
+
+    Cached entries are trusted only while the node exists and its sysfs parent is unchanged; any miss triggers one
+    re-enumeration of /sys/class/hidraw for all requested serials.
+    """
+
+    def __init__(self, cache_path: Optional[Path] = None):
+        self._cache_path = Path(cache_path) if cache_path is not None else Path(default_cache_dir(), "hid_index.json")
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._lock = Lock()
+        try:
+            self._entries = json.loads(self._cache_path.read_text())
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _lookup(self, serial_id: str) -> Optional[str]:
+        entry = self._entries.get(serial_id)
+        if entry is None or not os.path.exists(entry["node"]):
+            return None
+        if _hidraw_sysfs_path(Path(entry["node"]).name) != entry["sysfs"]:
+            return None
+        return entry["node"]
+
+    def _save(self):
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._cache_path.with_name(self._cache_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(self._entries, indent=1, sort_keys=True))
+            os.replace(str(tmp_path), str(self._cache_path))
+        except OSError as e:
+            print("Failed to write HID discovery cache {}: {}".format(self._cache_path, e))
+
+    def refresh(self):
+        with self._lock:
+            self._entries = enumerate_see3cam_hidraw()
+            self._save()
+
+    def resolve_many(self, serial_ids: Sequence[str]) -> List[str]:
+        with self._lock:
+            nodes = [self._lookup(serial_id) for serial_id in serial_ids]
+            if None in nodes:
+                self._entries = enumerate_see3cam_hidraw()
+                self._save()
+                nodes = [self._lookup(serial_id) for serial_id in serial_ids]
+        missing = [serial_id for serial_id, node in zip(serial_ids, nodes) if node is None]
+        if missing:
+            raise RuntimeError("No hidraw device found for See3CAM serial(s): {}".format(", ".join(missing)))
+        return nodes
+
+    def resolve(self, serial_id: str) -> str:
+        return self.resolve_many([serial_id])[0]
+
+
+_index: Optional[HidDiscoveryIndex] = None
+_index_lock = Lock()
+
+
+def discovery_index() -> HidDiscoveryIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HidDiscoveryIndex()
+        return _index
+
+
+def hid_device_paths(device_ids: Sequence[str]) -> List[str]:
+    """ Resolve the hidraw node of every video device in one pass """
+    return discovery_index().resolve_many([serial_from_device_id(device_id) for device_id in device_ids])
@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _PendingCommand(object):
+    __slots__ = ("state", "send")
+
+    def __init__(self, state: Hashable, send: Callable[[], Any]):
+        self.state = state
+        self.send = send
+
+
+class HidCommandScheduler(object):
+    """Serializes HID commands for one device on a background worker.
+
+    Commands are grouped by a key naming the device state they set (e.g. the AE/ROI mode). A submitted command is dropped
+    when its state equals the state the key will have once everything queued before it ran (the newest queued or
+    in-flight command for the key, otherwise the last acknowledged state), and a newer submission replaces a pending one, so a
+    burst of ROI updates only sends the latest. Every command, including blocking `call`s, is spaced by `1 / max_rate_hz`.
+    """
+
+    def __init__(self, max_rate_hz: Optional[float] = 30.0, name: str = "see3cam-hid"):
+        self._min_interval = 1.0 / max_rate_hz if max_rate_hz else 0.0
+        self._pending: "OrderedDict[Hashable, _PendingCommand]" = OrderedDict()
+        self._calls = deque()
+        self._acknowledged: Dict[Hashable, Hashable] = {}
+        # (key, state) of the command the worker is sending
+        self._in_flight: Optional[tuple] = None
+        self._last_sent = 0.0
+        self._closed = False
+        self._busy = False
+        self._cond = Condition()
+        self._worker = Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, key: Hashable, state: Hashable, send: Callable[[], Any]) -> bool:
+        """ Queue `send` without waiting. Returns False when the command was dropped as a duplicate """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("HID command scheduler is closed")
+            if self._expected_state(key) == state:
+                return False
+            self._pending[key] = _PendingCommand(state, send)
+            self._cond.notify_all()
+        return True
+
+    def _expected_state(self, key: Hashable) -> Optional[Hashable]:
+        """ State of `key` after every queued command ran; pending commands run after the queued calls """
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending.state
+        for _, call_key, call_state, _ in reversed(self._calls):
+            if call_key == key:
+                return call_state
+        if self._in_flight is not None and self._in_flight[0] == key:
+            return self._in_flight[1]
+        return self._acknowledged.get(key)
+
+    def call(self, send: Callable[[], Any], key: Optional[Hashable] = None, state: Optional[Hashable] = None, timeout: Optional[float] = None):
+        """ Run `send` on the worker and wait for its result. A pending command for `key` is superseded by this one """
+        return self.call_async(send, key, state).result(timeout)
+
+    def call_async(self, send: Callable[[], Any], key: Optional[Hashable] = None, state: Optional[Hashable] = None) -> Future:
+        """ Like `call`, but returns a Future of the result instead of waiting """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("HID command scheduler is closed")
+            if key is not None:
+                self._pending.pop(key, None)
+            self._calls.append((send, key, state, future))
+            self._cond.notify_all()
+        return future
+
+    def acknowledged_state(self, key: Hashable) -> Optional[Hashable]:
+        with self._cond:
+            return self._acknowledged.get(key)
+
+    def invalidate(self, key: Hashable) -> None:
+        """ Forget the acknowledged state so the next identical command is sent again """
+        with self._cond:
+            self._acknowledged.pop(key, None)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """ Wait until every queued command has been sent """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._calls and not self._busy, timeout)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+    def _next_command(self):
+        with self._cond:
+            while True:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._closed or self._pending or self._calls)
+                if self._closed:
+                    return None
+                wait = self._last_sent + self._min_interval - time.monotonic()
+                if wait > 0:
+                    # Newer submissions may still replace the pending command while we wait for the rate limit
+                    self._cond.wait(wait)
+                    continue
+                self._busy = True
+                if self._calls:
+                    command = self._calls.popleft()
+                else:
+                    key, pending = self._pending.popitem(last=False)
+                    command = pending.send, key, pending.state, None
+                self._in_flight = command[1:3]
+                return command
+
+    def _run(self):
+        while True:
+            command = self._next_command()
+            if command is None:
+                break
+            send, key, state, future = command
+            error = None
+            self._last_sent = time.monotonic()
+            try:
+                result = send()
+            except Exception as e:
+                result, error = None, e
+            with self._cond:
+                self._in_flight = None
+                if key is not None:
+                    if result:
+                        self._acknowledged[key] = state
+                    else:
+                        self._acknowledged.pop(key, None)
+
+            if future is None:
+                if error is not None:
+                    print("HID command {} failed: {}".format(key, error))
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        with self._cond:
+            self._busy = False
+            while self._calls:
+                self._calls.popleft()[3].set_exception(RuntimeError("HID command scheduler is closed"))
+            self._cond.notify_all()
@@ -0,0 +1,187 @@
+import asyncio
+import errno
+import os
+from collections import defaultdict, deque
+from threading import Lock, Thread
+from typing import Deque, Dict, Optional
+
+from scripts.hid_codec import BUFFER_LENGTH, DEFAULT_TIMEOUT_MS
+from scripts.metrics import Metrics, discard_hid_metrics, hid_metrics
+
+
+class AsyncHidTransport(object):
+    """asyncio transport for one hidraw file descriptor.
+
+    The fd is registered with `loop.add_reader`, and every reply is handed to the oldest request waiting for the same
+    header bytes (for See3CAM: CAMERA_CONTROL_CU20 and the sub-command), the longest matching header first. Must be
+    created and used on `loop`.
+    """
+
+    def __init__(
+        self, hid_handle: int, read_length: int, loop: Optional[asyncio.AbstractEventLoop] = None, metrics: Optional[Metrics] = None
+    ):
+        self._hid_handle = hid_handle
+        self._metrics = metrics if metrics is not None else Metrics()
+        self._read_length = read_length
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._waiters: Dict[bytes, Deque[asyncio.Future]] = defaultdict(deque)
+        self._write_lock = asyncio.Lock()
+        os.set_blocking(hid_handle, False)
+        self._loop.add_reader(hid_handle, self._on_readable)
+
+    @property
+    def hid_handle(self) -> int:
+        return self._hid_handle
+
+    def _on_readable(self):
+        try:
+            output_buffer = os.read(self._hid_handle, self._read_length)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._fail_all(e)
+            return
+
+        for header in sorted(self._waiters, key=len, reverse=True):
+            waiters = self._waiters[header]
+            if output_buffer.startswith(header):
+                while waiters:
+                    waiter = waiters.popleft()
+                    if not waiter.done():
+                        waiter.set_result(output_buffer)
+                        return
+        # Late reply to a request that already timed out, or an unsolicited report
+        self._metrics.counter("hid_unmatched_responses").inc()
+
+    def _fail_all(self, error: Exception):
+        for waiters in self._waiters.values():
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_exception(error)
+
+    async def _write(self, input_buffer: bytes, deadline: float):
+        async with self._write_lock:
+            while True:
+                try:
+                    bytes_written = os.write(self._hid_handle, input_buffer)
+                except (BlockingIOError, BrokenPipeError):
+                    self._metrics.counter("hid_retries").inc()
+                    if self._loop.time() >= deadline:
+                        raise TimeoutError(errno.ETIMEDOUT, "HID write timed out on fd %d" % self._hid_handle)
+                    await asyncio.sleep(0.001)
+                    continue
+                if bytes_written != len(input_buffer):
+                    raise IOError(errno.EIO, "Written %d bytes out of expected %d" % (bytes_written, len(input_buffer)))
+                return
+
+    async def request(self, input_buffer: bytes, header: bytes, timeout_ms: float = DEFAULT_TIMEOUT_MS) -> bytes:
+        """ Write `input_buffer` and wait up to `timeout_ms` for the reply starting with `header` """
+        deadline = self._loop.time() + timeout_ms / 1000.0
+        waiter = self._loop.create_future()
+        waiters = self._waiters[bytes(header)]
+        waiters.append(waiter)
+        try:
+            with self._metrics.span("hid_round_trip"):
+                await self._write(bytes(input_buffer), deadline)
+                return await asyncio.wait_for(waiter, max(deadline - self._loop.time(), 0.0))
+        except asyncio.TimeoutError:
+            self._metrics.counter("hid_timeouts").inc()
+            raise TimeoutError(errno.ETIMEDOUT, "No HID reply within %.1f ms on fd %d" % (timeout_ms, self._hid_handle))
+        finally:
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    async def send(self, input_buffer: bytes, timeout_ms: float = DEFAULT_TIMEOUT_MS):
+        """ Write `input_buffer` without waiting for a reply """
+        await self._write(bytes(input_buffer), self._loop.time() + timeout_ms / 1000.0)
+
+    async def receive(self, header: bytes = b"", timeout_ms: float = DEFAULT_TIMEOUT_MS) -> bytes:
+        """ Wait up to `timeout_ms` for the next report starting with `header`, any report by default """
+        waiter = self._loop.create_future()
+        waiters = self._waiters[bytes(header)]
+        waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout_ms / 1000.0)
+        except asyncio.TimeoutError:
+            self._metrics.counter("hid_timeouts").inc()
+            raise TimeoutError(errno.ETIMEDOUT, "No HID report within %.1f ms on fd %d" % (timeout_ms, self._hid_handle))
+        finally:
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    def close(self):
+        self._loop.remove_reader(self._hid_handle)
+        self._fail_all(IOError(errno.EBADF, "HID transport closed"))
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = Lock()
+_transports: Dict[int, AsyncHidTransport] = {}
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """ Process-wide event loop that serves the synchronous wrappers """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(target=_loop.run_forever, name="see3cam-hid-transport", daemon=True).start()
+        return _loop
+
+
+def _transport(hid_handle: int) -> AsyncHidTransport:
+    transport = _transports.get(hid_handle)
+    if transport is None:
+        transport = _transports[hid_handle] = AsyncHidTransport(
+            hid_handle, BUFFER_LENGTH, asyncio.get_event_loop(), hid_metrics(hid_handle)
+        )
+    return transport
+
+
+async def _request(hid_handle: int, input_buffer: bytes, header: bytes, timeout_ms: float) -> bytes:
+    return await _transport(hid_handle).request(input_buffer, header, timeout_ms)
+
+
+async def _send(hid_handle: int, input_buffer: bytes, timeout_ms: float):
+    await _transport(hid_handle).send(input_buffer, timeout_ms)
+
+
+async def _receive(hid_handle: int, header: bytes, timeout_ms: float) -> bytes:
+    return await _transport(hid_handle).receive(header, timeout_ms)
+
+
+async def _close(hid_handle: int):
+    transport = _transports.pop(hid_handle, None)
+    discard_hid_metrics(hid_handle)
+    if transport is not None:
+        transport.close()
+
+
+def hid_request(hid_handle: int, input_buffer: bytes, header: bytes, timeout_ms: float = DEFAULT_TIMEOUT_MS) -> bytes:
+    """ Blocking request/response over the shared transport loop """
+    future = asyncio.run_coroutine_threadsafe(_request(hid_handle, input_buffer, header, timeout_ms), _background_loop())
+    return future.result()
+
+
+async def hid_request_async(hid_handle: int, input_buffer: bytes, header: bytes, timeout_ms: float = DEFAULT_TIMEOUT_MS) -> bytes:
+    """ Awaitable request/response usable from any event loop; the fd itself is always served by the transport loop """
+    future = asyncio.run_coroutine_threadsafe(_request(hid_handle, input_buffer, header, timeout_ms), _background_loop())
+    return await asyncio.wrap_future(future)
+
+
+def hid_send(hid_handle: int, input_buffer: bytes, timeout_ms: float = DEFAULT_TIMEOUT_MS):
+    """ Blocking write over the shared transport loop """
+    asyncio.run_coroutine_threadsafe(_send(hid_handle, input_buffer, timeout_ms), _background_loop()).result()
+
+
+def hid_receive(hid_handle: int, header: bytes = b"", timeout_ms: float = DEFAULT_TIMEOUT_MS) -> bytes:
+    """ Blocking wait for the next report starting with `header` over the shared transport loop """
+    return asyncio.run_coroutine_threadsafe(_receive(hid_handle, header, timeout_ms), _background_loop()).result()
+
+
+def close_hid_transport(hid_handle: int):
+    """ Unregister the fd from the transport loop. Call before closing the fd """
+    if _loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(_close(hid_handle), _loop).result()
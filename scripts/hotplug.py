@@ -0,0 +1,98 @@
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Optional, Sequence
+
+from scripts.hid_discovery import serial_from_device_id, serial_from_udev_properties
+
+
+class HotplugWatcher(object):
+    """Reconnects Cameras whose See3CAM was removed from and re-added to the USB bus (reset, re-enumeration, replug).
+
+    A background thread listens to video4linux udev events. A removal marks the camera with that serial as lost and
+    closes its devices (`Camera.disconnect`, which also starts the `hotplug_recovery` clock); the next add event for
+    the serial reconnects it with `Camera.reconnect` (retried until `settle_timeout` while udev is still creating the
+    video / hidraw nodes). Add events of cameras that were not lost, e.g. the second video node of
+    the same device, are ignored.
+    `reconnect(camera)` replaces `Camera.reconnect` (e.g. to hand in emulated devices).
+    """
+
+    def __init__(self, cameras: Sequence, settle_timeout: float = 2.0, reconnect: Optional[Callable[[object], object]] = None):
+        self._cameras: Dict[str, object] = {serial_from_device_id(camera.camera_config.device_id): camera for camera in cameras}
+        self._settle_timeout = settle_timeout
+        self._reconnect = reconnect if reconnect is not None else (lambda camera: camera.reconnect())
+        self._lost: Dict[str, float] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def lost_serials(self):
+        with self._lock:
+            return sorted(self._lost.keys())
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # WARNING: LGPL
+        import pyudev
+
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by("video4linux")
+        monitor.start()
+        self._stop.clear()
+        self._thread = Thread(target=self._run, args=(monitor,), name="see3cam-hotplug", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, monitor):
+        while not self._stop.is_set():
+            device = monitor.poll(timeout=0.5)
+            if device is None:
+                continue
+            serial_id = serial_from_udev_properties(device.properties)
+            if serial_id is not None:
+                self.handle_event(device.action, serial_id)
+
+    def handle_event(self, action: str, serial_id: str) -> bool:
+        """ Process one udev action for a See3CAM serial. Returns True when a camera was reconnected """
+        camera = self._cameras.get(serial_id)
+        if camera is None:
+            return False
+        if action == "remove":
+            with self._lock:
+                if serial_id in self._lost:
+                    return False
+                self._lost[serial_id] = time.monotonic()
+            print("See3CAM {} was removed, waiting for it to come back".format(serial_id))
+            camera.disconnect()
+            return False
+        if action != "add":
+            return False
+        with self._lock:
+            if serial_id not in self._lost:
+                return False
+        if not self._reconnect_until_settled(camera, serial_id):
+            return False
+        with self._lock:
+            lost_at = self._lost.pop(serial_id)
+        print("See3CAM {} reconnected after {:.2f} s".format(serial_id, time.monotonic() - lost_at))
+        return True
+
+    def _reconnect_until_settled(self, camera, serial_id: str) -> bool:
+        deadline = time.monotonic() + self._settle_timeout
+        while True:
+            try:
+                # The hidraw node may show up a little after the video node; resolving it re-enumerates on a miss
+                self._reconnect(camera)
+                return True
+            except (RuntimeError, OSError) as e:
+                if time.monotonic() >= deadline:
+                    print("Reconnecting See3CAM {} failed: {}".format(serial_id, e))
+                    return False
+                time.sleep(0.05)
@@ -0,0 +1,196 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from threading import Event, Thread
+from typing import Dict, List, Optional, Sequence
+
+# Upper bounds in milliseconds; the last implicit bucket is +Inf
+DEFAULT_LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 33.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+
+class LatencyHistogram(object):
+    """Fixed-bucket latency histogram.
+
+    Observations are a bisect and two increments without a lock; concurrent writers may rarely lose an update, which is
+    acceptable for monitoring and keeps the hot path cheap.
+    """
+
+    __slots__ = ("_bounds_ns", "bounds_ms", "counts", "sum_ns", "count")
+
+    def __init__(self, bounds_ms: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self._bounds_ns = [int(bound * 1e6) for bound in self.bounds_ms]
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe_ns(self, elapsed_ns: int):
+        self.counts[bisect_left(self._bounds_ns, elapsed_ns)] += 1
+        self.sum_ns += elapsed_ns
+        self.count += 1
+
+    def quantile_ms(self, quantile: float) -> Optional[float]:
+        """ Upper bound of the bucket holding the quantile (None when empty, inf when in the overflow bucket) """
+        if self.count == 0:
+            return None
+        rank = quantile * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds_ms + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_ms": self.sum_ns / 1e6,
+            "mean_ms": self.sum_ns / 1e6 / self.count if self.count else None,
+            "p50_ms": self.quantile_ms(0.5),
+            "p99_ms": self.quantile_ms(0.99),
+            "buckets_ms": list(self.bounds_ms),
+            "counts": list(self.counts),
+        }
+
+
+class Counter(object):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class _Span(object):
+    __slots__ = ("_histogram", "_start_ns")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start_ns = time.monotonic_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe_ns(time.monotonic_ns() - self._start_ns)
+        return False
+
+
+class Metrics(object):
+    """ Named latency histograms and counters of one component """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels = dict(labels) if labels is not None else {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Counter] = {}
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def counter(self, name: str) -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def span(self, name: str) -> _Span:
+        """ `with metrics.span("remap"):` records the monotonic duration of the block """
+        return _Span(self.histogram(name))
+
+    def snapshot(self) -> dict:
+        return {
+            "latency": {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())},
+            "counters": {name: counter.value for name, counter in sorted(self._counters.items())},
+        }
+
+    def prometheus_lines(self, prefix: str = "see3cam") -> List[str]:
+        label_text = ",".join('{}="{}"'.format(key, value) for key, value in sorted(self.labels.items()))
+        lines = []
+        for name, histogram in sorted(self._histograms.items()):
+            metric = "{}_{}_seconds".format(prefix, name)
+            lines.append("# TYPE {} histogram".format(metric))
+            cumulative = 0
+            for bound, count in zip(histogram.bounds_ms + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound / 1000.0)
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(metric, label_text + "," if label_text else "", le, cumulative))
+            lines.append("{}_sum{{{}}} {}".format(metric, label_text, histogram.sum_ns / 1e9))
+            lines.append("{}_count{{{}}} {}".format(metric, label_text, histogram.count))
+        for name, counter in sorted(self._counters.items()):
+            metric = "{}_{}_total".format(prefix, name)
+            lines.append("# TYPE {} counter".format(metric))
+            lines.append("{}{{{}}} {}".format(metric, label_text, counter.value))
+        return lines
+
+
+_hid_metrics: Dict[int, Metrics] = {}
+
+
+def hid_metrics(hid_handle: int) -> Metrics:
+    """ Round trip latency and retry / timeout counters of the HID transport serving `hid_handle` """
+    return _hid_metrics.setdefault(hid_handle, Metrics())
+
+
+def bind_hid_metrics(hid_handle: int, metrics: Metrics):
+    """ Keep counting into `metrics` for a reopened fd (e.g. after a USB reconnect) """
+    _hid_metrics[hid_handle] = metrics
+
+
+def discard_hid_metrics(hid_handle: int):
+    _hid_metrics.pop(hid_handle, None)
+
+
+class MetricsExporter(object):
+    """Writes metrics to a local file every `interval` seconds from a background thread.
+
+    "prometheus": the file is atomically replaced with the text exposition format (node_exporter textfile collector).
+    "jsonl": one JSON object per export is appended.
+    """
+
+    def __init__(self, metrics: Sequence[Metrics], path: str, fmt: str = "prometheus", interval: float = 10.0):
+        if fmt not in ["prometheus", "jsonl"]:
+            raise ValueError("No such metrics format {}. Choose [prometheus, jsonl]".format(fmt))
+        self._metrics = list(metrics)
+        self._path = Path(path)
+        self._format = fmt
+        self._interval = interval
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="see3cam-metrics", daemon=True)
+        self._thread.start()
+
+    def export(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if self._format == "prometheus":
+            lines = []
+            for metrics in self._metrics:
+                lines += metrics.prometheus_lines()
+            tmp_path = self._path.with_name(self._path.name + ".tmp")
+            tmp_path.write_text("\n".join(lines) + "\n")
+            os.replace(str(tmp_path), str(self._path))
+        else:
+            record = {"time": time.time()}
+            for metrics in self._metrics:
+                snapshot = metrics.snapshot()
+                snapshot["labels"] = metrics.labels
+                record.setdefault("metrics", []).append(snapshot)
+            with open(str(self._path), "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.export()
+            except OSError as e:
+                print("Failed to export metrics to {}: {}".format(self._path, e))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()
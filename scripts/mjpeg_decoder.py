@@ -0,0 +1,97 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from typing import Any, Callable, Deque, List, Optional
+
+import cv2
+import numpy as np
+
+
+class _PendingFrame(object):
+    __slots__ = ("context", "image", "done")
+
+    def __init__(self, context: Any):
+        self.context = context
+        self.image: Optional[np.ndarray] = None
+        self.done = False
+
+
+class OrderedJpegDecoder(object):
+    """Decodes JPEG buffers on a thread pool and delivers the images in submission order.
+
+    cv2.imdecode releases the GIL, so `num_workers` frames decode in parallel. Whichever worker completes the oldest
+    pending frame calls `deliver(image, context)` for it and every following frame that is already decoded; `image` is
+    None when the buffer could not be decoded. At most `max_pending` frames are in flight, `submit` returns False and
+    drops the frame beyond that so a slow decoder never blocks the capture thread.
+    """
+
+    def __init__(self, deliver: Callable[[Optional[np.ndarray], Any], None], num_workers: int = 2, max_pending: Optional[int] = None):
+        self._deliver = deliver
+        self._max_pending = max_pending if max_pending is not None else 2 * num_workers
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="see3cam-jpeg")
+        self._pending: Deque[_PendingFrame] = deque()
+        self._lock = Lock()
+        self._deliver_lock = Lock()
+        self._drained = Condition(self._lock)
+
+    def submit(self, jpeg: np.ndarray, context: Any = None) -> bool:
+        pending = _PendingFrame(context)
+        with self._lock:
+            if len(self._pending) >= self._max_pending:
+                return False
+            self._pending.append(pending)
+        self._executor.submit(self._decode, jpeg, pending)
+        return True
+
+    def _decode(self, jpeg: np.ndarray, pending: _PendingFrame):
+        try:
+            image = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        except cv2.error:
+            image = None
+        with self._lock:
+            pending.image = image
+            pending.done = True
+        self._drain()
+
+    def _drain(self):
+        while True:
+            # One deliverer at a time keeps the order; a worker finding it busy leaves its frame to the current deliverer
+            if not self._deliver_lock.acquire(blocking=False):
+                return
+            try:
+                ready = self._pop_ready()
+                while ready:
+                    for frame in ready:
+                        self._deliver(frame.image if frame.image is not None and frame.image.size else None, frame.context)
+                    ready = self._pop_ready()
+            finally:
+                self._deliver_lock.release()
+            # A frame may have completed after the last check, while its worker found the deliverer busy
+            with self._lock:
+                if not (self._pending and self._pending[0].done):
+                    return
+
+    def _pop_ready(self) -> List[_PendingFrame]:
+        with self._lock:
+            ready = []
+            while self._pending and self._pending[0].done:
+                ready.append(self._pending.popleft())
+            if not self._pending:
+                self._drained.notify_all()
+            return ready
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """ Wait until every submitted frame was delivered """
+        with self._lock:
+            if not self._drained.wait_for(lambda: not self._pending, timeout):
+                return False
+        # The last frames may still be in the hands of the deliverer
+        with self._deliver_lock:
+            return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from attr import dataclass
+
+
+@dataclass
+class OutputProfile:
+    """Output stream produced from each frame with a single cv2.remap.
+
+    `crop` is (x, y, width, height) in full-resolution image coordinates (rectified when `undistort` is set), and the
+    cropped area is scaled to `width` x `height`.
+    """
+
+    name: str
+    width: int
+    height: int
+    crop: Optional[Tuple[int, int, int, int]] = None
+    interpolation: int = cv2.INTER_LINEAR
+    undistort: bool = True
+
+    def crop_rect(self, image_width: int, image_height: int) -> Tuple[int, int, int, int]:
+        return tuple(self.crop) if self.crop is not None else (0, 0, image_width, image_height)
+
+    def scale_matrix(self, image_width: int, image_height: int) -> np.ndarray:
+        """ Maps full-resolution pixel coordinates to profile pixel coordinates (pixel centers aligned like cv2.resize) """
+        crop_x, crop_y, crop_width, crop_height = self.crop_rect(image_width, image_height)
+        scale_x = self.width / crop_width
+        scale_y = self.height / crop_height
+        return np.array(
+            [
+                [scale_x, 0.0, scale_x * (0.5 - crop_x) - 0.5],
+                [0.0, scale_y, scale_y * (0.5 - crop_y) - 0.5],
+                [0.0, 0.0, 1.0],
+            ]
+        )
+
+
+def build_profile_maps(
+    profile: OutputProfile, camera_mat: np.ndarray, dist_coef: np.ndarray, projection_camera_mat: np.ndarray, image_size: Tuple[int, int]
+):
+    """ Remap tables that undistort (optionally), crop and resize in one pass """
+    image_width, image_height = image_size
+    scale_mat = profile.scale_matrix(image_width, image_height)
+    if profile.undistort:
+        profile_projection_mat = scale_mat @ projection_camera_mat
+        return cv2.fisheye.initUndistortRectifyMap(
+            camera_mat, dist_coef, np.eye(3), profile_projection_mat, (profile.width, profile.height), cv2.CV_16SC2
+        )
+
+    inverse_scale_mat = np.linalg.inv(scale_mat)
+    map_x = (np.arange(profile.width, dtype=np.float32) * inverse_scale_mat[0, 0] + inverse_scale_mat[0, 2]).astype(np.float32)
+    map_y = (np.arange(profile.height, dtype=np.float32) * inverse_scale_mat[1, 1] + inverse_scale_mat[1, 2]).astype(np.float32)
+    map_x, map_y = np.meshgrid(map_x, map_y)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
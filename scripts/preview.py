@@ -0,0 +1,133 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from scripts.output_profile import OutputProfile
+
+Rect = Tuple[int, int, int, int]
+
+_PROFILE_NAME = "preview"
+
+
+class PreviewWindow(object):
+    """Preview of a Camera that renders into one preallocated canvas.
+
+    The camera runs threaded capture, and the window only picks up the latest frame at `refresh_hz`, so a slow display
+    never throttles acquisition. Nothing is allocated per frame: the frame is resized (or undistorted and resized in a
+    single remap) straight into the canvas, and the canvas is only redrawn and shown when a new frame arrived or an
+    overlay changed. Overlays are given in full-resolution image coordinates and converted once when they are set.
+    """
+
+    def __init__(
+        self,
+        camera,
+        scale: float = 0.65,
+        undistort: bool = False,
+        window_name: str = "Capture",
+        refresh_hz: float = 30.0,
+        background: Tuple[int, int, int] = (49, 52, 49),
+    ):
+        self._camera = camera
+        self._scale = scale
+        self._undistort = undistort
+        self._window_name = window_name
+        self._refresh_period = 1.0 / refresh_hz
+        self._width = int(camera.image_width * scale)
+        self._height = int(camera.image_height * scale)
+        self._canvas = np.empty((self._height, self._width, 3), np.uint8)
+        self._canvas[:] = background
+        if undistort:
+            camera.add_output_profile(OutputProfile(_PROFILE_NAME, self._width, self._height, interpolation=cv2.INTER_LINEAR))
+        self._overlays: Dict[str, Callable[[np.ndarray], None]] = {}
+        self._rendered_sequence = 0
+        self._dirty = True
+        self._on_click: Optional[Callable[[int, int], None]] = None
+
+    @property
+    def canvas(self) -> np.ndarray:
+        return self._canvas
+
+    @property
+    def scale(self) -> float:
+        return self._scale
+
+    def to_image_coordinates(self, x: int, y: int) -> Tuple[int, int]:
+        return int(x / self._scale), int(y / self._scale)
+
+    def to_canvas_rect(self, rect: Rect) -> Rect:
+        """ Scale a full-resolution (x, y, width, height) rectangle to the canvas and clip it """
+        x, y, width, height = (int(value * self._scale) for value in rect)
+        x_end, y_end = min(x + width, self._width), min(y + height, self._height)
+        x, y = max(x, 0), max(y, 0)
+        return x, y, max(x_end - x, 0), max(y_end - y, 0)
+
+    def set_overlay(self, name: str, draw: Optional[Callable[[np.ndarray], None]]):
+        """ `draw(canvas)` is called after every redraw of the frame. None removes the overlay """
+        if draw is None:
+            self._overlays.pop(name, None)
+        else:
+            self._overlays[name] = draw
+        self._dirty = True
+
+    def set_rectangle(self, name: str, rect: Rect, color: Tuple[int, int, int] = (0, 0, 255), thickness: int = 1):
+        """ Rectangle overlay in full-resolution image coordinates; unchanged rectangles do not trigger a redraw """
+        x, y, width, height = self.to_canvas_rect(rect)
+        key = (x, y, width, height, tuple(color), thickness)
+        current = self._overlays.get(name)
+        if current is not None and getattr(current, "key", None) == key:
+            return
+
+        def draw(canvas: np.ndarray):
+            cv2.rectangle(canvas, (x, y), (x + width - 1, y + height - 1), color, thickness)
+
+        draw.key = key
+        self.set_overlay(name, draw)
+
+    def render(self) -> bool:
+        """ Redraw the canvas when a new frame arrived or an overlay changed. Returns whether it was redrawn """
+        frame = self._camera.latest_frame()
+        if frame is None or (frame.sequence == self._rendered_sequence and not self._dirty):
+            return False
+        image = self._camera.to_bgr(frame)
+        if self._undistort:
+            self._camera.render_profile(_PROFILE_NAME, dst=self._canvas, image=image)
+        else:
+            cv2.resize(image, (self._width, self._height), dst=self._canvas, interpolation=cv2.INTER_LINEAR)
+        for draw in self._overlays.values():
+            draw(self._canvas)
+        self._rendered_sequence = frame.sequence
+        self._dirty = False
+        return True
+
+    def _on_mouse(self, event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN and self._on_click is not None:
+            self._on_click(*self.to_image_coordinates(x, y))
+
+    def run(self, on_frame: Optional[Callable[[], None]] = None, on_click: Optional[Callable[[int, int], None]] = None):
+        """Show the preview until ESC or q is pressed. Must be called from the main thread (HighGUI).
+
+        `on_frame()` runs once per refresh before rendering, `on_click(x, y)` receives left clicks in image coordinates.
+        """
+        if not self._camera.is_capturing:
+            self._camera.start_capture()
+        self._on_click = on_click
+        cv2.namedWindow(self._window_name)
+        cv2.setMouseCallback(self._window_name, self._on_mouse)
+        next_refresh = time.monotonic()
+        try:
+            while True:
+                if on_frame is not None:
+                    on_frame()
+                if self.render():
+                    cv2.imshow(self._window_name, self._canvas)
+                next_refresh += self._refresh_period
+                wait_ms = max(int((next_refresh - time.monotonic()) * 1000), 1)
+                if wait_ms == 1:
+                    next_refresh = time.monotonic()
+                key = cv2.waitKey(wait_ms)
+                if key == 27 or key == ord("q"):
+                    break
+        finally:
+            cv2.destroyWindow(self._window_name)
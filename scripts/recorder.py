@@ -0,0 +1,294 @@
+import ctypes
+import json
+import multiprocessing
+import os
+import queue
+import time
+from pathlib import Path
+from threading import Event, Thread
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from scripts.frame_ring import FRAME_RECORD_DTYPE, RingFrame
+
+# Index row of every recorded frame: the capture record, the AE state that was acknowledged when the frame was taken
+# and where the frame lives in the chunk files
+INDEX_DTYPE = np.dtype(
+    FRAME_RECORD_DTYPE.descr
+    + [("ae_mode", np.uint8), ("roi_x", np.uint8), ("roi_y", np.uint8), ("win_size", np.uint8), ("chunk", np.int32), ("slot", np.int32)]
+)
+
+_AE_MODE_CODES = {"centered": 0x01, "roi": 0x02, "lower_center": 0x02, "disabled": 0x03}
+
+META_FILE = "meta.json"
+
+
+def _chunk_path(directory: Path, chunk: int) -> Path:
+    return Path(directory, "chunk_{:05d}.raw".format(chunk))
+
+
+def _index_path(directory: Path, chunk: int) -> Path:
+    return Path(directory, "index_{:05d}.npy".format(chunk))
+
+
+def encode_ae_state(ae_state: Optional[tuple]) -> Tuple[int, int, int, int]:
+    """ (mode, roi_x, roi_y, win_size) of an acknowledged AE state tuple, zeros when unknown """
+    if not ae_state:
+        return 0, 0, 0, 0
+    mode = _AE_MODE_CODES.get(ae_state[0], 0)
+    if len(ae_state) == 4:
+        # ("roi" | "lower_center", x, y, win_size)
+        return (mode,) + tuple(ae_state[1:4])
+    return mode, 0, 0, 0
+
+
+def _open_chunk(directory: Path, chunk: int, frames_per_chunk: int, frame_shape: Tuple[int, ...]) -> np.memmap:
+    path = _chunk_path(directory, chunk)
+    size = frames_per_chunk * int(np.prod(frame_shape))
+    with open(str(path), "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+    return np.memmap(str(path), np.uint8, "r+", shape=(frames_per_chunk,) + tuple(frame_shape))
+
+
+def _save_index(directory: Path, chunk: int, index_rows: list):
+    # Written under a temporary name and renamed, so a reader never loads a partial index
+    path = _index_path(directory, chunk)
+    temporary_path = path.with_suffix(".tmp")
+    with open(str(temporary_path), "wb") as f:
+        np.save(f, np.array(index_rows, INDEX_DTYPE))
+    os.replace(str(temporary_path), str(path))
+
+
+def _close_chunk(directory: Path, chunk: int, frames: np.memmap, index_rows: list):
+    frames.flush()
+    _save_index(directory, chunk, index_rows)
+
+
+def _writer_main(directory, frames_per_chunk, frame_shape, shared_slots, num_slots, frame_queue, free_queue, index_interval):
+    """Writer process: copies frames from the shared slots into memory-mapped chunk files.
+
+    The index of the open chunk is rewritten at most `index_interval` seconds after a frame was added to it, so a
+    recording cut short (crash, power loss) keeps all but the last moments of frames.
+    """
+    directory = Path(directory)
+    slots = np.frombuffer(shared_slots, np.uint8).reshape((num_slots,) + tuple(frame_shape))
+    chunk, position, frames, index_rows = -1, frames_per_chunk, None, []
+    index_due: Optional[float] = None
+    while True:
+        try:
+            item = frame_queue.get(timeout=None if index_due is None else max(index_due - time.monotonic(), 0.0))
+        except queue.Empty:
+            item = ()
+        if item is None:
+            break
+        if item:
+            slot, record = item
+            if position == frames_per_chunk:
+                if frames is not None:
+                    _close_chunk(directory, chunk, frames, index_rows)
+                chunk, position, index_rows = chunk + 1, 0, []
+                frames = _open_chunk(directory, chunk, frames_per_chunk, frame_shape)
+            frames[position] = slots[slot]
+            free_queue.put(slot)
+            index_rows.append(tuple(record) + (chunk, position))
+            position += 1
+            if index_due is None:
+                index_due = time.monotonic() + index_interval
+        if index_due is not None and time.monotonic() >= index_due:
+            _save_index(directory, chunk, index_rows)
+            index_due = None
+    if frames is not None:
+        _close_chunk(directory, chunk, frames, index_rows)
+
+
+class Recorder(object):
+    """Records raw frames to preallocated chunk files from a separate writer process.
+
+    Frames are copied into one of `num_slots` shared-memory slots and handed over by slot index, so the capture side only
+    pays for one memcpy. When the writer falls behind and no slot is free the frame is dropped (and counted) instead of
+    blocking capture. The index of the chunk being written is saved every `index_interval` seconds, not only when the
+    chunk is full, so the recording can be replayed up to then even if close() is never reached.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        width: int,
+        height: int,
+        channels: int = 3,
+        fps: float = 30.0,
+        frames_per_chunk: int = 300,
+        num_slots: int = 16,
+        index_interval: float = 1.0,
+    ):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._frame_shape = (height, width, channels) if channels > 1 else (height, width)
+        meta = {"width": width, "height": height, "channels": channels, "dtype": "uint8", "fps": fps, "frames_per_chunk": frames_per_chunk}
+        Path(self._directory, META_FILE).write_text(json.dumps(meta, indent=1))
+
+        context = multiprocessing.get_context("spawn")
+        self._shared_slots = context.RawArray(ctypes.c_uint8, num_slots * int(np.prod(self._frame_shape)))
+        self._slots = np.frombuffer(self._shared_slots, np.uint8).reshape((num_slots,) + self._frame_shape)
+        self._frame_queue = context.Queue()
+        self._free_queue = context.Queue()
+        for slot in range(num_slots):
+            self._free_queue.put(slot)
+        self._process = context.Process(
+            target=_writer_main,
+            args=(
+                str(self._directory),
+                frames_per_chunk,
+                self._frame_shape,
+                self._shared_slots,
+                num_slots,
+                self._frame_queue,
+                self._free_queue,
+                index_interval,
+            ),
+            name="see3cam-recorder",
+            daemon=True,
+        )
+        self._process.start()
+        self.recorded_frames = 0
+        self.dropped_frames = 0
+        self._camera_thread: Optional[Thread] = None
+        self._camera_stop = Event()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def record(self, frame: RingFrame, ae_state: Optional[tuple] = None) -> bool:
+        try:
+            slot = self._free_queue.get_nowait()
+        except queue.Empty:
+            self.dropped_frames += 1
+            return False
+        np.copyto(self._slots[slot], frame.data)
+        self._frame_queue.put((slot, (frame.sequence, frame.monotonic_ns, frame.driver_msec) + encode_ae_state(ae_state)))
+        self.recorded_frames += 1
+        return True
+
+    def attach(self, camera):
+        """ Record every frame of a camera running threaded capture from a background consumer thread """
+        if not camera.is_capturing:
+            raise RuntimeError("Recorder.attach needs a camera with threaded capture")
+
+        def consume():
+            sequence = camera.latest_frame().sequence if camera.latest_frame() is not None else 0
+            while not self._camera_stop.is_set():
+                frame = camera.next_frame(sequence, timeout=0.1)
+                if frame is None:
+                    continue
+                self.dropped_frames += frame.sequence - sequence - 1 if sequence > 0 else 0
+                self.record(frame, camera.acknowledged_auto_exposure_state)
+                sequence = frame.sequence
+
+        self._camera_stop.clear()
+        self._camera_thread = Thread(target=consume, name="see3cam-recorder-feed", daemon=True)
+        self._camera_thread.start()
+
+    def close(self):
+        if self._camera_thread is not None:
+            self._camera_stop.set()
+            self._camera_thread.join()
+            self._camera_thread = None
+        self._frame_queue.put(None)
+        self._process.join()
+
+
+class ReplayCapture(object):
+    """cv2.VideoCapture-compatible source over a recording made by Recorder.
+
+    Chunks are memory-mapped read-only. By default frames are served as fast as they are read; with `realtime` they are
+    paced by the recorded timestamps divided by `speed`. CAP_PROP_POS_MSEC reports the recorded driver timestamp.
+    """
+
+    def __init__(self, directory: str, realtime: bool = False, speed: float = 1.0, loop: bool = False):
+        self._directory = Path(directory)
+        meta = json.loads(Path(self._directory, META_FILE).read_text())
+        channels = meta["channels"]
+        self._frame_shape = (meta["height"], meta["width"], channels) if channels > 1 else (meta["height"], meta["width"])
+        self._fps = float(meta["fps"])
+        index_paths = sorted(self._directory.glob("index_*.npy"))
+        if not index_paths:
+            raise RuntimeError("No recording found in {}".format(directory))
+        self.index = np.concatenate([np.load(str(path)) for path in index_paths])
+        self._chunks = {}
+        for chunk in np.unique(self.index["chunk"]):
+            frame_count = os.path.getsize(str(_chunk_path(self._directory, chunk))) // int(np.prod(self._frame_shape))
+            self._chunks[int(chunk)] = np.memmap(
+                str(_chunk_path(self._directory, chunk)), np.uint8, "r", shape=(frame_count,) + self._frame_shape
+            )
+        self._realtime = realtime
+        self._speed = speed
+        self._loop = loop
+        self._position = 0
+        self._start: Optional[Tuple[float, int]] = None
+        self._opened = True
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, position: int) -> np.ndarray:
+        """ Zero-copy view of a recorded frame """
+        row = self.index[position]
+        return self._chunks[int(row["chunk"])][int(row["slot"])]
+
+    def read(self, image: Optional[np.ndarray] = None):
+        if not self._opened:
+            return False, image
+        if self._position >= len(self.index):
+            if not self._loop:
+                return False, image
+            self._position, self._start = 0, None
+        row = self.index[self._position]
+        if self._realtime:
+            if self._start is None:
+                self._start = (time.monotonic(), int(row["monotonic_ns"]))
+            due = self._start[0] + (int(row["monotonic_ns"]) - self._start[1]) / 1e9 / self._speed
+            if due > time.monotonic():
+                time.sleep(due - time.monotonic())
+
+        frame = self.frame(self._position)
+        self._position += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, np.array(frame)
+
+    def get(self, prop_id: int) -> float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._frame_shape[1])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._frame_shape[0])
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self._fps
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.index))
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            if self._position == 0:
+                return 0.0
+            return float(self.index[self._position - 1]["driver_msec"])
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self._position, self._start = int(value), None
+            return True
+        return False
+
+    def release(self):
+        self._opened = False
+        self._chunks = {}
@@ -0,0 +1,80 @@
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+
+def build_inverse_distortion_lut(
+    camera_mat: np.ndarray, dist_coef: np.ndarray, projection_camera_mat: np.ndarray, image_size: Tuple[int, int], step: int = 16
+) -> np.ndarray:
+    """Raw sensor coordinates of a grid of rectified pixels, every `step` pixels, as float32 (rows, cols, 2).
+
+    The grid covers the whole rectified image (the last node is at or past the last pixel), and the mapping is the one
+    fisheye_undistort_rectify_map samples: rectified pixel -> normalized coordinates -> fisheye distortion.
+    """
+    image_width, image_height = image_size
+    xs = np.arange(0, image_width - 1 + step, step, dtype=np.float64)
+    ys = np.arange(0, image_height - 1 + step, step, dtype=np.float64)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    inverse_projection = np.linalg.inv(projection_camera_mat)
+    normalized_x = inverse_projection[0, 0] * grid_x + inverse_projection[0, 1] * grid_y + inverse_projection[0, 2]
+    normalized_y = inverse_projection[1, 1] * grid_y + inverse_projection[1, 2]
+    normalized = np.stack([normalized_x, normalized_y], axis=-1).reshape(1, -1, 2)
+    raw = cv2.fisheye.distortPoints(normalized, camera_mat, dist_coef)
+    return raw.reshape(len(ys), len(xs), 2).astype(np.float32)
+
+
+class RectifiedRoiMapper(object):
+    """Maps points of the undistorted (rectified) image to raw sensor pixels through a low-resolution lookup table.
+
+    A lookup is a bilinear interpolation between the four surrounding grid nodes, so it costs the same wherever the
+    point is, instead of a cv2.fisheye.distortPoints call per point. Points are clamped to the image on both sides.
+    """
+
+    def __init__(
+        self, camera_mat: np.ndarray, dist_coef: np.ndarray, projection_camera_mat: np.ndarray, image_size: Tuple[int, int], step: int = 16
+    ):
+        self._image_width, self._image_height = image_size
+        self._step = step
+        self._lut = build_inverse_distortion_lut(camera_mat, dist_coef, projection_camera_mat, image_size, step)
+        # Python floats keep the scalar path free of numpy scalar overhead
+        self._lut_rows = self._lut.tolist()
+
+    @property
+    def lut(self) -> np.ndarray:
+        return self._lut
+
+    @property
+    def step(self) -> int:
+        return self._step
+
+    def to_raw(self, xcord: float, ycord: float) -> Tuple[float, float]:
+        """ Raw sensor position of one rectified pixel position """
+        grid_x = min(max(xcord, 0.0), self._image_width - 1) / self._step
+        grid_y = min(max(ycord, 0.0), self._image_height - 1) / self._step
+        column = min(int(grid_x), len(self._lut_rows[0]) - 2)
+        row = min(int(grid_y), len(self._lut_rows) - 2)
+        fx, fy = grid_x - column, grid_y - row
+        top, bottom = self._lut_rows[row], self._lut_rows[row + 1]
+        raw = []
+        for channel in range(2):
+            upper = top[column][channel] * (1.0 - fx) + top[column + 1][channel] * fx
+            lower = bottom[column][channel] * (1.0 - fx) + bottom[column + 1][channel] * fx
+            raw.append(upper * (1.0 - fy) + lower * fy)
+        return min(max(raw[0], 0.0), self._image_width - 1), min(max(raw[1], 0.0), self._image_height - 1)
+
+    def to_raw_array(self, xcords, ycords) -> np.ndarray:
+        """ Vectorized to_raw for a track of points: (N, 2) float64 raw sensor positions """
+        xcords = np.clip(np.asarray(xcords, np.float64).ravel(), 0, self._image_width - 1)
+        ycords = np.clip(np.asarray(ycords, np.float64).ravel(), 0, self._image_height - 1)
+        grid_x, grid_y = xcords / self._step, ycords / self._step
+        columns = np.minimum(grid_x.astype(np.intp), self._lut.shape[1] - 2)
+        rows = np.minimum(grid_y.astype(np.intp), self._lut.shape[0] - 2)
+        fx = (grid_x - columns)[:, np.newaxis]
+        fy = (grid_y - rows)[:, np.newaxis]
+        upper = self._lut[rows, columns] * (1.0 - fx) + self._lut[rows, columns + 1] * fx
+        lower = self._lut[rows + 1, columns] * (1.0 - fx) + self._lut[rows + 1, columns + 1] * fx
+        raw = upper * (1.0 - fy) + lower * fy
+        np.clip(raw[:, 0], 0, self._image_width - 1, out=raw[:, 0])
+        np.clip(raw[:, 1], 0, self._image_height - 1, out=raw[:, 1])
+        return raw
@@ -0,0 +1,132 @@
+import argparse
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bump when the layout of the cached maps changes so stale files are never picked up
+_CACHE_FORMAT_VERSION = 1
+_INTRINSIC_FIELDS = ("fx", "fy", "cx", "cy", "k1", "k2", "k3", "k4", "width", "height")
+
+Maps = Tuple[np.ndarray, ...]
+
+
+def default_cache_dir() -> Path:
+    if os.environ.get("SEE3CAM_CACHE_DIR"):
+        return Path(os.environ["SEE3CAM_CACHE_DIR"])
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    return Path(xdg_cache_home if xdg_cache_home else Path.home() / ".cache", "see3cam")
+
+
+def intrinsics_key(cfg, *extra) -> str:
+    """ Hash of the calibration (and any extra map parameters) that identifies a set of remap tables """
+    import cv2
+
+    values = [repr(float(getattr(cfg, name))) for name in _INTRINSIC_FIELDS]
+    values += [repr(value) for value in extra]
+    values += [str(_CACHE_FORMAT_VERSION), cv2.__version__]
+    return hashlib.sha1(",".join(values).encode("utf-8")).hexdigest()[:16]
+
+
+def _device_slug(device_id: Optional[str]) -> str:
+    if not device_id:
+        return "default"
+    return re.sub(r"[^A-Za-z0-9]+", "_", Path(device_id).name).strip("_")
+
+
+def _map_paths(cache_dir: Path, prefix: str, key: str, num_maps: int):
+    return [Path(cache_dir, "{}-{}.map{}.npy".format(prefix, key, index + 1)) for index in range(num_maps)]
+
+
+def load_maps(cache_dir: Path, prefix: str, key: str, num_maps: int = 2) -> Optional[Maps]:
+    paths = _map_paths(cache_dir, prefix, key, num_maps)
+    if not all(path.exists() for path in paths):
+        return None
+    try:
+        return tuple(np.load(str(path), mmap_mode="r") for path in paths)
+    except (OSError, ValueError):
+        # Truncated or corrupted file, it is rebuilt by the caller
+        return None
+
+
+def save_maps(cache_dir: Path, prefix: str, key: str, maps: Maps) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for path, map_array in zip(_map_paths(cache_dir, prefix, key, len(maps)), maps):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(str(tmp_path), "wb") as f:
+            np.save(f, np.ascontiguousarray(map_array))
+        os.replace(str(tmp_path), str(path))
+
+    # A new key for the same prefix means the calibration changed, so the old tables are dropped
+    for stale_path in cache_dir.glob("{}-*.npy".format(prefix)):
+        if not stale_path.name.startswith("{}-{}.".format(prefix, key)):
+            stale_path.unlink()
+
+
+def load_or_build_maps(prefix: str, key: str, build: Callable[[], Maps], cache_dir: Optional[Path] = None) -> Maps:
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    maps = load_maps(cache_dir, prefix, key)
+    if maps is not None:
+        return maps
+
+    build_result = tuple(build())
+    try:
+        save_maps(cache_dir, prefix, key, build_result)
+    except OSError as e:
+        print("Failed to write remap cache to {}: {}".format(cache_dir, e))
+        return build_result
+    cached = load_maps(cache_dir, prefix, key, len(build_result))
+    return cached if cached is not None else build_result
+
+
+def cached_fisheye_undistort_rectify_map(cfg, cache_dir: Optional[Path] = None) -> Maps:
+    from scripts.camera import fisheye_undistort_rectify_map
+
+    return load_or_build_maps(
+        "undistort_" + _device_slug(cfg.device_id), intrinsics_key(cfg), lambda: fisheye_undistort_rectify_map(cfg), cache_dir
+    )
+
+
+def cached_profile_maps(cfg, profile, cache_dir: Optional[Path] = None) -> Maps:
+    from scripts.camera import fisheye_camera_parameters
+    from scripts.output_profile import build_profile_maps
+
+    key = intrinsics_key(cfg, profile.width, profile.height, profile.crop_rect(cfg.width, cfg.height), profile.undistort)
+    return load_or_build_maps(
+        "profile_{}_{}".format(_device_slug(profile.name), _device_slug(cfg.device_id)),
+        key,
+        lambda: build_profile_maps(profile, *fisheye_camera_parameters(cfg), (cfg.width, cfg.height)),
+        cache_dir,
+    )
+
+
+def warm_cache(config_paths: Sequence[Path], cache_dir: Optional[Path] = None) -> None:
+    from scripts.camera_config import get_config
+
+    for config_path in config_paths:
+        cfg = get_config(str(config_path))
+        cached_fisheye_undistort_rectify_map(cfg, cache_dir)
+        print("Cached undistortion maps for {} ({})".format(config_path, intrinsics_key(cfg)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-compute fisheye undistortion maps for camera configs")
+    default_config_dir = str(Path(Path(__file__).parent.parent, "cfg"))
+    parser.add_argument("config_paths", nargs="*", default=[default_config_dir], help="TOML files or directories containing them")
+    parser.add_argument("--cache-dir", type=str, default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config_paths = []
+    for config_path in map(Path, args.config_paths):
+        config_paths += sorted(config_path.glob("*.toml")) if config_path.is_dir() else [config_path]
+    warm_cache(config_paths, Path(args.cache_dir) if args.cache_dir is not None else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class StripedRemapper(object):
+    """Splits the remap tables into horizontal stripes and remaps them on a persistent thread pool.
+
+    cv2.remap releases the GIL, so the stripes run concurrently. One stripe is always processed on the calling thread.
+    """
+
+    def __init__(
+        self,
+        map1: np.ndarray,
+        map2: Optional[np.ndarray],
+        num_stripes: int = 4,
+        interpolation: int = cv2.INTER_LINEAR,
+        border_mode: int = cv2.BORDER_CONSTANT,
+    ):
+        if num_stripes < 1:
+            raise ValueError("num_stripes must be positive, got {}".format(num_stripes))
+        height = map1.shape[0]
+        num_stripes = min(num_stripes, height)
+        bounds = np.linspace(0, height, num_stripes + 1).astype(int)
+        self._rows = [(int(y_begin), int(y_end)) for y_begin, y_end in zip(bounds[:-1], bounds[1:])]
+        self._map_stripes = [
+            (map1[y_begin:y_end], map2[y_begin:y_end] if map2 is not None else None) for y_begin, y_end in self._rows
+        ]
+        self._output_size = (map1.shape[1], height)
+        self._interpolation = interpolation
+        self._border_mode = border_mode
+        self._executor = ThreadPoolExecutor(max_workers=num_stripes - 1, thread_name_prefix="see3cam-remap") if num_stripes > 1 else None
+
+    @property
+    def num_stripes(self) -> int:
+        return len(self._rows)
+
+    def _remap_stripe(self, src: np.ndarray, dst: np.ndarray, index: int):
+        y_begin, y_end = self._rows[index]
+        map1, map2 = self._map_stripes[index]
+        cv2.remap(src, map1, map2, interpolation=self._interpolation, borderMode=self._border_mode, dst=dst[y_begin:y_end])
+
+    def remap(self, src: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        output_width, output_height = self._output_size
+        if dst is None:
+            dst = np.empty((output_height, output_width) + src.shape[2:], src.dtype)
+        elif dst.shape != (output_height, output_width) + src.shape[2:] or dst.dtype != src.dtype or not dst.flags.c_contiguous:
+            # cv2 would silently allocate a new output for a mismatching dst and leave the caller's buffer untouched
+            raise ValueError(
+                "dst must be a C-contiguous {} array of shape {}, got {} {}".format(
+                    src.dtype, (output_height, output_width) + src.shape[2:], dst.dtype, dst.shape
+                )
+            )
+
+        futures = [self._executor.submit(self._remap_stripe, src, dst, index) for index in range(1, self.num_stripes)] if self._executor else []
+        self._remap_stripe(src, dst, 0)
+        for future in futures:
+            future.result()
+        return dst
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
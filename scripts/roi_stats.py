@@ -0,0 +1,156 @@
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from attr import dataclass
+
+Roi = Tuple[int, int, int, int]
+
+
+@dataclass
+class RoiStatistics:
+    mean: float
+    percentiles: np.ndarray
+    clipped_fraction: float
+    dark_fraction: float
+    histogram: np.ndarray
+    pixel_count: int
+
+
+def luma_view(frame: np.ndarray, roi: Optional[Roi] = None, step: int = 4) -> np.ndarray:
+    """Strided view over the ROI, without copying.
+
+    For BGR frames the green channel stands in for luma (it carries ~60% of BT.601 Y), so no colour conversion is
+    needed; for raw YUYV frames (height, width, 2) the Y samples are used, and single-channel frames as is.
+    """
+    height, width = frame.shape[:2]
+    x, y, roi_width, roi_height = roi if roi is not None else (0, 0, width, height)
+    x_begin, y_begin = max(x, 0), max(y, 0)
+    x_end, y_end = min(x + roi_width, width), min(y + roi_height, height)
+    if frame.ndim == 3:
+        return frame[y_begin:y_end:step, x_begin:x_end:step, 0 if frame.shape[2] == 2 else 1]
+    return frame[y_begin:y_end:step, x_begin:x_end:step]
+
+
+class RoiStatisticsCalculator(object):
+    """ Histogram based brightness statistics of a subsampled ROI """
+
+    def __init__(self, step: int = 4, percentiles: Sequence[float] = (5.0, 50.0, 95.0), clip_level: int = 250, dark_level: int = 5):
+        self._step = step
+        self._percentiles = np.asarray(percentiles, np.float64) / 100.0
+        self._clip_level = clip_level
+        self._dark_level = dark_level
+        self._levels = np.arange(256, dtype=np.float64)
+
+    @property
+    def step(self) -> int:
+        return self._step
+
+    def compute(self, frame: np.ndarray, roi: Optional[Roi] = None) -> RoiStatistics:
+        view = luma_view(frame, roi, self._step)
+        pixel_count = view.size
+        if pixel_count == 0:
+            raise ValueError("ROI {} does not overlap the frame {}".format(roi, frame.shape))
+        # bincount needs a flat array; this gathers only the subsampled pixels (1 / step^2 of the ROI)
+        histogram = np.bincount(view.reshape(-1), minlength=256)
+        cumulative = np.cumsum(histogram)
+        percentiles = np.searchsorted(cumulative, self._percentiles * pixel_count).astype(np.float64)
+        return RoiStatistics(
+            mean=float(histogram @ self._levels) / pixel_count,
+            percentiles=percentiles,
+            clipped_fraction=float(cumulative[-1] - cumulative[self._clip_level - 1]) / pixel_count,
+            dark_fraction=float(cumulative[self._dark_level]) / pixel_count,
+            histogram=histogram,
+            pixel_count=pixel_count,
+        )
+
+    def grid_means(self, frame: np.ndarray, roi: Optional[Roi] = None, grid: int = 3) -> np.ndarray:
+        """ Mean luma of a grid x grid split of the ROI, used to find where the ROI is brighter or darker """
+        view = luma_view(frame, roi, self._step)
+        rows = view.shape[0] - view.shape[0] % grid
+        cols = view.shape[1] - view.shape[1] % grid
+        cells = view[:rows, :cols].reshape(grid, rows // grid, grid, cols // grid)
+        return cells.mean(axis=(1, 3))
+
+
+class RoiExposureController(object):
+    """Software closed loop that drives the brightness of a ROI to `target`.
+
+    mode "exposure": adjusts the manual exposure (cv2.CAP_PROP_EXPOSURE) in log steps.
+    mode "roi": keeps firmware ROI AE enabled and moves its metering point towards the darker / brighter part of the
+    ROI, and narrows the metering window while the error is large.
+    Commands are issued at most every `settle_frames` frames so the sensor can react before the next correction.
+    """
+
+    def __init__(
+        self,
+        camera,
+        roi: Roi,
+        target: float = 118.0,
+        mode: str = "exposure",
+        gain: float = 0.6,
+        deadband: float = 8.0,
+        settle_frames: int = 3,
+        exposure_range: Tuple[float, float] = (1.0, 5000.0),
+        win_size_range: Tuple[int, int] = (1, 8),
+        calculator: Optional[RoiStatisticsCalculator] = None,
+    ):
+        if mode not in ["exposure", "roi"]:
+            raise ValueError("No such controller mode {}. Choose [exposure, roi]".format(mode))
+        self._camera = camera
+        self._roi = roi
+        self._target = target
+        self._mode = mode
+        self._gain = gain
+        self._deadband = deadband
+        self._settle_frames = settle_frames
+        self._exposure_range = exposure_range
+        self._win_size_range = win_size_range
+        self._calculator = calculator if calculator is not None else RoiStatisticsCalculator()
+        self._frames_since_command = settle_frames
+        self._exposure: Optional[float] = None
+        self.last_statistics: Optional[RoiStatistics] = None
+
+    @property
+    def roi(self) -> Roi:
+        return self._roi
+
+    @roi.setter
+    def roi(self, roi: Roi):
+        self._roi = roi
+
+    def _step_exposure(self, error: float):
+        if self._exposure is None:
+            self._exposure = self._camera.exposure
+            self._camera.set_manual_exposure(self._exposure)
+        low, high = self._exposure_range
+        self._exposure = min(max(self._exposure * 2.0 ** (self._gain * error), low), high)
+        self._camera.set_manual_exposure(self._exposure)
+
+    def _step_roi(self, frame: np.ndarray, error: float):
+        x, y, width, height = self._roi
+        grid_means = self._calculator.grid_means(frame, self._roi)
+        # Metering a brighter cell makes the firmware expose less, and vice versa
+        cell = np.argmax(grid_means) if error < 0 else np.argmin(grid_means)
+        row, col = divmod(int(cell), grid_means.shape[1])
+        weight = min(abs(error) * self._gain, 1.0)
+        center_x = x + width / 2.0 + weight * (col + 0.5 - grid_means.shape[1] / 2.0) * width / grid_means.shape[1]
+        center_y = y + height / 2.0 + weight * (row + 0.5 - grid_means.shape[0] / 2.0) * height / grid_means.shape[0]
+        low, high = self._win_size_range
+        win_size = int(round(high - (high - low) * min(abs(error), 1.0)))
+        self._camera.set_roi_properties(int(center_x), int(center_y), win_size=win_size)
+
+    def update(self, frame: np.ndarray) -> RoiStatistics:
+        statistics = self._calculator.compute(frame, self._roi)
+        self.last_statistics = statistics
+        self._frames_since_command += 1
+        if abs(statistics.mean - self._target) <= self._deadband or self._frames_since_command < self._settle_frames:
+            return statistics
+
+        error = math.log2(self._target / max(statistics.mean, 1.0))
+        if self._mode == "exposure":
+            self._step_exposure(error)
+        else:
+            self._step_roi(frame, error)
+        self._frames_since_command = 0
+        return statistics
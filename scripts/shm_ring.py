@@ -0,0 +1,224 @@
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from scripts.frame_ring import FRAME_RECORD_DTYPE
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python 3.7
+    resource_tracker = shared_memory = None
+
+_MAGIC = 0x53334346
+_HEADER_DTYPE = np.dtype(
+    [
+        ("magic", np.uint32),
+        ("num_slots", np.uint32),
+        ("height", np.uint32),
+        ("width", np.uint32),
+        ("channels", np.uint32),
+        ("pad", np.uint32),
+        ("latest_sequence", np.int64),
+    ]
+)
+# A slot is being rewritten while its sequence is negative (seqlock); readers compare it before and after using the data
+_SLOT_DTYPE = FRAME_RECORD_DTYPE
+_ALIGNMENT = 64
+
+
+def _layout(num_slots: int, shape: Tuple[int, ...]):
+    slots_offset = _HEADER_DTYPE.itemsize
+    data_offset = -(-(slots_offset + num_slots * _SLOT_DTYPE.itemsize) // _ALIGNMENT) * _ALIGNMENT
+    frame_size = -(-int(np.prod(shape)) // _ALIGNMENT) * _ALIGNMENT
+    return slots_offset, data_offset, frame_size
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError("shared memory frame publishing needs Python 3.8 or later")
+
+
+class _SharedRing(object):
+    def __init__(self, memory, num_slots: int, shape: Tuple[int, ...]):
+        self._memory = memory
+        self._num_slots = num_slots
+        self._shape = shape
+        slots_offset, data_offset, frame_size = _layout(num_slots, shape)
+        self._header = np.ndarray((), _HEADER_DTYPE, memory.buf, 0)
+        self._slots = np.ndarray((num_slots,), _SLOT_DTYPE, memory.buf, slots_offset)
+        frame_bytes = int(np.prod(shape))
+        self._buffers = [np.ndarray(shape, np.uint8, memory.buf, data_offset + slot * frame_size) for slot in range(num_slots)]
+        assert all(buffer.nbytes == frame_bytes for buffer in self._buffers)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def num_slots(self) -> int:
+        return self._num_slots
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def latest_sequence(self) -> int:
+        return int(self._header["latest_sequence"])
+
+    def _release_views(self):
+        # memoryview exports must be gone before the segment can be closed
+        self._header = self._slots = None
+        self._buffers = []
+
+
+class SharedFramePublisher(_SharedRing):
+    """Single writer of a ring of frames in a named `multiprocessing.shared_memory` segment.
+
+    Layout: a header (magic, slot count, shape, latest sequence), one FRAME_RECORD_DTYPE record per slot and 64-byte
+    aligned frame buffers. A stale segment with the same name, left behind by a crashed publisher, is replaced.
+    """
+
+    def __init__(self, name: str, shape: Tuple[int, ...], num_slots: int = 8):
+        _require_shared_memory()
+        if num_slots < 2:
+            raise ValueError("SharedFramePublisher needs at least 2 slots, got {}".format(num_slots))
+        shape = tuple(shape)
+        slots_offset, data_offset, frame_size = _layout(num_slots, shape)
+        size = data_offset + num_slots * frame_size
+        try:
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        super().__init__(memory, num_slots, shape)
+        self._header["num_slots"] = num_slots
+        self._header["height"], self._header["width"] = shape[:2]
+        self._header["channels"] = shape[2] if len(shape) > 2 else 1
+        self._header["latest_sequence"] = 0
+        self._slots["sequence"] = 0
+        self._header["magic"] = _MAGIC
+        self._sequence = 0
+
+    def begin_write(self) -> np.ndarray:
+        """ Buffer of the next slot, marked as being written """
+        self._sequence += 1
+        slot = self._sequence % self._num_slots
+        self._slots["sequence"][slot] = -self._sequence
+        return self._buffers[slot]
+
+    def commit_write(self, monotonic_ns: int, driver_msec: float):
+        slot = self._sequence % self._num_slots
+        self._slots["monotonic_ns"][slot] = monotonic_ns
+        self._slots["driver_msec"][slot] = driver_msec
+        self._slots["sequence"][slot] = self._sequence
+        self._header["latest_sequence"] = self._sequence
+
+    def publish(self, data: np.ndarray, monotonic_ns: int, driver_msec: float = float("nan")) -> int:
+        np.copyto(self.begin_write(), data)
+        self.commit_write(monotonic_ns, driver_msec)
+        return self._sequence
+
+    def close(self):
+        """ Close and unlink the segment; attached subscribers keep their mapping until they close """
+        if self._memory is None:
+            return
+        self._release_views()
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+
+class SharedFrame(object):
+    """ Zero-copy view of a published frame. `data` may be overwritten once the publisher laps it, see `is_valid` """
+
+    __slots__ = ("sequence", "monotonic_ns", "driver_msec", "data", "_slot_sequences", "_slot")
+
+    def __init__(self, sequence: int, monotonic_ns: int, driver_msec: float, data: np.ndarray, slot_sequences: np.ndarray, slot: int):
+        self.sequence = sequence
+        self.monotonic_ns = monotonic_ns
+        self.driver_msec = driver_msec
+        self.data = data
+        self._slot_sequences = slot_sequences
+        self._slot = slot
+
+    @property
+    def timestamp(self) -> float:
+        return self.monotonic_ns / 1e9
+
+    def is_valid(self) -> bool:
+        """ True while the publisher has not started to overwrite this slot """
+        return int(self._slot_sequences[self._slot]) == self.sequence
+
+
+class SharedFrameSubscriber(_SharedRing):
+    """Attaches to a SharedFramePublisher segment by name, from any process.
+
+    `lapped_frames` counts frames the publisher overwrote before this subscriber got to them.
+    """
+
+    def __init__(self, name: str):
+        _require_shared_memory()
+        memory = shared_memory.SharedMemory(name)
+        # Attaching registers the segment with this process' resource tracker, which would unlink it at exit
+        # (bpo-39959); the publisher owns it.
+        resource_tracker.unregister(memory._name, "shared_memory")
+        header = np.ndarray((), _HEADER_DTYPE, memory.buf, 0)
+        if int(header["magic"]) != _MAGIC:
+            del header
+            memory.close()
+            raise RuntimeError("{} is not a see3cam frame ring".format(name))
+        channels = int(header["channels"])
+        shape = (int(header["height"]), int(header["width"])) + ((channels,) if channels > 1 else ())
+        num_slots = int(header["num_slots"])
+        del header
+        super().__init__(memory, num_slots, shape)
+        self.lapped_frames = 0
+
+    def get(self, sequence: int) -> Optional[SharedFrame]:
+        if sequence <= 0:
+            return None
+        slot = sequence % self._num_slots
+        if int(self._slots["sequence"][slot]) != sequence:
+            return None
+        monotonic_ns, driver_msec = int(self._slots["monotonic_ns"][slot]), float(self._slots["driver_msec"][slot])
+        frame = SharedFrame(sequence, monotonic_ns, driver_msec, self._buffers[slot], self._slots["sequence"], slot)
+        # Re-check: the publisher may have started this slot while the record was read
+        return frame if frame.is_valid() else None
+
+    def latest(self) -> Optional[SharedFrame]:
+        return self.get(self.latest_sequence)
+
+    def wait_next(self, after_sequence: int, timeout: Optional[float] = None, poll_interval: float = 0.0005) -> Optional[SharedFrame]:
+        """Next frame after `after_sequence`, polling until one is published or `timeout` seconds passed.
+
+        When the publisher has lapped the subscriber the oldest frame still in the ring is returned and the skipped
+        frames are added to `lapped_frames`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sequence = after_sequence
+        while True:
+            latest = self.latest_sequence
+            if latest > sequence:
+                # The slot after `latest` may already be in the middle of a rewrite
+                sequence = max(sequence + 1, latest - self._num_slots + 2)
+                frame = self.get(sequence)
+                if frame is not None:
+                    if after_sequence > 0:
+                        self.lapped_frames += sequence - after_sequence - 1
+                    return frame
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        """ Detach; every SharedFrame handed out must be dropped first """
+        if self._memory is None:
+            return
+        self._release_views()
+        self._memory.close()
+        self._memory = None
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+CURRENT_DIR = str(Path(".").resolve())
+CONFIG_FILE_PATH = str(Path(f"{CURRENT_DIR}/cfg/camera_parameter.toml").resolve())
+
+sys.path.append(CURRENT_DIR)
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+
+
+@pytest.fixture(scope="session")
+def fixture_map_cache_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("see3cam_cache"))
+
+
+@pytest.fixture
+def fixture_emulated_camera(fixture_map_cache_dir):
+    camera, hid_emulator = emulated_camera(get_config(CONFIG_FILE_PATH), latency_ms=0.5, map_cache_dir=fixture_map_cache_dir)
+    yield camera, hid_emulator
+    camera.release()
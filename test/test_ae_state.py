@@ -0,0 +1,54 @@
+import time
+
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+from scripts.see3cam_api import AutoExpCentered, AutoExpManual, roi_to_hid_coordinates
+from conftest import CONFIG_FILE_PATH
+
+
+def test_reads_come_from_acknowledged_commands(fixture_emulated_camera):
+    camera, hid_emulator = fixture_emulated_camera
+    camera.set_roi_properties(400, 300, win_size=6, blocking=True)
+    request_count = hid_emulator.request_count
+    for _ in range(20):
+        assert camera.auto_exposure_setting == (AutoExpManual, 6)
+        str(camera)
+    assert hid_emulator.request_count == request_count
+    assert (camera.auto_exposure_state.xcord, camera.auto_exposure_state.ycord) == roi_to_hid_coordinates(400, 300, 1920, 1080)
+
+    assert camera.read_auto_exposure_state() == camera.auto_exposure_state
+    assert hid_emulator.request_count == request_count + 1
+    assert camera.ae_state_drift_count == 0
+
+
+def test_drift_is_counted_and_adopted(fixture_emulated_camera):
+    camera, hid_emulator = fixture_emulated_camera
+    camera.set_roi_properties(400, 300, blocking=True)
+    # Someone else (e.g. another process on the same hidraw node) changes the mode
+    with hid_emulator._lock:
+        hid_emulator.roi_mode, hid_emulator.win_size = AutoExpCentered, 8
+
+    assert camera.read_auto_exposure_state().mode == AutoExpCentered
+    assert camera.ae_state_drift_count == 1
+    assert camera.auto_exposure_setting == (AutoExpCentered, 8)
+    assert camera.stats()["counters"]["ae_state_drift"] == 1
+    # The RoI acknowledged before the drift is sent again instead of being deduplicated
+    assert camera.set_roi_properties(400, 300)
+    camera._hid_scheduler.flush(timeout=1.0)
+    assert hid_emulator.roi_mode == AutoExpManual
+
+
+def test_background_verification(fixture_map_cache_dir):
+    camera, hid_emulator = emulated_camera(
+        get_config(CONFIG_FILE_PATH), latency_ms=0.5, map_cache_dir=fixture_map_cache_dir, ae_verify_interval=0.01
+    )
+    try:
+        with hid_emulator._lock:
+            hid_emulator.win_size = 2
+        deadline = time.monotonic() + 2.0
+        while camera.ae_state_drift_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert camera.ae_state_drift_count == 1
+        assert camera.auto_exposure_setting[1] == 2
+    finally:
+        camera.release()
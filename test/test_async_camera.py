@@ -0,0 +1,116 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from scripts.async_camera import AsyncCamera
+from scripts.camera_config import get_config
+from scripts.emulator import EmulatedSee3CamHid, SyntheticVideoCapture
+from scripts.see3cam_api import AutoExpCentered, AutoExpManual, roi_to_hid_coordinates
+from conftest import CONFIG_FILE_PATH
+
+
+def test_async_iteration_without_copies(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+
+    async def consume():
+        async_camera = AsyncCamera(camera)
+        frames = []
+        async for frame in async_camera:
+            assert np.shares_memory(frame.data, camera.get_frame(frame.sequence).data)
+            frames.append(frame.sequence)
+            if len(frames) == 5:
+                break
+        await async_camera.aclose()
+        return frames
+
+    sequences = asyncio.run(asyncio.wait_for(consume(), 5.0))
+    assert sequences == sorted(sequences) and len(set(sequences)) == 5
+
+
+def test_aclose_leaves_a_borrowed_camera_as_it_was_found(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+
+    async def open_and_close():
+        async_camera = AsyncCamera(camera)
+        await async_camera.subscribe().get()
+        await async_camera.aclose()
+
+    assert not camera.is_capturing
+    asyncio.run(asyncio.wait_for(open_and_close(), 5.0))
+    assert not camera.is_capturing
+
+    camera.start_capture()
+    asyncio.run(asyncio.wait_for(open_and_close(), 5.0))
+    assert camera.is_capturing
+
+
+def test_slow_subscriber_drops_its_oldest_frames(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+
+    async def consume():
+        async_camera = AsyncCamera(camera)
+        fast, slow = async_camera.subscribe(maxsize=2), async_camera.subscribe(maxsize=2)
+        received = [(await fast.get()).sequence for _ in range(6)]
+        assert slow.pending == 2 and slow.dropped >= 3
+        newest = (await slow.get()).sequence
+        await async_camera.aclose()
+        assert await fast.get() is None
+        return received, newest
+
+    received, newest = asyncio.run(asyncio.wait_for(consume(), 5.0))
+    assert received == list(range(received[0], received[0] + 6))
+    assert newest >= received[-1] - 1
+
+
+def test_awaitable_hid_commands_do_not_block_the_loop(fixture_map_cache_dir):
+    cfg = get_config(CONFIG_FILE_PATH)
+    hid_emulator = EmulatedSee3CamHid(latency_ms=0.5)
+
+    async def control():
+        async_camera = await AsyncCamera.open(
+            cfg, capture=SyntheticVideoCapture(cfg.width, cfg.height, cfg.fps), hid_handle=hid_emulator.hid_handle, map_cache_dir=fixture_map_cache_dir
+        )
+        hid_emulator.latency_ms = 50.0
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0.005)
+
+        ticking = asyncio.ensure_future(ticker())
+        assert await async_camera.set_roi_properties(400, 300, win_size=6)
+        assert (hid_emulator.roi_mode, hid_emulator.xcord, hid_emulator.ycord) == (AutoExpManual,) + roi_to_hid_coordinates(400, 300, 1920, 1080)
+        assert await async_camera.set_auto_exposure_mode("centered")
+        ticking.cancel()
+        await async_camera.aclose()
+        return ticks
+
+    # Two 50 ms round trips; the loop keeps running meanwhile
+    assert len(asyncio.run(asyncio.wait_for(control(), 5.0))) >= 10
+    assert hid_emulator.roi_mode == AutoExpCentered
+
+
+def test_construction_outside_of_a_running_loop_is_rejected(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    with pytest.raises(RuntimeError):
+        AsyncCamera(camera)
+    assert not camera.is_capturing
+
+
+def test_backpressure_ring_is_rejected(fixture_map_cache_dir):
+    cfg = get_config(CONFIG_FILE_PATH)
+    hid_emulator = EmulatedSee3CamHid(latency_ms=0.0)
+
+    async def open_camera():
+        return await AsyncCamera.open(
+            cfg,
+            capture=SyntheticVideoCapture(cfg.width, cfg.height, cfg.fps),
+            hid_handle=hid_emulator.hid_handle,
+            map_cache_dir=fixture_map_cache_dir,
+            drop_policy="backpressure",
+        )
+
+    with pytest.raises(ValueError, match="keep_newest"):
+        asyncio.run(open_camera())
@@ -40,16 +40,17 @@ def test_auto_exposure_mode_setting(fixture_camera):
             camera._cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, CVAutoExposure.MANUAL)
             for _mode in ["centered", "disabled"]:
                 camera.set_auto_exposure_mode(_mode)
-                aquired_auto_exposure_mode, _ = camera.auto_exposure_setting
+                aquired_auto_exposure_mode = camera.read_auto_exposure_state().mode
                 assert inner_expected_mode == [mode.name for mode in AutoExposureMode if aquired_auto_exposure_mode == mode.value][0]
 
             camera._cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, CVAutoExposure.AUTO)
             camera.set_auto_exposure_mode("disabled")
-            aquired_auto_exposure_mode, _ = camera.auto_exposure_setting
+            aquired_auto_exposure_mode = camera.read_auto_exposure_state().mode
             assert inner_expected_mode == "Disable"
         else:
             camera._cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, CVAutoExposure.AUTO)
             camera.set_auto_exposure_mode(ae_mode)
-            aquired_auto_exposure_mode, aquired_ae_window_size = camera.auto_exposure_setting
+            device_state = camera.read_auto_exposure_state()
+            aquired_auto_exposure_mode, aquired_ae_window_size = device_state.mode, device_state.win_size
             assert inner_expected_mode == [mode.name for mode in AutoExposureMode if aquired_auto_exposure_mode == mode.value][0]
             assert ae_window_size == aquired_ae_window_size
\ No newline at end of file
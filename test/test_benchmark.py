@@ -0,0 +1,113 @@
+"""Performance benchmarks against the hardware-free emulator (scripts.emulator).
+
+Run with `python -m pytest test/test_benchmark.py`; FPS and latency percentiles are reported in the extra info
+columns (`--benchmark-json` keeps them).
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+from scripts.exposure_fusion import ExposureFusion
+from scripts.preview import PreviewWindow
+from scripts.see3cam_api import get_auto_exposure_property
+from conftest import CONFIG_FILE_PATH
+
+
+def run_benchmark(benchmark, func, rounds=100):
+    result = benchmark.pedantic(func, rounds=rounds, iterations=1, warmup_rounds=5)
+    if benchmark.disabled:
+        return result
+    elapsed_ms = np.array(benchmark.stats.stats.data) * 1000.0
+    benchmark.extra_info["fps"] = round(1000.0 / elapsed_ms.mean(), 1)
+    for percentile in (50, 90, 99):
+        benchmark.extra_info["p{}_ms".format(percentile)] = round(float(np.percentile(elapsed_ms, percentile)), 3)
+    return result
+
+
+@pytest.fixture
+def fixture_benchmark_camera(fixture_map_cache_dir):
+    # Unpaced source and zero HID latency, so the numbers are the pipeline's own cost
+    camera, hid_emulator = emulated_camera(get_config(CONFIG_FILE_PATH), latency_ms=0.0, realtime=False, map_cache_dir=fixture_map_cache_dir)
+    camera.update()
+    yield camera, hid_emulator
+    camera.release()
+
+
+def test_benchmark_camera_update(benchmark, fixture_benchmark_camera):
+    camera, _ = fixture_benchmark_camera
+    assert run_benchmark(benchmark, camera.update)
+
+
+def test_benchmark_remap_image(benchmark, fixture_benchmark_camera):
+    # remap_image copies the shared per-frame product, so the undistortion itself is measured through remap_into
+    camera, _ = fixture_benchmark_camera
+    dst = np.empty_like(camera.image)
+    assert run_benchmark(benchmark, lambda: camera.remap_into(dst)).shape == camera.image.shape
+
+
+def test_benchmark_shared_products(benchmark, fixture_benchmark_camera):
+    """ One new frame read by three consumers (detector, recorder, preview), each wanting the undistorted image """
+    camera, _ = fixture_benchmark_camera
+
+    def consumers_step():
+        camera.update()
+        for _ in range(3):
+            remapped = camera.remapped()
+        camera.downscaled(640, 360, undistort=True)
+        return remapped
+
+    assert run_benchmark(benchmark, consumers_step).shape == camera.image.shape
+    hits, misses = camera.product_cache.hits.value, camera.product_cache.misses.value
+    benchmark.extra_info["product_hit_rate"] = round(hits / (hits + misses), 3)
+
+
+@pytest.mark.parametrize("num_frames", [2, 3])
+def test_benchmark_exposure_fusion(benchmark, fixture_benchmark_camera, num_frames):
+    """ Fusion of a synthetic bracket (one emulator frame at several gains); input_fps is the sustainable capture rate """
+    camera, _ = fixture_benchmark_camera
+    gains = np.linspace(0.5, 2.0, num_frames)
+    bracket = [np.clip(camera.image * gain, 0, 255).astype(np.uint8) for gain in gains]
+    fusion = ExposureFusion(camera.image_width, camera.image_height, num_frames)
+    assert run_benchmark(benchmark, lambda: fusion.fuse(bracket), rounds=20).shape == camera.image.shape
+    if not benchmark.disabled:
+        benchmark.extra_info["input_fps"] = round(benchmark.extra_info["fps"] * num_frames, 1)
+
+
+def test_benchmark_remap_luma(benchmark, fixture_map_cache_dir):
+    camera, _ = emulated_camera(get_config(CONFIG_FILE_PATH), realtime=False, raw_yuyv=True, map_cache_dir=fixture_map_cache_dir)
+    camera.update()
+    dst = np.empty((camera.image_height, camera.image_width), np.uint8)
+    assert run_benchmark(benchmark, lambda: camera.remap_luma(dst)).shape == (camera.image_height, camera.image_width)
+    camera.release()
+
+
+@pytest.mark.parametrize("undistort", [False, True])
+def test_benchmark_demo_render_step(benchmark, fixture_benchmark_camera, undistort):
+    camera, _ = fixture_benchmark_camera
+    preview = PreviewWindow(camera, scale=0.65, undistort=undistort)
+    preview.set_rectangle("roi", (camera.image_width // 4, camera.image_height // 4, camera.image_width // 2, camera.image_height // 2))
+
+    def render_step():
+        camera.update()
+        assert preview.render()
+        return preview.canvas
+
+    assert run_benchmark(benchmark, render_step) is preview.canvas
+
+
+def test_benchmark_hid_round_trip(benchmark, fixture_benchmark_camera):
+    _, hid_emulator = fixture_benchmark_camera
+    status, _, _ = run_benchmark(benchmark, lambda: get_auto_exposure_property(hid_emulator.hid_handle), rounds=300)
+    assert status
+
+
+def test_benchmark_time_to_first_frame(benchmark, fixture_map_cache_dir):
+    # Warm imports; bench/bench_startup.py measures cold starts in fresh interpreters
+    def first_frame():
+        camera, _ = emulated_camera(get_config(CONFIG_FILE_PATH), latency_ms=0.0, map_cache_dir=fixture_map_cache_dir)
+        assert camera.update()
+        camera.release()
+
+    run_benchmark(benchmark, first_frame, rounds=10)
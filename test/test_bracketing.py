@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+from scripts.bracketing import RoiBracketSweep, dark_and_bright_roi_points
+from scripts.frame_ring import RingFrame
+from scripts.see3cam_api import AutoExpManual, roi_to_hid_coordinates
+
+
+def test_dark_and_bright_roi_points():
+    gray = np.full((240, 320), 128, np.uint8)
+    gray[0:30, 280:320] = 10
+    gray[210:240, 0:40] = 250
+    assert dark_and_bright_roi_points(gray) == [(300, 15), (20, 225)]
+
+
+def test_sweep_tags_frames_with_the_active_roi(fixture_emulated_camera):
+    camera, hid_emulator = fixture_emulated_camera
+    camera.start_capture()
+    points = [(300, 200), (1600, 900)]
+    targets = [("roi",) + roi_to_hid_coordinates(x, y, camera.image_width, camera.image_height) + (4,) for x, y in points]
+    with RoiBracketSweep(camera, points, min_settle_frames=2) as sweep:
+        first = sweep.next_bracket(timeout=5.0)
+        second = sweep.next_bracket(timeout=5.0)
+    assert first is not None and second is not None
+    for bracket in [first, second]:
+        assert bracket.roi_states == targets
+        assert bracket.sequences == sorted(bracket.sequences)
+        assert [sweep.roi_state(sequence) for sequence in bracket.sequences] == targets
+    assert first.sequences[-1] < second.sequences[0]
+    # Copies out of the ring, in separate buffers per bracket
+    frame = camera.get_frame(second.sequences[-1])
+    if frame is not None:
+        np.testing.assert_array_equal(second.images[-1], frame.data)
+        assert not np.shares_memory(second.images[-1], frame.data)
+    assert not np.shares_memory(first.images[0], second.images[0])
+    assert hid_emulator.roi_mode == AutoExpManual
+
+
+class FakeAutoExposureCamera:
+    """ Acknowledges every RoI command at once and hands the frame listener to the test """
+
+    image_width, image_height, raw_yuyv = 64, 48, False
+
+    def __init__(self):
+        self.acknowledged_auto_exposure_state = None
+        self.listener = None
+        self.requests = []
+
+    def set_roi_properties(self, xcord, ycord, win_size=4):
+        self.requests.append((xcord, ycord))
+        self.acknowledged_auto_exposure_state = ("roi",) + roi_to_hid_coordinates(xcord, ycord, 64, 48) + (win_size,)
+
+    def add_frame_listener(self, listener):
+        self.listener = listener
+
+    def remove_frame_listener(self, listener):
+        self.listener = None
+
+
+def feed(camera, sweep, lumas):
+    # The listener is kept, so frames still reach the sweep after stop()
+    listener = sweep._on_frame
+    for luma in lumas:
+        feed.sequence += 1
+        listener(RingFrame(feed.sequence, 0, math.nan, np.full((48, 64, 3), luma, np.uint8)))
+
+
+feed.sequence = 0
+
+
+def test_frames_are_kept_once_the_exposure_settled():
+    camera = FakeAutoExposureCamera()
+    sweep = RoiBracketSweep(camera, [(10, 10), (50, 40)], min_settle_frames=3, settle_tolerance=1.5)
+    sweep.start()
+    # The AE is still moving after the acknowledgement, the frame after it stopped is kept
+    feed(camera, sweep, [50, 80, 110, 120, 121, 121, 100, 90, 89])
+    bracket = sweep.next_bracket(timeout=0)
+    assert [int(image.mean()) for image in bracket.images] == [121, 89]
+    assert bracket.sequences == [feed.sequence - 4, feed.sequence]
+    assert sweep.unsettled == 0
+
+    # A scene that never settles is kept after max_settle_frames
+    sweep.stop()
+    sweep = RoiBracketSweep(camera, [(10, 10), (50, 40)], min_settle_frames=2, max_settle_frames=4)
+    sweep.start()
+    feed(camera, sweep, [10, 200, 10, 200])
+    assert sweep.unsettled == 1
+
+    sweep.stop()
+    requests = len(camera.requests)
+    feed(camera, sweep, [200, 200, 200, 200])
+    assert len(camera.requests) == requests and sweep.next_bracket(timeout=0) is None
+
+
+def test_settling_starts_over_at_every_point():
+    camera = FakeAutoExposureCamera()
+    sweep = RoiBracketSweep(camera, [(10, 10), (50, 40)], min_settle_frames=1)
+    sweep.start()
+    # The luma kept for the previous point does not count as converged for the next one
+    feed(camera, sweep, [100, 100, 100, 100])
+    bracket = sweep.next_bracket(timeout=0)
+    assert bracket.sequences == [feed.sequence - 2, feed.sequence]
+    sweep.stop()
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from scripts.camera_config import get_config
+from scripts.camera_group import CameraGroup
+from scripts.emulator import EmulatedSee3CamHid, SyntheticVideoCapture
+from conftest import CONFIG_FILE_PATH
+
+PERIOD_MS = 1000.0 / 30
+
+
+def emulated_group(offsets_ms, map_cache_dir, drop_every=(0, 0), tolerance_ms=5.0):
+    """ Two emulated cameras whose driver timestamps are `offsets_ms` apart on a shared monotonic base """
+    cfg = get_config(CONFIG_FILE_PATH)
+    start_msec = time.monotonic() * 1000.0
+    overrides = [
+        {
+            "capture": SyntheticVideoCapture(cfg.width, cfg.height, cfg.fps, drop_every=drop, start_msec=start_msec + offset),
+            "hid_handle": EmulatedSee3CamHid(latency_ms=0.0).hid_handle,
+        }
+        for offset, drop in zip(offsets_ms, drop_every)
+    ]
+    group = CameraGroup([cfg, cfg], tolerance_ms=tolerance_ms, camera_overrides=overrides, map_cache_dir=map_cache_dir, ring_size=8)
+    return group, start_msec
+
+
+def test_frame_sets_are_matched_by_capture_time(fixture_map_cache_dir):
+    group, _ = emulated_group([0.0, 3.0], fixture_map_cache_dir)
+    try:
+        frame_sets = [group.next_frame_set(timeout=2.0) for _ in range(4)]
+    finally:
+        group.release()
+    assert all(frame_set is not None for frame_set in frame_sets)
+    for frame_set in frame_sets:
+        first, second = frame_set.frames
+        assert frame_set.skew == pytest.approx(0.003, abs=1e-6)
+        assert second.driver_msec - first.driver_msec == pytest.approx(3.0, abs=1e-6)
+    first_sequences = [frame_set.frames[0].sequence for frame_set in frame_sets]
+    assert first_sequences == sorted(set(first_sequences))
+
+
+def test_skew_above_tolerance_gives_no_frame_set(fixture_map_cache_dir):
+    group, _ = emulated_group([0.0, PERIOD_MS / 2], fixture_map_cache_dir)
+    try:
+        assert group.next_frame_set(timeout=0.5) is None
+    finally:
+        group.release()
+
+
+def test_frames_without_a_partner_are_dropped(fixture_map_cache_dir):
+    # The second camera loses every third sensor frame, the first camera's frames of those instants have no partner
+    group, start_msec = emulated_group([0.0, 1.0], fixture_map_cache_dir, drop_every=(0, 3))
+    try:
+        frame_sets = [group.next_frame_set(timeout=2.0) for _ in range(6)]
+    finally:
+        group.release()
+    assert all(frame_set is not None and frame_set.skew <= 0.005 for frame_set in frame_sets)
+    sensor_indices = [round((frame_set.frames[0].driver_msec - start_msec) / PERIOD_MS) for frame_set in frame_sets]
+    assert all(index % 3 != 0 for index in sensor_indices)
+    first_sequences = [frame_set.frames[0].sequence for frame_set in frame_sets]
+    assert max(first_sequences) - min(first_sequences) > len(first_sequences) - 1
+
+
+def test_shared_devices_are_rejected():
+    cfg = get_config(CONFIG_FILE_PATH)
+    with pytest.raises(ValueError):
+        CameraGroup([cfg, cfg], hid_handle=3)
@@ -0,0 +1,72 @@
+import pytest
+
+from scripts.camera import AutoExposureMode
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+from scripts.see3cam_api import AutoExpManual, roi_to_hid_coordinates
+from conftest import CONFIG_FILE_PATH
+
+
+def test_camera_is_activated(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    assert "Auto Exposure Mode" in str(camera)
+    assert camera.update()
+    assert camera.image.shape == (camera.image_height, camera.image_width, 3)
+    assert camera.remap_image.shape == camera.image.shape
+
+
+@pytest.mark.parametrize("ae_mode, expected_mode, expected_window_size", [("centered", "Centered", 8), ("roi", "Manual", 4), ("disabled", "Disable", 0)])
+def test_auto_exposure_mode_setting(fixture_emulated_camera, ae_mode, expected_mode, expected_window_size):
+    camera, _ = fixture_emulated_camera
+    camera.set_auto_exposure_mode(ae_mode)
+    aquired_auto_exposure_mode, aquired_ae_window_size = camera.auto_exposure_setting
+    assert expected_mode == [mode.name for mode in AutoExposureMode if aquired_auto_exposure_mode == mode.value][0]
+    assert expected_window_size == aquired_ae_window_size
+
+
+def test_roi_updates_are_deduplicated(fixture_emulated_camera):
+    camera, hid_emulator = fixture_emulated_camera
+    camera.set_auto_exposure_mode("roi")
+    request_count = hid_emulator.request_count
+    for _ in range(10):
+        camera.set_roi_properties(400, 300)
+    camera._hid_scheduler.flush(timeout=1.0)
+
+    assert hid_emulator.request_count == request_count + 1
+    assert (hid_emulator.roi_mode, hid_emulator.xcord, hid_emulator.ycord) == (AutoExpManual,) + roi_to_hid_coordinates(400, 300, 1920, 1080)
+
+
+def test_frame_records_and_drop_detection(fixture_map_cache_dir):
+    drops = []
+    camera, _ = emulated_camera(
+        get_config(CONFIG_FILE_PATH),
+        realtime=False,
+        drop_every=5,
+        map_cache_dir=fixture_map_cache_dir,
+        on_frame_drop=lambda dropped, frame: drops.append((dropped, frame.sequence)),
+    )
+    records = []
+    for _ in range(12):
+        assert camera.update()
+        records.append(camera.image_record)
+    camera.release()
+
+    assert [record.sequence for record in records] == list(range(1, 13))
+    assert all(before.monotonic_ns <= after.monotonic_ns for before, after in zip(records, records[1:]))
+    assert records[0].driver_msec == pytest.approx(1000.0 / 30)
+    assert drops == [(1, 5), (1, 9)]
+    assert camera.stats()["counters"]["frames_dropped"] == 2
+
+
+def test_roi_after_a_queued_mode_change_is_sent(fixture_map_cache_dir):
+    camera, hid_emulator = emulated_camera(get_config(CONFIG_FILE_PATH), latency_ms=0.0, hid_rate_hz=5.0, map_cache_dir=fixture_map_cache_dir)
+    try:
+        assert camera.set_roi_properties(400, 300, blocking=True)
+        centered = camera.submit_auto_exposure_mode("centered")
+        # The RoI was acknowledged before, but the queued mode change replaces it first
+        assert camera.set_roi_properties(400, 300)
+        assert centered.result(timeout=2.0)
+        assert camera._hid_scheduler.flush(timeout=2.0)
+        assert (hid_emulator.roi_mode, hid_emulator.xcord, hid_emulator.ycord) == (AutoExpManual,) + roi_to_hid_coordinates(400, 300, 1920, 1080)
+    finally:
+        camera.release()
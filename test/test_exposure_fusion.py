@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+import pytest
+
+from scripts.exposure_fusion import ExposureFusion
+
+
+def synthetic_scene(width=320, height=240):
+    """ Smooth random scene in 0..1 with fine texture, so every frame has contrast """
+    rng = np.random.default_rng(0)
+    scene = cv2.GaussianBlur(rng.uniform(0.0, 1.0, (height, width, 3)).astype(np.float32), (0, 0), 8)
+    scene = (scene - scene.min()) / (scene.max() - scene.min())
+    return np.clip(scene + rng.uniform(-0.03, 0.03, scene.shape).astype(np.float32), 0.0, 1.0)
+
+
+def test_identical_frames_fuse_to_themselves():
+    frame = (synthetic_scene() * 255).astype(np.uint8)
+    fusion = ExposureFusion(320, 240, 3)
+    np.testing.assert_array_equal(fusion.fuse([frame, frame, frame]), frame)
+
+
+def test_fusion_recovers_the_clipped_ranges():
+    scene = synthetic_scene()
+    truth = (scene * 255).astype(np.uint8)
+    bracket = [np.clip(scene * gain * 255, 0, 255).astype(np.uint8) for gain in (0.4, 2.5)]
+    fusion = ExposureFusion(320, 240, 2)
+    dst = np.empty_like(truth)
+    fused = fusion.fuse(bracket, dst=dst)
+    assert fused is dst
+
+    def error(image):
+        return np.abs(image.astype(np.float32) - truth).mean()
+
+    assert error(fused) < 0.6 * min(error(frame) for frame in bracket)
+
+
+def test_frame_count_is_checked():
+    fusion = ExposureFusion(64, 48, 2)
+    with pytest.raises(ValueError):
+        fusion.fuse([np.zeros((48, 64, 3), np.uint8)] * 3)
+    with pytest.raises(ValueError):
+        ExposureFusion(64, 48, 1)
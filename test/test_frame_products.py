@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from scripts.frame_products import FrameProductCache
+
+
+def test_products_are_computed_once_and_recycled():
+    cache = FrameProductCache(max_products=2)
+    calls = []
+
+    def compute(value):
+        def fill(dst):
+            calls.append(value)
+            dst[:] = value
+
+        return fill
+
+    first = cache.get(1, "gray", (4, 4), np.uint8, compute(1))
+    assert cache.get(1, "gray", (4, 4), np.uint8, compute(1)) is first
+    assert (cache.hits.value, cache.misses.value) == (1, 1)
+    assert not first.flags.writeable
+    with pytest.raises(ValueError):
+        first[0, 0] = 0
+
+    cache.get(2, "gray", (4, 4), np.uint8, compute(2))
+    cache.get(3, "gray", (4, 4), np.uint8, compute(3))
+    # Frame 1 was the least recently used product, its buffer now holds frame 4
+    fourth = cache.get(4, "gray", (4, 4), np.uint8, compute(4))
+    assert fourth is first and int(fourth[0, 0]) == 4
+    assert calls == [1, 2, 3, 4] and len(cache) == 2
+
+    # Products of frames the ring replaced are dropped before the LRU limit applies
+    cache.get(5, "other", (2,), np.uint8, compute(5), min_sequence=5)
+    assert len(cache) == 1
+
+
+def test_camera_shares_products_between_readers(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    assert camera.update()
+    remapped = camera.remapped()
+    assert camera.remapped() is remapped and not remapped.flags.writeable
+    assert np.array_equal(remapped, camera.remap_into())
+    # remap_image stays an array of the caller's own
+    owned = camera.remap_image
+    assert owned.flags.writeable and not np.shares_memory(owned, remapped)
+    assert np.array_equal(owned, remapped)
+    assert camera.luma is camera.gray()
+    small = camera.downscaled(480, 270, undistort=True)
+    assert small.shape == (270, 480, 3)
+    assert camera.downscaled(480, 270, undistort=True) is small
+
+    counters = camera.stats()["counters"]
+    assert counters["product_cache_misses"] == 3
+    assert counters["product_cache_hits"] >= 3
+
+    assert camera.update()
+    assert camera.remapped() is not remapped
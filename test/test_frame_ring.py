@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+from threading import Thread
+
+import numpy as np
+
+CURRENT_DIR = str(Path(".").resolve())
+sys.path.append(CURRENT_DIR)
+from scripts.frame_ring import DropPolicy, FrameRing
+
+
+def _write(ring, value):
+    buffer = ring.begin_write(timeout=1.0)
+    assert buffer is not None
+    buffer[:] = value
+    return ring.commit_write()
+
+
+def test_keep_newest_skips_to_oldest_valid_frame():
+    ring = FrameRing(3, (2, 2), drop_policy=DropPolicy.KeepNewest)
+    assert ring.latest() is None
+    for value in range(1, 6):
+        _write(ring, value)
+
+    assert ring.latest().sequence == 5
+    assert ring.latest().data[0, 0] == 5
+    frame = ring.wait_next(0, timeout=0)
+    assert frame.sequence == 4
+    assert frame.data[0, 0] == 4
+    assert ring.wait_next(5, timeout=0) is None
+
+
+def test_backpressure_blocks_writer_until_consumed():
+    ring = FrameRing(3, (2, 2), drop_policy=DropPolicy.Backpressure)
+    _write(ring, 1)
+    _write(ring, 2)
+    assert ring.begin_write(timeout=0.01) is None
+
+    assert ring.wait_next(0, timeout=0).sequence == 1
+    _write(ring, 3)
+    assert ring.begin_write(timeout=0.01) is None
+
+
+def test_wait_next_wakes_on_commit():
+    ring = FrameRing(4, (2, 2))
+    writer = Thread(target=lambda: [_write(ring, value) for value in range(1, 4)])
+    writer.start()
+    received = []
+    while len(received) < 3:
+        frame = ring.wait_next(received[-1] if received else 0, timeout=1.0)
+        assert frame is not None
+        received.append(frame.sequence)
+    writer.join()
+    assert received == [1, 2, 3]
+    assert np.all(ring.latest().data == 3)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from scripts.hid_codec import (
+    AeRoiModeResponse,
+    AutoExpManual,
+    BUFFER_LENGTH,
+    CAMERA_CONTROL_CU20,
+    GET_AE_ROI_MODE_CU20,
+    HidCodec,
+    SET_AE_ROI_MODE_CU20,
+    StatusResponse,
+    encode_roi_batch,
+    roi_to_hid_coordinates_array,
+)
+from scripts.see3cam_api import hid_command, hid_read, hid_write, roi_to_hid_coordinates, send_roi_buffer
+
+
+def test_encode_reuses_preallocated_buffers():
+    codec = HidCodec()
+    buffer = codec.encode("set_ae_roi_mode", AutoExpManual, 10, 20, 4)
+    assert len(buffer) == BUFFER_LENGTH
+    assert list(buffer[:7]) == [0, CAMERA_CONTROL_CU20, SET_AE_ROI_MODE_CU20, AutoExpManual, 10, 20, 4]
+    assert codec.encode("set_ae_roi_mode", AutoExpManual, 30) is buffer
+    assert list(buffer[3:7]) == [AutoExpManual, 30, 0, 0]
+    assert list(codec.encode("get_ae_roi_mode")[:3]) == [0, CAMERA_CONTROL_CU20, GET_AE_ROI_MODE_CU20]
+
+
+def test_decode_typed_responses():
+    codec = HidCodec()
+    assert codec.decode("set_ae_roi_mode", bytes([CAMERA_CONTROL_CU20, SET_AE_ROI_MODE_CU20, 0, 0, 0, 0, 1])) == StatusResponse(True)
+    assert not codec.decode("set_ae_roi_mode", bytes([CAMERA_CONTROL_CU20, SET_AE_ROI_MODE_CU20, 0, 0, 0, 0, 0])).success
+    assert not codec.decode("set_ae_roi_mode", bytes([CAMERA_CONTROL_CU20, GET_AE_ROI_MODE_CU20, 0, 0, 0, 0, 1])).success
+    reply = bytes([CAMERA_CONTROL_CU20, GET_AE_ROI_MODE_CU20, 2, 127, 200, 4, 1])
+    assert codec.decode("get_ae_roi_mode", reply) == AeRoiModeResponse(True, 2, 127, 200, 4)
+
+
+def test_batch_roi_encoding_matches_scalar_conversion():
+    xcords, ycords = np.arange(0, 1920, 7), np.linspace(0, 1079, len(np.arange(0, 1920, 7)))
+    expected = [roi_to_hid_coordinates(x, y, 1920, 1080) for x, y in zip(xcords, ycords)]
+    assert roi_to_hid_coordinates_array(xcords, ycords, 1920, 1080).tolist() == [list(coordinates) for coordinates in expected]
+
+    buffers = encode_roi_batch(xcords, ycords, 1920, 1080, win_size=6)
+    codec = HidCodec()
+    for buffer, (x, y) in zip(buffers, expected):
+        assert bytes(buffer) == bytes(codec.encode("set_ae_roi_mode", AutoExpManual, x, y, 6))
+
+
+def test_out_of_range_roi_is_clipped_to_the_firmware_range():
+    xcords, ycords = [-50, 1919, 2500, 0], [540, -1, 1079, 5000]
+    expected = [(0, 127), (255, 0), (255, 255), (0, 255)]
+    assert [roi_to_hid_coordinates(x, y, 1920, 1080) for x, y in zip(xcords, ycords)] == expected
+    assert roi_to_hid_coordinates_array(xcords, ycords, 1920, 1080).tolist() == [list(coordinates) for coordinates in expected]
+
+
+def test_commands_against_emulator(fixture_emulated_camera):
+    _, hid_emulator = fixture_emulated_camera
+    buffers = encode_roi_batch([100, 960, 1900], [100, 540, 1000], 1920, 1080)
+    for buffer in buffers:
+        assert send_roi_buffer(hid_emulator.hid_handle, buffer)
+    response = hid_command(hid_emulator.hid_handle, "get_ae_roi_mode")
+    assert response == AeRoiModeResponse(True, AutoExpManual, buffers[-1][4], buffers[-1][5], 4)
+
+
+def test_write_and_read_share_the_transport(fixture_emulated_camera):
+    _, hid_emulator = fixture_emulated_camera
+    # The reply has to arrive after hid_read started waiting for it
+    hid_emulator.latency_ms = 50.0
+    hid_write(hid_emulator.hid_handle, HidCodec().encode("get_ae_roi_mode"))
+    reply = hid_read(hid_emulator.hid_handle)
+    state = [hid_emulator.roi_mode, hid_emulator.xcord, hid_emulator.ycord, hid_emulator.win_size]
+    assert list(reply[:6]) == [CAMERA_CONTROL_CU20, GET_AE_ROI_MODE_CU20] + state
+    assert hid_read(hid_emulator.hid_handle, timeout_ms=20.0) is None
+    # Still served by the same transport, so a command and its reply keep working
+    assert hid_command(hid_emulator.hid_handle, "get_ae_roi_mode").success
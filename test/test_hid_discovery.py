@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+CURRENT_DIR = str(Path(".").resolve())
+sys.path.append(CURRENT_DIR)
+import scripts.hid_discovery as hid_discovery
+from scripts.hid_discovery import HidDiscoveryIndex, serial_from_device_id
+
+
+def _add_hidraw(root, hidraw_name, instance, serial_id, hid_id="0003:00002560:0000C120"):
+    hid_device_dir = Path(root, "devices", "1-1:1.2", "0003:2560:C120.{:04X}".format(instance))
+    hid_device_dir.mkdir(parents=True)
+    Path(hid_device_dir, "uevent").write_text("HID_ID={}\nHID_NAME=See3CAM_CU20\nHID_UNIQ={}\n".format(hid_id, serial_id))
+    hidraw_dir = Path(root, "class", "hidraw", hidraw_name)
+    hidraw_dir.mkdir(parents=True)
+    Path(hidraw_dir, "device").symlink_to(hid_device_dir)
+    Path(root, "dev", hidraw_name).touch()
+
+
+@pytest.fixture
+def fixture_sysfs(tmp_path, monkeypatch):
+    Path(tmp_path, "class", "hidraw").mkdir(parents=True)
+    Path(tmp_path, "dev").mkdir()
+    monkeypatch.setattr(hid_discovery, "SYSFS_HIDRAW_DIR", Path(tmp_path, "class", "hidraw"))
+    monkeypatch.setattr(hid_discovery, "DEV_DIR", Path(tmp_path, "dev"))
+    return tmp_path
+
+
+def test_serial_from_by_id_path():
+    assert serial_from_device_id("/dev/v4l/by-id/usb-e-con_Systems_See3CAM_CU20_29110604-video-index0") == "29110604"
+
+
+def test_resolve_uses_cache_until_device_moves(fixture_sysfs, monkeypatch):
+    _add_hidraw(fixture_sysfs, "hidraw0", 1, "29110604")
+    _add_hidraw(fixture_sysfs, "hidraw1", 2, "180B0204")
+    _add_hidraw(fixture_sysfs, "hidraw2", 3, "KEYBOARD", hid_id="0003:0000046D:0000C31C")
+    cache_path = Path(fixture_sysfs, "hid_index.json")
+
+    index = HidDiscoveryIndex(cache_path)
+    assert index.resolve_many(["29110604", "180B0204"]) == [str(Path(fixture_sysfs, "dev", name)) for name in ["hidraw0", "hidraw1"]]
+    assert cache_path.exists()
+
+    enumerations = []
+    enumerate_see3cam_hidraw = hid_discovery.enumerate_see3cam_hidraw
+    monkeypatch.setattr(hid_discovery, "enumerate_see3cam_hidraw", lambda: enumerations.append(1) or enumerate_see3cam_hidraw())
+    index = HidDiscoveryIndex(cache_path)
+    assert index.resolve("29110604").endswith("hidraw0")
+    assert enumerations == []
+
+    # Re-enumerated on the bus: same node name, new HID instance in sysfs
+    Path(fixture_sysfs, "class", "hidraw", "hidraw0", "device").unlink()
+    _add_hidraw(fixture_sysfs, "hidraw3", 4, "29110604")
+    assert index.resolve("29110604").endswith("hidraw3")
+    assert enumerations == [1]
+
+    with pytest.raises(RuntimeError):
+        index.resolve("00000000")
@@ -0,0 +1,78 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+CURRENT_DIR = str(Path(".").resolve())
+sys.path.append(CURRENT_DIR)
+from scripts.hid_scheduler import HidCommandScheduler
+
+
+@pytest.fixture
+def fixture_scheduler():
+    scheduler = HidCommandScheduler(max_rate_hz=50.0)
+    yield scheduler
+    scheduler.close()
+
+
+def test_duplicate_of_acknowledged_state_is_dropped(fixture_scheduler):
+    scheduler = fixture_scheduler
+    sent = []
+    assert scheduler.call(lambda: sent.append("mode") or True, key="ae", state=("roi", 127, 127, 4))
+    assert not scheduler.submit("ae", ("roi", 127, 127, 4), lambda: sent.append("dup") or True)
+    assert scheduler.flush(timeout=1.0)
+    assert sent == ["mode"]
+
+    scheduler.invalidate("ae")
+    assert scheduler.submit("ae", ("roi", 127, 127, 4), lambda: sent.append("resend") or True)
+    assert scheduler.flush(timeout=1.0)
+    assert sent == ["mode", "resend"]
+
+
+def test_burst_is_merged_and_rate_limited(fixture_scheduler):
+    scheduler = fixture_scheduler
+    sent = []
+    for index in range(20):
+        scheduler.submit("ae", ("roi", index), lambda index=index: sent.append((index, time.monotonic())) or True)
+    assert scheduler.flush(timeout=1.0)
+
+    assert len(sent) < 20
+    assert sent[-1][0] == 19
+    assert scheduler.acknowledged_state("ae") == ("roi", 19)
+    intervals = [after[1] - before[1] for before, after in zip(sent, sent[1:])]
+    assert all(interval >= 0.019 for interval in intervals)
+
+
+def test_failed_command_is_not_acknowledged(fixture_scheduler):
+    scheduler = fixture_scheduler
+
+    def send_without_reply():
+        raise IOError("no reply")
+
+    assert not scheduler.call(lambda: False, key="ae", state=("centered",))
+    assert scheduler.acknowledged_state("ae") is None
+    with pytest.raises(IOError):
+        scheduler.call(send_without_reply, key="ae", state=("centered",))
+    assert scheduler.acknowledged_state("ae") is None
+
+
+def test_submission_after_a_queued_call_is_compared_with_that_call():
+    scheduler = HidCommandScheduler(max_rate_hz=5.0)
+    device = []
+
+    def set_state(state):
+        return lambda: device.append(state) or True
+
+    try:
+        assert scheduler.call(set_state(("roi", 1)), key="ae", state=("roi", 1))
+        # Queued behind the rate limit, so the acknowledged state is still the RoI
+        centered = scheduler.call_async(set_state(("centered",)), key="ae", state=("centered",))
+        assert scheduler.submit("ae", ("roi", 1), set_state(("roi", 1)))
+        assert not scheduler.submit("ae", ("roi", 1), set_state(("roi", 1)))
+        assert centered.result(timeout=2.0)
+        assert scheduler.flush(timeout=2.0)
+    finally:
+        scheduler.close()
+    assert device == [("roi", 1), ("centered",), ("roi", 1)]
+    assert scheduler.acknowledged_state("ae") == ("roi", 1)
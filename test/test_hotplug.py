@@ -0,0 +1,84 @@
+import errno
+import os
+import time
+
+from scripts.emulator import EmulatedSee3CamHid, SyntheticVideoCapture
+from scripts.hid_discovery import serial_from_udev_properties
+from scripts.hotplug import HotplugWatcher
+from scripts.see3cam_api import AutoExpManual, roi_to_hid_coordinates
+
+SERIAL_ID = "29110604"
+
+
+def test_serial_from_udev_properties():
+    assert serial_from_udev_properties({"ID_SERIAL": "e-con_Systems_See3CAM_CU20_29110604"}) == SERIAL_ID
+    assert serial_from_udev_properties({"ID_SERIAL": "Logitech_Webcam"}) is None
+    assert serial_from_udev_properties({}) is None
+
+
+def test_reconnect_restores_state(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    camera.set_roi_properties(400, 300, win_size=6, blocking=True)
+    camera.start_capture()
+    map1 = camera._map1
+    before = camera.next_frame(0, timeout=1.0)
+    replugged = []
+
+    def reconnect(camera):
+        hid_emulator = EmulatedSee3CamHid(latency_ms=0.5)
+        replugged.append(hid_emulator)
+        camera.reconnect(capture=SyntheticVideoCapture(camera.image_width, camera.image_height, 30), hid_handle=hid_emulator.hid_handle)
+
+    watcher = HotplugWatcher([camera], reconnect=reconnect)
+    assert not watcher.handle_event("add", SERIAL_ID)
+    assert not watcher.handle_event("remove", SERIAL_ID)
+    assert watcher.lost_serials == [SERIAL_ID]
+    assert watcher.handle_event("add", SERIAL_ID)
+    assert watcher.lost_serials == []
+    # A second video node of the same device is not a reason to reconnect again
+    assert not watcher.handle_event("add", SERIAL_ID)
+
+    hid_emulator = replugged[0]
+    assert (hid_emulator.roi_mode, hid_emulator.xcord, hid_emulator.ycord, hid_emulator.win_size) == (
+        (AutoExpManual,) + roi_to_hid_coordinates(400, 300, 1920, 1080) + (6,)
+    )
+    assert camera.auto_exposure_setting == (AutoExpManual, 6)
+    assert camera._map1 is map1
+    assert camera.is_capturing and camera.next_frame(before.sequence, timeout=1.0) is not None
+    recovery = camera.stats()["latency"]["hotplug_recovery"]
+    assert recovery["count"] == 1 and recovery["p99_ms"] < 1000.0
+
+
+def test_failed_reconnect_attempt_is_retried(fixture_emulated_camera, monkeypatch):
+    camera, _ = fixture_emulated_camera
+    camera.start_capture()
+    before = camera.next_frame(0, timeout=1.0)
+    hid_emulator = EmulatedSee3CamHid(latency_ms=0.5)
+    opened = []
+
+    def open_hid(device_id):
+        # The hidraw node shows up after the video node
+        if not opened:
+            opened.append(None)
+            # Takes over the lowest free fd number, i.e. the one the removed device's hidraw handle had
+            opened.append(os.open(os.devnull, os.O_RDONLY))
+            raise OSError(errno.ENOENT, "no hidraw node yet")
+        return hid_emulator.hid_handle
+
+    monkeypatch.setattr("scripts.camera.get_hid_handle_from_device_id", open_hid)
+    watcher = HotplugWatcher(
+        [camera], reconnect=lambda camera: camera.reconnect(capture=SyntheticVideoCapture(camera.image_width, camera.image_height, 30))
+    )
+    watcher.handle_event("remove", SERIAL_ID)
+    assert not camera.is_connected and not camera.is_capturing
+    time.sleep(0.05)
+    assert watcher.handle_event("add", SERIAL_ID)
+
+    unrelated_fd = opened[1]
+    os.fstat(unrelated_fd)
+    os.close(unrelated_fd)
+    assert camera.is_connected and camera.is_capturing
+    assert camera.next_frame(before.sequence, timeout=1.0) is not None
+    # Measured from the removal, including the failed attempt
+    recovery = camera.stats()["latency"]["hotplug_recovery"]
+    assert recovery["count"] == 1 and recovery["p50_ms"] >= 50.0
@@ -0,0 +1,42 @@
+import numpy as np
+
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+from conftest import CONFIG_FILE_PATH
+
+
+def test_raw_yuyv_luma_is_a_view_and_color_is_lazy(fixture_map_cache_dir):
+    camera, _ = emulated_camera(get_config(CONFIG_FILE_PATH), realtime=False, raw_yuyv=True, map_cache_dir=fixture_map_cache_dir)
+    reference, _ = emulated_camera(get_config(CONFIG_FILE_PATH), realtime=False, map_cache_dir=fixture_map_cache_dir)
+    assert camera.update() and reference.update()
+
+    luma = camera.luma
+    assert luma.shape == (camera.image_height, camera.image_width)
+    assert np.shares_memory(luma, camera.image_record.data)
+    # YUYV luma is limited range (16..235), BGR2GRAY full range
+    assert np.abs(luma - (16.0 + reference.luma * 219.0 / 255.0)).max() <= 2.0
+
+    remapped = camera.remap_luma()
+    assert remapped.shape == luma.shape
+    assert np.abs(remapped - (16.0 + reference.remap_luma() * 219.0 / 255.0)).mean() < 2.0
+    assert "yuyv_to_bgr" not in camera.stats()["latency"]
+
+    assert np.abs(camera.image.astype(np.int16) - reference.image).mean() < 2.0
+    assert camera.image is camera.image
+    assert camera.stats()["latency"]["yuyv_to_bgr"]["count"] == 1
+    camera.release()
+    reference.release()
+
+
+def test_raw_yuyv_bgr_is_not_overwritten_by_other_frames(fixture_map_cache_dir):
+    camera, _ = emulated_camera(get_config(CONFIG_FILE_PATH), realtime=False, raw_yuyv=True, map_cache_dir=fixture_map_cache_dir)
+    assert camera.update()
+    previous = camera.image_record
+    assert camera.update()
+    image = camera.image
+    expected = image.copy()
+    camera.remapped(previous)
+    camera.downscaled(320, 180, frame=previous)
+    assert not np.array_equal(camera.to_bgr(previous), expected)
+    np.testing.assert_array_equal(image, expected)
+    camera.release()
@@ -0,0 +1,30 @@
+import json
+
+from scripts.metrics import LatencyHistogram, Metrics, MetricsExporter
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = LatencyHistogram(bounds_ms=(1.0, 10.0, 100.0))
+    for elapsed_ms in [0.5, 0.7, 5.0, 50.0, 500.0]:
+        histogram.observe_ns(int(elapsed_ms * 1e6))
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.quantile_ms(0.4) == 1.0
+    assert histogram.quantile_ms(0.5) == 10.0
+    assert histogram.quantile_ms(1.0) == float("inf")
+
+
+def test_prometheus_and_jsonl_export(tmp_path):
+    metrics = Metrics({"device": "cam0"})
+    with metrics.span("remap"):
+        pass
+    metrics.counter("frames_dropped").inc(3)
+
+    lines = metrics.prometheus_lines()
+    assert 'see3cam_remap_seconds_bucket{device="cam0",le="+Inf"} 1' in lines
+    assert 'see3cam_frames_dropped_total{device="cam0"} 3' in lines
+
+    exporter = MetricsExporter([metrics], str(tmp_path / "metrics.jsonl"), fmt="jsonl", interval=60.0)
+    exporter.stop()
+    record = json.loads((tmp_path / "metrics.jsonl").read_text().splitlines()[-1])
+    assert record["metrics"][0]["counters"]["frames_dropped"] == 3
+    assert record["metrics"][0]["labels"] == {"device": "cam0"}
@@ -0,0 +1,40 @@
+import attr
+import cv2
+import numpy as np
+
+from scripts.camera_config import get_config
+from scripts.emulator import emulated_camera
+from scripts.mjpeg_decoder import OrderedJpegDecoder
+from conftest import CONFIG_FILE_PATH
+
+
+def test_decoder_delivers_in_submission_order():
+    images = [np.full((64, 96, 3), value * 10, np.uint8) for value in range(20)]
+    delivered = []
+    decoder = OrderedJpegDecoder(lambda image, context: delivered.append((context, image)), num_workers=4, max_pending=32)
+    for index, image in enumerate(images):
+        assert decoder.submit(cv2.imencode(".jpg", image)[1], index)
+    assert decoder.submit(np.zeros(16, np.uint8), "broken")
+    assert decoder.flush(timeout=5.0)
+    decoder.shutdown()
+
+    assert [context for context, _ in delivered] == list(range(20)) + ["broken"]
+    assert all(np.abs(image.astype(int) - images[index]).max() <= 2 for index, image in delivered[:20])
+    assert delivered[-1][1] is None
+
+
+def test_mjpg_camera_decodes_frames(fixture_map_cache_dir):
+    config = attr.evolve(get_config(CONFIG_FILE_PATH), fourcc="MJPG")
+    camera, _ = emulated_camera(config, realtime=False, map_cache_dir=fixture_map_cache_dir)
+    reference, _ = emulated_camera(get_config(CONFIG_FILE_PATH), realtime=False, map_cache_dir=fixture_map_cache_dir)
+    for sequence in range(1, 4):
+        assert camera.update() and reference.update()
+        assert camera.image_sequence == sequence
+        assert np.abs(camera.image.astype(np.int16) - reference.image).mean() < 2.0
+
+    camera.start_capture()
+    frame = camera.next_frame(camera.image_sequence, timeout=2.0)
+    assert frame is not None and frame.sequence > 3
+    camera.release()
+    reference.release()
+    assert camera.stats()["counters"].get("decode_failures", 0) == 0
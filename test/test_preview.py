@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+from scripts.preview import PreviewWindow
+
+
+def test_preview_renders_into_preallocated_canvas(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    preview = PreviewWindow(camera, scale=0.5)
+    canvas = preview.canvas
+    assert not preview.render()
+
+    assert camera.update()
+    assert preview.render()
+    expected = cv2.resize(camera.image, (camera.image_width // 2, camera.image_height // 2), interpolation=cv2.INTER_LINEAR)
+    assert preview.canvas is canvas and np.array_equal(canvas, expected)
+    # No new frame and no overlay change: nothing to redraw
+    assert not preview.render()
+
+    preview.set_rectangle("roi", (100, 100, 400, 200), color=(255, 0, 0))
+    assert preview.render()
+    assert tuple(canvas[50, 50]) == (255, 0, 0) and tuple(canvas[51, 51]) == tuple(expected[51, 51])
+    preview.set_rectangle("roi", (100, 100, 400, 200), color=(255, 0, 0))
+    assert not preview.render()
+
+
+def test_preview_undistorted_matches_output_profile(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    preview = PreviewWindow(camera, scale=0.5, undistort=True)
+    assert camera.update()
+    assert preview.render()
+    assert np.array_equal(preview.canvas, camera.render_profile("preview"))
+    assert preview.to_canvas_rect((-100, 0, 4000, 200)) == (0, 0, camera.image_width // 2, 100)
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+
+from scripts.camera import Camera
+from scripts.camera_config import get_config
+from scripts.emulator import EmulatedSee3CamHid, emulated_camera
+from scripts.recorder import Recorder, ReplayCapture
+from conftest import CONFIG_FILE_PATH
+
+
+def test_record_and_replay_round_trip(tmp_path, fixture_map_cache_dir):
+    config = get_config(CONFIG_FILE_PATH)
+    camera, _ = emulated_camera(config, realtime=False, map_cache_dir=fixture_map_cache_dir)
+    camera.set_roi_properties(400, 300, blocking=True)
+    recorder = Recorder(str(tmp_path), config.width, config.height, fps=config.fps, frames_per_chunk=4, num_slots=16)
+    frames, records = [], []
+    for _ in range(10):
+        assert camera.update()
+        assert recorder.record(camera.latest_frame(), camera.acknowledged_auto_exposure_state)
+        frames.append(camera.image.copy())
+        records.append(camera.image_record)
+    recorder.close()
+    camera.release()
+
+    replay = ReplayCapture(str(tmp_path))
+    assert len(replay) == 10
+    assert list(replay.index["chunk"]) == [0, 0, 0, 0, 1, 1, 1, 1, 2, 2]
+    assert list(replay.index["sequence"]) == [record.sequence for record in records]
+    assert (replay.index["ae_mode"] == 2).all() and (replay.index["win_size"] == 4).all()
+
+    replayed_camera = Camera(config, capture=replay, hid_handle=EmulatedSee3CamHid().hid_handle, map_cache_dir=fixture_map_cache_dir)
+    for frame, record in zip(frames, records):
+        assert replayed_camera.update()
+        assert np.array_equal(replayed_camera.image, frame)
+        assert replayed_camera.image_record.driver_msec == record.driver_msec
+    assert not replayed_camera.update(timeout=0.1)
+    replayed_camera.release()
+
+
+def test_open_chunk_index_is_saved_while_recording(tmp_path, fixture_map_cache_dir):
+    config = get_config(CONFIG_FILE_PATH)
+    camera, _ = emulated_camera(config, realtime=False, map_cache_dir=fixture_map_cache_dir)
+    camera.set_auto_exposure_mode("lower_center")
+    lower_center_state = camera.acknowledged_auto_exposure_state
+    recorder = Recorder(str(tmp_path), config.width, config.height, fps=config.fps, frames_per_chunk=100, index_interval=0.05)
+    for _ in range(3):
+        assert camera.update()
+        assert recorder.record(camera.latest_frame(), camera.acknowledged_auto_exposure_state)
+
+    # The chunk is far from full, its index shows up anyway
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline and sum(len(np.load(str(path))) for path in tmp_path.glob("index_*.npy")) < 3:
+        time.sleep(0.01)
+    replay = ReplayCapture(str(tmp_path))
+    assert len(replay) == 3
+    row = replay.index[0]
+    assert lower_center_state[0] == "lower_center"
+    assert (row["ae_mode"], row["roi_x"], row["roi_y"], row["win_size"]) == (2,) + lower_center_state[1:]
+    replay.release()
+    recorder.close()
+    camera.release()
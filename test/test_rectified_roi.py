@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+
+from scripts.camera import fisheye_camera_parameters, fisheye_undistort_rectify_map
+from scripts.camera_config import get_config
+from scripts.rectified_roi import RectifiedRoiMapper
+from scripts.see3cam_api import hid_command, roi_to_hid_coordinates
+from conftest import CONFIG_FILE_PATH
+
+
+def _distort_points(cfg, xcords, ycords):
+    camera_mat, dist_coef, projection_camera_mat = fisheye_camera_parameters(cfg)
+    inverse_projection = np.linalg.inv(projection_camera_mat)
+    normalized = np.stack([inverse_projection[0, 0] * xcords + inverse_projection[0, 2], inverse_projection[1, 1] * ycords + inverse_projection[1, 2]], -1)
+    raw = cv2.fisheye.distortPoints(normalized.reshape(1, -1, 2), camera_mat, dist_coef).reshape(-1, 2)
+    return np.stack([raw[:, 0].clip(0, cfg.width - 1), raw[:, 1].clip(0, cfg.height - 1)], -1)
+
+
+def test_lookup_matches_distort_points():
+    cfg = get_config(CONFIG_FILE_PATH)
+    mapper = RectifiedRoiMapper(*fisheye_camera_parameters(cfg), (cfg.width, cfg.height))
+    rng = np.random.default_rng(0)
+    xcords, ycords = rng.uniform(0, cfg.width - 1, 2000), rng.uniform(0, cfg.height - 1, 2000)
+
+    raw = mapper.to_raw_array(xcords, ycords)
+    assert np.abs(raw - _distort_points(cfg, xcords, ycords)).max() < 0.1
+    assert np.allclose([mapper.to_raw(x, y) for x, y in zip(xcords[:50], ycords[:50])], raw[:50])
+
+    # The undistortion maps sample the same positions
+    map1, _ = fisheye_undistort_rectify_map(cfg)
+    assert np.abs(np.array(mapper.to_raw(960, 540)) - map1[540, 960]).max() <= 1.0
+
+
+def test_rectified_roi_reaches_the_sensor(fixture_emulated_camera):
+    camera, hid_emulator = fixture_emulated_camera
+    xcords, ycords = np.array([300, 960, 1700]), np.array([150, 540, 1000])
+    hid_coordinates = camera.rectified_to_hid_coordinates(xcords, ycords)
+
+    for (xcord, ycord), expected in zip(zip(xcords, ycords), hid_coordinates):
+        assert camera.set_roi_properties(xcord, ycord, blocking=True, rectified=True)
+        response = hid_command(hid_emulator.hid_handle, "get_ae_roi_mode")
+        assert (response.xcord, response.ycord) == tuple(expected)
+
+    # Near the corners the fisheye pulls the sensor position towards the center
+    corner = roi_to_hid_coordinates(*camera.rectified_roi_mapper.to_raw(0, 0), camera.image_width, camera.image_height)
+    assert corner[0] > 0 and corner[1] > 0
@@ -0,0 +1,49 @@
+import attr
+import numpy as np
+
+from scripts.camera import fisheye_undistort_rectify_map
+from scripts.camera_config import get_config
+from scripts.remap_cache import cached_fisheye_undistort_rectify_map, intrinsics_key, load_or_build_maps
+from conftest import CONFIG_FILE_PATH
+
+
+def small_config():
+    cfg = get_config(CONFIG_FILE_PATH)
+    return attr.evolve(cfg, width=320, height=180, fx=cfg.fx / 6, fy=cfg.fy / 6, cx=cfg.cx / 6, cy=cfg.cy / 6)
+
+
+def test_second_load_is_a_cache_hit(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(None)
+        return np.arange(12, dtype=np.int16).reshape(3, 4), np.ones((3, 4), np.uint16)
+
+    first = load_or_build_maps("test", "key", build, tmp_path)
+    second = load_or_build_maps("test", "key", build, tmp_path)
+    assert len(builds) == 1
+    for first_map, second_map in zip(first, second):
+        np.testing.assert_array_equal(first_map, second_map)
+    assert isinstance(second[0], np.memmap)
+
+
+def test_cached_maps_match_the_direct_build(tmp_path):
+    cfg = small_config()
+    cached = cached_fisheye_undistort_rectify_map(cfg, tmp_path)
+    for cached_map, built_map in zip(cached, fisheye_undistort_rectify_map(cfg)):
+        np.testing.assert_array_equal(cached_map, built_map)
+
+
+def test_changed_calibration_invalidates_and_removes_stale_files(tmp_path):
+    cfg = small_config()
+    cached_fisheye_undistort_rectify_map(cfg, tmp_path)
+    old_files = sorted(path.name for path in tmp_path.glob("*.npy"))
+    assert len(old_files) == 2
+
+    for changed in [attr.evolve(cfg, fx=cfg.fx + 1.0), attr.evolve(cfg, width=cfg.width // 2, height=cfg.height // 2)]:
+        assert intrinsics_key(changed) != intrinsics_key(cfg)
+        map1, _ = cached_fisheye_undistort_rectify_map(changed, tmp_path)
+        assert map1.shape[:2] == (changed.height, changed.width)
+        files = sorted(path.name for path in tmp_path.glob("*.npy"))
+        assert len(files) == 2 and all(intrinsics_key(changed) in name for name in files)
+    assert not set(old_files) & set(path.name for path in tmp_path.glob("*.npy"))
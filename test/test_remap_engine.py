@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+
+from scripts.camera import fisheye_undistort_rectify_map
+from scripts.camera_config import get_config
+from scripts.remap_engine import StripedRemapper
+from conftest import CONFIG_FILE_PATH
+
+
+@pytest.fixture(scope="module")
+def fixture_maps():
+    return fisheye_undistort_rectify_map(get_config(CONFIG_FILE_PATH))
+
+
+@pytest.mark.parametrize("num_stripes", [1, 2, 3, 7])
+@pytest.mark.parametrize("channels", [(3,), ()])
+def test_striped_remap_matches_single_remap(fixture_maps, num_stripes, channels):
+    map1, map2 = fixture_maps
+    src = np.random.RandomState(num_stripes).randint(0, 256, map1.shape[:2] + channels).astype(np.uint8)
+    expected = cv2.remap(src, map1, map2, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+    remapper = StripedRemapper(map1, map2, num_stripes)
+    try:
+        dst = np.empty_like(expected)
+        assert remapper.remap(src, dst) is dst
+        np.testing.assert_array_equal(dst, expected)
+        np.testing.assert_array_equal(remapper.remap(src), expected)
+    finally:
+        remapper.shutdown()
+
+
+def test_mismatching_dst_is_rejected(fixture_maps):
+    map1, map2 = fixture_maps
+    src = np.zeros(map1.shape[:2] + (3,), np.uint8)
+    remapper = StripedRemapper(map1, map2, 2)
+    try:
+        for dst in [np.empty(src.shape, np.float32), np.empty(src.shape[:2], np.uint8), np.empty((10, 10, 3), np.uint8)]:
+            with pytest.raises(ValueError):
+                remapper.remap(src, dst)
+    finally:
+        remapper.shutdown()
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+CURRENT_DIR = str(Path(".").resolve())
+sys.path.append(CURRENT_DIR)
+from scripts.roi_stats import RoiExposureController, RoiStatisticsCalculator, luma_view
+
+
+class FakeExposureCamera:
+    def __init__(self, exposure):
+        self.exposure = exposure
+
+    def set_manual_exposure(self, exposure):
+        self.exposure = exposure
+
+
+def test_luma_view_is_zero_copy():
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    view = luma_view(frame, (100, 50, 400, 300), step=4)
+    assert view.shape == (75, 100)
+    assert np.shares_memory(view, frame)
+
+
+def test_statistics_match_numpy_reference():
+    frame = np.random.RandomState(0).randint(0, 256, (1080, 1920, 3)).astype(np.uint8)
+    roi = (300, 200, 800, 600)
+    statistics = RoiStatisticsCalculator(step=4, clip_level=250).compute(frame, roi)
+
+    reference = frame[200:800:4, 300:1100:4, 1]
+    assert statistics.pixel_count == reference.size
+    assert abs(statistics.mean - reference.mean()) < 1e-9
+    sorted_reference = np.sort(reference, axis=None)
+    expected_percentiles = [sorted_reference[int(np.ceil(q * reference.size)) - 1] for q in (0.05, 0.5, 0.95)]
+    assert np.array_equal(statistics.percentiles, expected_percentiles)
+    assert abs(statistics.clipped_fraction - np.mean(reference >= 250)) < 1e-9
+    assert statistics.histogram.sum() == reference.size
+
+
+def test_exposure_controller_converges_to_target():
+    camera = FakeExposureCamera(exposure=40.0)
+    controller = RoiExposureController(camera, (0, 0, 320, 240), target=120.0, settle_frames=1, deadband=4.0)
+    for _ in range(20):
+        brightness = min(camera.exposure * 1.5, 255.0)
+        statistics = controller.update(np.full((240, 320, 3), brightness, np.uint8))
+    assert abs(statistics.mean - 120.0) <= 4.0
@@ -0,0 +1,69 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from scripts.shm_ring import SharedFramePublisher, SharedFrameSubscriber
+
+
+def _subscriber_main(name, result_queue):
+    subscriber = SharedFrameSubscriber(name)
+    frame = subscriber.wait_next(0, timeout=5.0)
+    result_queue.put((frame.sequence, int(frame.data[0, 0, 0]), frame.data.shape))
+    del frame
+    subscriber.close()
+
+
+def test_subscriber_reads_views_and_detects_laps():
+    publisher = SharedFramePublisher("see3cam_test_ring", (48, 64, 3), num_slots=4)
+    subscriber = SharedFrameSubscriber(publisher.name)
+    assert subscriber.shape == (48, 64, 3) and subscriber.wait_next(0, timeout=0) is None
+
+    publisher.publish(np.full((48, 64, 3), 1, np.uint8), 1000)
+    frame = subscriber.wait_next(0, timeout=0)
+    assert frame.sequence == 1 and frame.data[0, 0, 0] == 1 and frame.is_valid()
+    assert not frame.data.flags.owndata
+
+    for value in range(2, 10):
+        publisher.publish(np.full((48, 64, 3), value, np.uint8), 1000 * value)
+    assert not frame.is_valid()
+    frame = subscriber.wait_next(frame.sequence, timeout=0)
+    # Slots 7, 8 and 9 are intact, the slot after the latest one is the next to be rewritten
+    assert frame.sequence == 7 and frame.data[0, 0, 0] == 7
+    assert subscriber.lapped_frames == 5
+
+    del frame
+    subscriber.close()
+    publisher.close()
+
+
+def test_subscriber_in_another_process():
+    publisher = SharedFramePublisher("see3cam_test_ring_process", (48, 64, 3), num_slots=4)
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=_subscriber_main, args=(publisher.name, result_queue))
+    process.start()
+    publisher.publish(np.full((48, 64, 3), 42, np.uint8), 1000)
+    assert result_queue.get(timeout=10.0) == (1, 42, (48, 64, 3))
+    process.join()
+    publisher.close()
+
+
+def test_camera_publishes_raw_and_remapped_frames(fixture_emulated_camera):
+    camera, _ = fixture_emulated_camera
+    raw_name = camera.publish_shared_memory(name="see3cam_test_raw")
+    remapped_name = camera.publish_shared_memory(name="see3cam_test_remapped", remapped=True)
+    raw, remapped = SharedFrameSubscriber(raw_name), SharedFrameSubscriber(remapped_name)
+    assert camera.update()
+
+    raw_frame, remapped_frame = raw.latest(), remapped.latest()
+    assert raw_frame.monotonic_ns == camera.image_record.monotonic_ns
+    assert np.array_equal(raw_frame.data, camera.image)
+    assert np.array_equal(remapped_frame.data, camera.remap_image)
+
+    del raw_frame, remapped_frame
+    raw.close()
+    remapped.close()
+    camera.stop_publishing()
+    with pytest.raises(FileNotFoundError):
+        SharedFrameSubscriber(raw_name)
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+from scripts.camera_config import _parse_section, _load_toml, get_config
+from conftest import CONFIG_FILE_PATH, CURRENT_DIR
+
+
+def _modules_after_import(module):
+    code = "import sys, {}; print(' '.join(sorted(sys.modules)))".format(module)
+    return subprocess.run([sys.executable, "-c", code], cwd=CURRENT_DIR, check=True, capture_output=True, text=True).stdout.split()
+
+
+def test_imports_are_deferred():
+    assert "cv2" not in _modules_after_import("scripts.camera_config")
+    camera_modules = _modules_after_import("scripts.camera")
+    for deferred in ["asyncio", "scripts.hid_transport", "scripts.mjpeg_decoder", "scripts.remap_engine", "pyudev", "cerberus"]:
+        assert deferred not in camera_modules
+
+
+def test_config_validation():
+    section = dict(_load_toml(CONFIG_FILE_PATH)["Rgb"])
+    assert get_config(CONFIG_FILE_PATH).width == section["width"]
+    assert _parse_section(dict(section, fx=907, k4=0)).fx == 907
+    with pytest.raises(ValueError, match="fx"):
+        _parse_section(dict(section, fx="907"))
+    with pytest.raises(ValueError, match="k4"):
+        _parse_section(dict(section, k4=True))
+    with pytest.raises(ValueError, match="fourcc"):
+        _parse_section(dict(section, fourcc="H264"))
+    with pytest.raises(ValueError, match="unknown field"):
+        _parse_section(dict(section, exposure=100))
+    with pytest.raises(ValueError, match="required field"):
+        _parse_section({key: value for key, value in section.items() if key != "width"})